@@ -1,32 +1,216 @@
+import argparse
+import atexit
+import bisect
+import copy
+import functools
+import hashlib
+import importlib.util
 import json
+import mmap
 import os
-import tkinter as tk
-from tkinter import filedialog, ttk, colorchooser, messagebox
+import re
+import shutil
+import sqlite3
+import struct
+import sys
+import tempfile
+import threading
+import time
+import weakref
+from collections import OrderedDict, deque
+from collections.abc import Mapping
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+
+# Keys of a driver configuration that are changed by the driver and car info
+DRIVER_KEYS = ('racerName', 'driverSkin', 'driverSkinLivery', 'helmet',
+               'helmetLivery', 'idleAnimation', 'celebrationAnimation')
+CAR_KEYS = ('vehicle', 'vehicleLivery')
+
+
+class _Missing:
+    # Value of a key that a configuration didn't have, in the steps of undo
+    # Applying it removes the key again. The class itself is the marker, as
+    # deepcopy returns classes unchanged
+    pass
+
+
+def _update_config(config, edit):
+    # Change the values of a configuration, keys with the value _Missing are
+    # removed
+    for key, value in edit.items():
+        if value is _Missing:
+            config.pop(key, None)
+        else:
+            config[key] = value
 
 
 class Replay:
-    replay = None
     header = None
-
-    def __init__(self, filename):
+    _replay = None
+    # Archive the replay has been loaded from or saved to, if any
+    archive = None
+    _workdir = None
+    # Number of edit steps that can be undone, see undo
+    undo_limit = 1000
+
+    def __init__(self, filename, lazy=False, config_only=True, mapped=False,
+                 columnar=False):
+        # If lazy is set, only the small .header file is loaded right away
+        # The .replay file is loaded as soon as driver or car data is needed
+        # If config_only is set, only the driver configurations are decoded
+        # out of the .replay file and not the recorded race data
+        # If mapped is set, the .replay file is memory mapped and all of its
+        # data is decoded on access (see MappedReplayFile)
+        # If columnar is set, all of the .replay file is loaded and the
+        # recorded race data is stored in NumPy arrays (see ColumnarReplayFile)
+        # filename is given without extension, or with ARCHIVE_EXTENSION to
+        # load a replay archive, or with OVERLAY_EXTENSION to load the base
+        # replay of an edit overlay with its edits
         self.filename = filename
+        self.lazy = lazy
+        self.config_only = config_only
+        self.mapped = mapped
+        self.columnar = columnar
         self.load(filename)
 
+    def close(self):
+        # Close the files kept open by the replay (the memory mapped .replay
+        # file) and remove the files extracted out of an archive
+        # The replay can't be used afterwards
+        if self._replay is not None:
+            self._replay.close()
+        if self._workdir is not None:
+            self._workdir.cleanup()
+            self._workdir = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    @property
+    def replay(self):
+        # Load the .replay file on first access if it hasn't been loaded yet
+        if self._replay is None:
+            self._replay = self._load_replay_file(self.source)
+            # Edits made before loading it
+            self._replay.apply_edits(self.edits)
+        return self._replay
+
+    def _work_path(self):
+        # Return the path (without extension) in a temporary directory, to
+        # which the files of archives are extracted
+        # They are loaded and saved there like the files of any other replay
+        if self._workdir is None:
+            self._workdir = tempfile.TemporaryDirectory(prefix='cs_replay_')
+        return os.path.join(self._workdir.name, 'replay')
+
+    def _load_replay_file(self, filename):
+        # Load the .replay file in the selected mode
+        if self._extract_replay:
+            # Only decompressed when it's needed
+            self.archive.extract_replay(filename)
+            self._extract_replay = False
+        if self.mapped:
+            return MappedReplayFile(filename)
+        if self.columnar:
+            return ColumnarReplayFile(filename)
+        return ReplayFile(filename, self.config_only)
+
     def load(self, filename):
         # Load both the .replay and the .header files
-        self.replay = ReplayFile(filename)
-        self.header = HeaderFile(filename)
-
-    def save(self, filename):
+        # When loading lazily the .replay file is loaded on first access
+        overlay = None
+        if is_overlay(filename):
+            overlay = ReplayOverlay.read(filename)
+            overlay.check_base()
+        self.filename = filename
+        self._replay = None
+        self._extract_replay = False
+        # Replay the edits are based on (without extension or an archive),
+        # its hash once it's known and all edits since it has been loaded
+        self.base = filename if overlay is None else overlay.base
+        self.base_hash = None if overlay is None else overlay.hash
+        self.edits = {}
+        # Steps of apply_edits that can be undone and redone, each as the
+        # values it replaced and the values it set (see _diff_edits)
+        self.undo_stack = deque(maxlen=self.undo_limit)
+        self.redo_stack = []
+        # Path of the files that are loaded (without extension)
+        self.source = self.base
+        self.archive = None
+        if is_archive(self.base):
+            self.archive = ReplayArchive(self.base)
+            self.source = self._work_path()
+            self.archive.extract_header(self.source)
+            self._extract_replay = True
+        if not self.lazy:
+            self._replay = self._load_replay_file(self.source)
+        self.header = HeaderFile(self.source)
+        if overlay is not None:
+            self._apply_edits(overlay.edits)
+
+    def save(self, filename, compression=None):
         # Save both the .replay and the .header files
-        self.replay.save(filename)
-        self.header.save(filename)
+        # Files without changes are copied, or not written at all if they are
+        # saved to the file they have been loaded from
+        # If filename has ARCHIVE_EXTENSION, the replay is saved as archive
+        # compressed with compression (default: the compression of the archive
+        # it has been loaded from or DEFAULT_COMPRESSION)
+        # If filename has OVERLAY_EXTENSION, only the edits are saved into an
+        # overlay referencing the base replay
+        if is_overlay(filename):
+            if self.base_hash is None:
+                self.base_hash = replay_hash(self.base)
+            ReplayOverlay(self.base, self.base_hash, self.edits).write(
+                filename)
+            self.filename = filename
+            return
+        if is_archive(filename):
+            if compression is None:
+                compression = (self.archive.compression if self.archive
+                               else DEFAULT_COMPRESSION)
+            work = self._work_path()
+            self.replay.save(work)
+            self.header.save(work)
+            ReplayArchive.pack(work, filename, compression)
+            self.archive = ReplayArchive(filename)
+            self.source = work
+        else:
+            self.replay.save(filename)
+            # Cancelling now would leave the new .replay file without header
+            _disable_cancel()
+            self.header.save(filename)
+            self.archive = None
+            self.source = filename
+        # The saved replay is the base of further edits
+        self.filename = filename
+        self.base = filename
+        self.base_hash = None
+        self.edits = {}
+
+    @classmethod
+    async def aload(cls, filename, **kwargs):
+        # Async counterpart of Replay(filename, ...), the files are loaded in
+        # the executor of the async API (see configure_async)
+        return await _run_blocking(functools.partial(cls, filename, **kwargs))
+
+    async def asave(self, filename, compression=None):
+        # Async counterpart of save
+        await _run_blocking(self.save, filename, compression)
 
     def get_race_info(self):
         # Collect race information that should be displayed
         # Returns timestamp, track, path, scenario and scenario_index
         return self.header.get_race_info()
 
+    async def aget_race_info(self):
+        # Async counterpart of get_race_info
+        # The header is always loaded with the replay, so this doesn't block
+        return self.get_race_info()
+
     def get_drivers(self):
         # Return a list of the drivers in the replay
         return self.replay.get_drivers()
@@ -41,31 +225,843 @@ class Replay:
 
     def change_driver_info(self, id, driver_info):
         # Change the driver info in both the replay and the header
-        self.replay.change_driver_info(id, driver_info)
-        self.header.change_driver_info(id, driver_info)
+        self.apply_edits({id: {key: driver_info[key] for key in DRIVER_KEYS}})
 
     def change_car_info(self, id, car_info):
         # Change the driver info in both the replay and the header
-        self.replay.change_car_info(id, car_info)
-        self.header.change_car_info(id, car_info)
+        self.apply_edits({id: {key: car_info[key] for key in CAR_KEYS}})
+
+    def apply_edits(self, edits):
+        # Change the configurations of many drivers in both the replay and the
+        # header at once
+        # edits maps racingTeamID to a dict with the values to change
+        # Each call is one step that can be undone, see undo. Recording it
+        # needs the configurations of the .replay file, so it's loaded
+        step = self._diff_edits(edits)
+        if step[0]:
+            self.undo_stack.append(step)
+            self.redo_stack = []
+        self._apply_edits(edits)
+
+    def _file_configs(self):
+        # Return the configurations of the .replay and the .header file by
+        # racingTeamID, as pairs of the name of the file and a function
+        # returning the configuration of an id (None if it isn't in the file)
+        replay = self.replay
+        configs = self.header.data['configsById']
+
+        def replay_config(id):
+            if id not in replay.index:
+                return None
+            return replay.data[replay.index[id]]['racingTeamConfiguration']
+        return (('replay', replay_config), ('header', configs.get))
+
+    def _diff_edits(self, edits):
+        # Return the values of the configurations the edits replace and the
+        # values they set, only for the keys whose value changes
+        # Both map the name of the file to the values by racingTeamID, as the
+        # .replay and the .header file don't have to agree. Copies are kept,
+        # so later changes of the values in the configurations don't change
+        # the steps
+        before = {}
+        after = {}
+        for name, get_config in self._file_configs():
+            for id, edit in edits.items():
+                config = get_config(id)
+                if config is None:
+                    continue
+                for key, value in edit.items():
+                    if key in config and config[key] == value:
+                        continue
+                    before.setdefault(name, {}).setdefault(id, {})[key] = (
+                        copy.deepcopy(config.get(key, _Missing)))
+                    after.setdefault(name, {}).setdefault(id, {})[key] = (
+                        copy.deepcopy(value))
+        return before, after
+
+    def undo(self):
+        # Revert the last step of apply_edits
+        # Only the values changed by the step are set again, so this takes
+        # time and memory in the size of the change and not of the replay
+        # Returns the racingTeamIDs of the changed drivers
+        if not self.undo_stack:
+            return []
+        before, after = self.undo_stack.pop()
+        self._restore(before)
+        self.redo_stack.append((before, after))
+        return self._step_ids(before)
+
+    def redo(self):
+        # Apply the last step reverted by undo again
+        # Returns the racingTeamIDs of the changed drivers
+        if not self.redo_stack:
+            return []
+        before, after = self.redo_stack.pop()
+        self._restore(after)
+        self.undo_stack.append((before, after))
+        return self._step_ids(after)
+
+    def _restore(self, values):
+        # Set the values of one side of a step, each file gets its own values
+        # Keys a configuration didn't have are removed again, also from the
+        # edits, as the replay they are based on didn't have them either
+        replay = values.get('replay', {})
+        header = values.get('header', {})
+        for edits in (replay, header):
+            for id, edit in edits.items():
+                _update_config(self.edits.setdefault(id, {}),
+                               copy.deepcopy(edit))
+                if not self.edits[id]:
+                    del self.edits[id]
+        self.replay.apply_edits(copy.deepcopy(replay))
+        self.header.apply_edits(copy.deepcopy(header))
+
+    @staticmethod
+    def _step_ids(values):
+        # Return the racingTeamIDs changed in one side of a step
+        ids = []
+        for edits in values.values():
+            ids.extend(id for id in edits if id not in ids)
+        return ids
+
+    def _apply_edits(self, edits):
+        # Apply edits without recording a step for undo
+        # If the .replay file hasn't been loaded yet, the edits are applied to
+        # it when it's loaded
+        for id, edit in edits.items():
+            self.edits.setdefault(id, {}).update(edit)
+        if self._replay is not None:
+            self._replay.apply_edits(edits)
+        self.header.apply_edits(edits)
+
+
+# Executor in which the async API runs the blocking file access and parsing
+# (None: the default executor of the event loop) and the number of replays
+# that are loaded or saved at once, see configure_async
+_async_executor = None
+_async_limit = 8
+# Semaphore enforcing the limit in each event loop
+_async_semaphores = weakref.WeakKeyDictionary()
+
+
+def configure_async(executor=None, limit=8):
+    # Set the executor and the concurrency limit of the async API
+    # A ProcessPoolExecutor can't be used, as the loaded replays have to be
+    # returned to the event loop
+    global _async_executor, _async_limit
+    if limit < 1:
+        raise ValueError('limit has to be at least 1')
+    _async_executor = executor
+    _async_limit = limit
+    _async_semaphores.clear()
+
+
+async def _run_blocking(function, *args):
+    # Run function(*args) in the executor of the async API once less than
+    # the limit of calls are running
+    # asyncio is imported here, as it is slow to import and only needed when
+    # an event loop (and so asyncio) is running already
+    import asyncio
+    loop = asyncio.get_running_loop()
+    semaphore = _async_semaphores.get(loop)
+    if semaphore is None:
+        semaphore = _async_semaphores[loop] = asyncio.Semaphore(_async_limit)
+    async with semaphore:
+        return await loop.run_in_executor(
+            _async_executor, functools.partial(function, *args))
+
+
+async def aiter_replays(directory, lazy=True, **kwargs):
+    # Async iterator over the replays of a directory, yielding the name and
+    # the loaded Replay of each in the order of find_replays
+    # By default only the .header files are loaded (see Replay), so the race
+    # infos are available right away. Replays are loaded concurrently up to
+    # the limit of the async API
+    import asyncio
+    names = await _run_blocking(find_replays, directory)
+    # Loads are started ahead of the replay that is yielded next, but not
+    # for the whole directory at once
+    window = 2 * _async_limit
+    pending = deque()
+    try:
+        for name in names:
+            pending.append((name, asyncio.ensure_future(Replay.aload(
+                os.path.join(directory, name), lazy=lazy, **kwargs))))
+            if len(pending) >= window:
+                name, task = pending.popleft()
+                yield name, await task
+        while pending:
+            name, task = pending.popleft()
+            yield name, await task
+    finally:
+        # Iteration stopped early or a load failed
+        for name, task in pending:
+            task.cancel()
+
+
+# Regular expressions to find the end of JSON values without decoding them
+_json_whitespace = re.compile(rb'[ \t\n\r]*')
+_json_string = re.compile(rb'"(?:[^"\\]|\\.)*"')
+_json_scalar = re.compile(rb'[^,:\]}\s]*')
+_json_token = re.compile(rb'"(?:[^"\\]|\\.)*"|[\[\]{}]')
+
+
+def _skip_whitespace(buf, pos):
+    # Return the position of the next character that isn't whitespace
+    return _json_whitespace.match(buf, pos).end()
+
+
+def _value_end(buf, pos):
+    # Return the position after the JSON value starting at pos
+    # Containers are skipped by counting the brackets outside of strings, so
+    # no Python objects are created for their content
+    first = buf[pos:pos + 1]
+    if first == b'"':
+        return _json_string.match(buf, pos).end()
+    if first != b'[' and first != b'{':
+        return _json_scalar.match(buf, pos).end()
+    depth = 0
+    for match in _json_token.finditer(buf, pos):
+        token = match.group()
+        if token == b'[' or token == b'{':
+            depth += 1
+        elif token == b']' or token == b'}':
+            depth -= 1
+            if depth == 0:
+                return match.end()
+    raise ValueError('Unterminated JSON value at position {}'.format(pos))
+
+
+def _iter_array(buf, pos):
+    # Yield start and end position of every element of the JSON array at pos
+    if buf[pos:pos + 1] != b'[':
+        raise ValueError('Expected JSON array at position {}'.format(pos))
+    pos = _skip_whitespace(buf, pos + 1)
+    if buf[pos:pos + 1] == b']':
+        return
+    while True:
+        end = _value_end(buf, pos)
+        yield pos, end
+        pos = _skip_whitespace(buf, end)
+        separator = buf[pos:pos + 1]
+        if separator == b']':
+            return
+        if separator != b',':
+            raise ValueError('Invalid JSON array at position {}'.format(pos))
+        pos = _skip_whitespace(buf, pos + 1)
+
+
+def _iter_object(buf, pos):
+    # Yield key, start and end position of the value of every member of the
+    # JSON object at pos
+    if buf[pos:pos + 1] != b'{':
+        raise ValueError('Expected JSON object at position {}'.format(pos))
+    pos = _skip_whitespace(buf, pos + 1)
+    if buf[pos:pos + 1] == b'}':
+        return
+    while True:
+        key_end = _value_end(buf, pos)
+        key = json.loads(buf[pos:key_end])
+        colon = _skip_whitespace(buf, key_end)
+        if buf[colon:colon + 1] != b':':
+            raise ValueError('Invalid JSON object at position {}'.format(pos))
+        start = _skip_whitespace(buf, colon + 1)
+        end = _value_end(buf, start)
+        yield key, start, end
+        pos = _skip_whitespace(buf, end)
+        separator = buf[pos:pos + 1]
+        if separator == b'}':
+            return
+        if separator != b',':
+            raise ValueError('Invalid JSON object at position {}'.format(pos))
+        pos = _skip_whitespace(buf, pos + 1)
+
+
+def _find_keys(buf, key):
+    # Return the start positions of the keys and values of all members named
+    # key as a list of tuples
+    # In valid JSON an unescaped quoted string followed by a colon is always
+    # an object key, so the members can be found without parsing the file
+    needle = json.dumps(key).encode()
+    positions = []
+    pos = buf.find(needle)
+    while pos != -1:
+        after = pos + len(needle)
+        # Skip quotes that are escaped by an odd number of backslashes
+        escapes = 0
+        while pos > escapes and buf[pos - escapes - 1] == 0x5C:
+            escapes += 1
+        colon = _skip_whitespace(buf, after)
+        if escapes % 2 == 0 and buf[colon:colon + 1] == b':':
+            positions.append((pos, _skip_whitespace(buf, colon + 1)))
+        pos = buf.find(needle, after)
+    return positions
+
+
+_replay_config_keys = ('racingTeamID', 'racingTeamConfiguration',
+                       'startPositionIndex')
+
+
+def _scan_replay_configs(buf):
+    # Decode only racingTeamID, racingTeamConfiguration and startPositionIndex
+    # of every driver in a .replay file, the recorded race data is skipped
+    # Returns a list of dicts with those three keys, in the order of the file,
+    # and a list with the byte range of each racingTeamConfiguration
+    # Fast path: Search the keys directly. This is only valid if each key
+    # appears exactly once per driver, otherwise walk the array structure
+    found = [_find_keys(buf, key) for key in _replay_config_keys]
+    if all(len(positions) == len(found[0]) for positions in found):
+        entries = []
+        spans = []
+        for positions in zip(*found):
+            entry = {}
+            for key, (_, start) in zip(_replay_config_keys, positions):
+                end = _value_end(buf, start)
+                entry[key] = codec.loads(buf[start:end])
+                if key == 'racingTeamConfiguration':
+                    spans.append((start, end))
+            entries.append(entry)
+        ids = [entry['racingTeamID'] for entry in entries]
+        if len(set(ids)) == len(ids):
+            return entries, spans
+
+    entries = []
+    spans = []
+    for start, end in _iter_array(buf, _skip_whitespace(buf, 0)):
+        entry = {}
+        for key, value_start, value_end in _iter_object(buf, start):
+            if key in _replay_config_keys:
+                entry[key] = codec.loads(buf[value_start:value_end])
+                if key == 'racingTeamConfiguration':
+                    spans.append((value_start, value_end))
+        entries.append(entry)
+    return entries, spans
+
+
+class Cancelled(Exception):
+    # Raised in the thread running a ProgressTracker that has been cancelled
+    pass
+
+
+class ProgressTracker:
+    # Counts the bytes processed while loading or saving in a thread
+    # Functions run with run report the bytes they read, decompress, copy or
+    # write with _report_progress. After cancel, the next report raises
+    # Cancelled, unless the work has reached a point where stopping would
+    # leave files inconsistent (see _disable_cancel)
+
+    def __init__(self, total):
+        self.total = total
+        self.done = 0
+        self.cancelled = False
+        self.cancellable = True
+
+    def run(self, function, *args):
+        # Run function(*args) in the current thread and track its progress
+        _progress.tracker = self
+        try:
+            return function(*args)
+        finally:
+            _progress.tracker = None
+
+    def advance(self, count):
+        # Add count processed bytes
+        if self.cancelled and self.cancellable:
+            raise Cancelled()
+        self.done += count
+
+    def fraction(self):
+        # Return the processed part, as total is only an estimate it's capped
+        if self.total <= 0:
+            return 0
+        return min(self.done / self.total, 1)
+
+    def cancel(self):
+        # Stop the work at the next report of progress
+        self.cancelled = True
+
+
+# ProgressTracker of each thread
+_progress = threading.local()
+
+
+def _report_progress(count):
+    # Report count processed bytes to the ProgressTracker of this thread
+    tracker = getattr(_progress, 'tracker', None)
+    if tracker is not None:
+        tracker.advance(count)
+
+
+def _disable_cancel():
+    # Ignore cancelling from now on in the ProgressTracker of this thread
+    tracker = getattr(_progress, 'tracker', None)
+    if tracker is not None:
+        tracker.cancellable = False
+
+
+# Size of the chunks used if data can't be copied inside the kernel, and of
+# the chunks copied inside the kernel at once
+_copy_chunk_size = 1024 * 1024
+_kernel_copy_size = 64 * 1024 * 1024
+
+
+def _read_file(file):
+    # Read the whole binary file into a bytearray in chunks and report them
+    data = bytearray(os.fstat(file.fileno()).st_size)
+    view = memoryview(data)
+    position = 0
+    while position < len(data):
+        count = file.readinto(view[position:position + _copy_chunk_size])
+        if not count:
+            break
+        position += count
+        _report_progress(count)
+    del view
+    if position < len(data):
+        del data[position:]
+    else:
+        # The file might have grown
+        data += file.read()
+    return data
+
+
+def _read_ahead(file):
+    # Read the binary file in chunks if the progress is tracked, so the
+    # following scan of the memory mapped file doesn't stall on disk reads
+    # without reporting anything
+    if getattr(_progress, 'tracker', None) is None:
+        return
+    buffer = bytearray(_copy_chunk_size)
+    while True:
+        count = file.readinto(buffer)
+        if not count:
+            break
+        _report_progress(count)
+    file.seek(0)
+
+
+def _skip_whitespace_back(buf, pos):
+    # Return the position of the last character before pos that isn't
+    # whitespace
+    pos -= 1
+    while pos > 0 and buf[pos] in b' \t\n\r':
+        pos -= 1
+    return pos
+
+
+def _index_replay_entries(buf):
+    # Find the entries of the top-level array of a .replay file
+    # Returns a list with start and end of each entry and a dict with the
+    # byte ranges of the members that are already known
+    # Fast path: Use the members of the configuration keys to find the
+    # entries, like _scan_replay_configs. This works if one of them is the
+    # first member of each entry, otherwise walk the array structure
+    found = [_find_keys(buf, key) for key in _replay_config_keys]
+    if found[0] and all(len(keys) == len(found[0]) for keys in found):
+        bounds = []
+        for keys in zip(*found):
+            first = min(key_start for key_start, _ in keys)
+            start = _skip_whitespace_back(buf, first)
+            if buf[start:start + 1] != b'{':
+                break
+            bounds.append(start)
+        else:
+            previous = _skip_whitespace_back(buf, bounds[0])
+            ends = [_skip_whitespace_back(buf, start) for start in
+                    bounds[1:]] + [_skip_whitespace_back(buf, len(buf))]
+            separators = [buf[end:end + 1] for end in ends]
+            ids = [codec.loads(buf[start:_value_end(buf, start)])
+                   for _, start in found[0]]
+            if (len(set(ids)) == len(ids) and
+                    buf[previous:previous + 1] == b'[' and
+                    separators[-1] == b']' and
+                    all(sep == b',' for sep in separators[:-1])):
+                entries = []
+                for start, end, keys in zip(bounds, ends, zip(*found)):
+                    end = _skip_whitespace_back(buf, end) + 1
+                    members = {}
+                    for key, (_, value_start) in zip(_replay_config_keys,
+                                                     keys):
+                        members[key] = (value_start,
+                                        _value_end(buf, value_start))
+                    entries.append((start, end, members))
+                return entries
+
+    return [(start, end, {}) for start, end in
+            _iter_array(buf, _skip_whitespace(buf, 0))]
+
+
+def _copy_range(source, target, offset, count):
+    # Copy count bytes starting at offset of the file descriptor source to the
+    # current position of the file descriptor target
+    # The data is copied inside the kernel with copy_file_range or sendfile
+    # if the platform supports it, otherwise it is read and written in chunks
+    end = offset + count
+    copy_functions = []
+    if hasattr(os, 'copy_file_range'):
+        copy_functions.append(
+            lambda size: os.copy_file_range(source, target, size, offset))
+    if hasattr(os, 'sendfile'):
+        copy_functions.append(
+            lambda size: os.sendfile(target, source, offset, size))
+    for copy_function in copy_functions:
+        try:
+            while offset < end:
+                copied = copy_function(min(end - offset, _kernel_copy_size))
+                if copied == 0:
+                    raise OSError('Unexpected end of file')
+                offset += copied
+                _report_progress(copied)
+            return
+        except OSError:
+            # Not supported for these files, try the next function
+            pass
+    os.lseek(source, offset, os.SEEK_SET)
+    while offset < end:
+        chunk = os.read(source, min(_copy_chunk_size, end - offset))
+        if not chunk:
+            raise OSError('Unexpected end of file')
+        _write_all(target, chunk)
+        offset += len(chunk)
+        _report_progress(len(chunk))
+
+
+def _write_all(target, data):
+    # Write all of data to the file descriptor target
+    view = memoryview(data)
+    while view:
+        view = view[os.write(target, view):]
+
+
+def _same_file(source, target):
+    # Check if both paths point to the same file
+    if os.path.exists(target):
+        return os.path.samefile(source, target)
+    return False
+
+
+def _splice_file(source, target, patches):
+    # Write a copy of the file source to target, in which the byte ranges of
+    # patches (dict of start, end and the new data) are replaced
+    # Returns a dict with the new start and end of each patch in target
+    # The file is written to a temporary file first, so source and target can
+    # be the same file
+    if not patches:
+        # Unchanged: Copy the whole file (inside the kernel if possible)
+        if not _same_file(source, target):
+            shutil.copyfile(source, target)
+        return {}
+
+    binary = getattr(os, 'O_BINARY', 0)
+    temp = '{}.tmp'.format(target)
+    spans = {}
+    source_fd = os.open(source, os.O_RDONLY | binary)
+    try:
+        target_fd = os.open(temp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC |
+                            binary, 0o666)
+        try:
+            position = 0  # Position in source
+            written = 0  # Position in target
+            for key in sorted(patches, key=lambda key: patches[key][0]):
+                start, end, data = patches[key]
+                _copy_range(source_fd, target_fd, position, start - position)
+                written += start - position
+                _write_all(target_fd, data)
+                spans[key] = (written, written + len(data))
+                written += len(data)
+                position = end
+            size = os.fstat(source_fd).st_size
+            _copy_range(source_fd, target_fd, position, size - position)
+        finally:
+            os.close(target_fd)
+    except BaseException:
+        os.close(source_fd)
+        os.remove(temp)
+        raise
+    os.close(source_fd)
+    os.replace(temp, target)
+    return spans
+
+
+def _shift_spans(spans, replaced):
+    # Return the byte ranges in the dict spans after some of them have been
+    # replaced with _splice_file, replaced maps their keys to the new ranges
+    shifted = {}
+    offset = 0
+    for key, (start, end) in sorted(spans.items(),
+                                    key=lambda item: item[1][0]):
+        if key in replaced:
+            shifted[key] = replaced[key]
+            offset = replaced[key][1] - end
+        else:
+            shifted[key] = (start + offset, end + offset)
+    return shifted
+
+
+def _position_shifter(replaced):
+    # Return a function that maps positions in a file to the positions after
+    # the byte ranges in replaced (list of old and new range) have been
+    # replaced with _splice_file
+    ends = []
+    offsets = []
+    offset = 0
+    for (start, end), (new_start, new_end) in sorted(replaced):
+        offset += (new_end - new_start) - (end - start)
+        ends.append(end)
+        offsets.append(offset)
+
+    def shift(position):
+        i = bisect.bisect_right(ends, position)
+        return position + offsets[i - 1] if i else position
+    return shift
+
+
+def _json_default(value):
+    # Encode values the json module doesn't know, like FrameTable
+    if isinstance(value, FrameTable):
+        return value.to_list()
+    raise TypeError('Object of type {} is not JSON serializable'.format(
+        type(value).__name__))
+
+
+def _encode_json(data):
+    # Encode data into the compact JSON format used by the game
+    return json.dumps(data, separators=(',', ':'), default=_json_default)
+
+
+# Number of list elements encoded at once by _iterencode_json and size of
+# the write buffer when saving
+_encode_batch_size = 1000
+_write_buffer_size = 1024 * 1024
+
+
+def _iterencode_json(data, depth=4):
+    # Encode data like _encode_json, but yield the result in small parts
+    # Dicts and short lists are split into their members up to depth levels,
+    # long lists are encoded in batches of elements. The parts are encoded by
+    # the C encoder of the json module and the output stays identical
+    # FrameTables are always converted back to lists in batches
+    if isinstance(data, FrameTable):
+        yield '['
+        for i in range(0, len(data), _encode_batch_size):
+            if i:
+                yield ','
+            yield _encode_json(data.to_list(i, i + _encode_batch_size))[1:-1]
+        yield ']'
+    elif depth > 0 and isinstance(data, dict) and all(
+            isinstance(key, str) for key in data):
+        yield '{'
+        first = True
+        for key, value in data.items():
+            yield '{}{}:'.format('' if first else ',', json.dumps(key))
+            yield from _iterencode_json(value, depth - 1)
+            first = False
+        yield '}'
+    elif depth > 0 and isinstance(data, list):
+        yield '['
+        if len(data) <= _encode_batch_size:
+            for i, value in enumerate(data):
+                if i:
+                    yield ','
+                yield from _iterencode_json(value, depth - 1)
+        else:
+            for i in range(0, len(data), _encode_batch_size):
+                if i:
+                    yield ','
+                # Encode a slice and remove its brackets
+                yield _encode_json(data[i:i + _encode_batch_size])[1:-1]
+        yield ']'
+    else:
+        yield _encode_json(data)
+
+
+def _write_json(filename, data):
+    # Encode data into the compact JSON format and write it to the file
+    # without creating the whole encoded text in memory
+    # The file is written to a temporary file first, so it's only replaced
+    # once it is complete
+    temp = '{}.tmp'.format(filename)
+    try:
+        with open(temp, 'w', buffering=_write_buffer_size) as file:
+            for part in _iterencode_json(data):
+                file.write(part)
+                _report_progress(len(part))
+    except BaseException:
+        if os.path.exists(temp):
+            os.remove(temp)
+        raise
+    os.replace(temp, filename)
+
+
+def _import_backend(name):
+    # Return the loads function of an accelerated JSON library
+    if name == 'orjson':
+        import orjson
+        return orjson.loads
+    if name == 'simdjson':
+        import simdjson
+        return simdjson.loads
+    if name == 'ujson':
+        import ujson
+        return ujson.loads
+    raise ValueError('Unknown JSON backend: {}'.format(name))
+
+
+# Translation table turning digits into 0, keeping dots and turning everything
+# else into spaces, so integers with at least 19 digits (the ones that may not
+# fit into 64 bits) can be found with a plain search, see _has_long_integer
+_INTEGER_TABLE = bytes(
+    ord('0') if byte in b'0123456789' else byte if byte == ord('.')
+    else ord(' ') for byte in range(256))
+_LONG_INTEGER = b'0' * 19
+
+
+def _has_long_integer(data):
+    # Check if the JSON text in data (str or bytes) may contain an integer
+    # with at least 19 digits. Digits after a dot are fractions of floats and
+    # don't count, digits in strings give a false positive
+    if isinstance(data, str):
+        data = data.encode()
+    digits = data.translate(_INTEGER_TABLE)
+    return (digits.startswith(_LONG_INTEGER) or
+            b' ' + _LONG_INTEGER in digits)
+
+
+class JSONCodec:
+    # Decodes and encodes the JSON of the replay files
+    # Decoding uses the loads function of the backend. Encoding always uses
+    # the json module, as the accelerated libraries format floats (1e+16) and
+    # non-ASCII characters differently and saved files must stay identical
+    # JSON backends in the order they are preferred, json is always available
+    backends = ('orjson', 'simdjson', 'ujson', 'json')
+
+    def __init__(self, backend='json'):
+        # The library of the backend is only imported when the first file is
+        # decoded, so importing this module stays cheap
+        if backend not in self.backends:
+            raise ValueError('Unknown JSON backend: {}'.format(backend))
+        if (backend != 'json' and
+                importlib.util.find_spec(backend) is None):
+            raise ImportError('No module named {}'.format(backend))
+        self.backend = backend
+        self._loads = json.loads if backend == 'json' else None
+
+    @classmethod
+    def available(cls):
+        # Return the names of the backends that are installed
+        available = []
+        for backend in cls.backends:
+            try:
+                cls(backend)
+            except ImportError:
+                continue
+            available.append(backend)
+        return available
+
+    @classmethod
+    def fastest(cls):
+        # Return a codec using the first backend that can be imported
+        return cls(cls.available()[0])
+
+    def loads(self, data):
+        # Decode the JSON text in data (str or bytes)
+        if self._loads is None:
+            self._loads = _import_backend(self.backend)
+        if self.backend == 'orjson' and _has_long_integer(data):
+            # orjson decodes integers that don't fit into 64 bits into
+            # floats, which would change the file when it's saved
+            return json.loads(data)
+        try:
+            return self._loads(data)
+        except (ValueError, RuntimeError):
+            # The libraries reject some things the json module accepts, like
+            # NaN or (simdjson, which raises RuntimeError for some of them)
+            # integers with more than 64 bits. Decoding again also gives the
+            # same error messages for invalid JSON
+            if self._loads is json.loads:
+                raise
+            return json.loads(data)
+
+    def dumps(self, data):
+        # Encode data into the compact JSON format used by the game
+        return _encode_json(data)
+
+    def write(self, filename, data):
+        # Encode data like dumps and write it to the file in parts
+        _write_json(filename, data)
+
+
+# Codec used for all replay files, see set_json_backend
+codec = JSONCodec.fastest()
+
+
+def set_json_backend(backend):
+    # Use the given JSON backend (one of JSONCodec.backends) for all files
+    global codec
+    codec = JSONCodec(backend)
 
 
 class ReplayFile:
     data = []
 
-    def __init__(self, filename):
+    def __init__(self, filename, config_only=False):
+        # If config_only is set, only racingTeamID, racingTeamConfiguration
+        # and startPositionIndex of each driver are loaded into data
         self.filename = filename
+        self.config_only = config_only
+        # Byte ranges of the configurations in the file and the indices of
+        # the drivers that have been changed since loading or saving
+        self.spans = []
+        self.changed = set()
+        # Position of each driver in data by racingTeamID
+        self.index = {}
         self.load(filename)
 
     def load(self, filename):
         # Decode .replay file from JSON format
-        with open('{}.replay'.format(filename), 'r') as file:
-            self.data = json.loads(file.readline())
+        self.filename = filename
+        self.changed = set()
+        if self.config_only:
+            # Scan the memory mapped file instead of decoding all of it
+            with open('{}.replay'.format(filename), 'rb') as file:
+                _read_ahead(file)
+                with mmap.mmap(file.fileno(), 0,
+                               access=mmap.ACCESS_READ) as buf:
+                    self.data, self.spans = _scan_replay_configs(buf)
+        else:
+            with open('{}.replay'.format(filename), 'rb') as file:
+                self.data = codec.loads(_read_file(file))
+        self.build_index()
+
+    def close(self):
+        # Nothing is kept open once the file has been loaded
+        pass
+
+    def build_index(self):
+        # Map the racingTeamID of each driver to its position in data
+        self.index = {driver['racingTeamID']: i
+                      for i, driver in enumerate(self.data)}
 
     def save(self, filename):
         # Encode .replay file into JSON format
-        with open('{}.replay'.format(filename), 'w') as file:
-            file.write(json.dumps(self.data, separators=(',', ':')))
+        if self.config_only:
+            # Only the configurations have been loaded, so everything else is
+            # copied from the file the replay has been loaded from and only the
+            # changed configurations are encoded
+            patches = {}
+            for i in self.changed:
+                config = self.data[i]['racingTeamConfiguration']
+                start, end = self.spans[i]
+                patches[i] = (start, end, codec.dumps(config).encode())
+            spans = _splice_file('{}.replay'.format(self.filename),
+                                 '{}.replay'.format(filename), patches)
+            # Byte ranges now refer to the saved file
+            spans = _shift_spans(dict(enumerate(self.spans)), spans)
+            self.spans = [spans[i] for i in range(len(self.spans))]
+            self.filename = filename
+            self.changed = set()
+        else:
+            codec.write('{}.replay'.format(filename), self.data)
 
     def get_drivers(self):
         # Return a list of the drivers in the replay
@@ -80,61 +1076,301 @@ class ReplayFile:
 
     def get_driver_info(self, id):
         # Return the driver info needed for edit
-        # Search for correct driver in data
-        for driver in self.data:
-            if driver['racingTeamID'] == id:
-                info = driver['racingTeamConfiguration']
-                racername = info['racerName']
-                driverskin = info['driverSkin']
-                driverskinlivery = info['driverSkinLivery']
-                helmet = info['helmet']
-                helmetlivery = info['helmetLivery']
-                idleanimation = info['idleAnimation']
-                celebrationanimation = info['celebrationAnimation']
-                return {'racerName': racername, 'driverSkin': driverskin,
-                        'driverSkinLivery': driverskinlivery, 'helmet': helmet,
-                        'helmetLivery': helmetlivery,
-                        'idleAnimation': idleanimation,
-                        'celebrationAnimation': celebrationanimation}
         # If id can't be found, return None
-        return None
+        if id not in self.index:
+            return None
+        info = self.data[self.index[id]]['racingTeamConfiguration']
+        return {key: info[key] for key in DRIVER_KEYS}
 
     def change_driver_info(self, id, driver_info):
         # Change the driver info in the replay
-        # Search for correct driver in data
-        for driver in self.data:
-            if driver['racingTeamID'] == id:
-                info = driver['racingTeamConfiguration']
-                info['racerName'] = driver_info['racerName']
-                info['driverSkin'] = driver_info['driverSkin']
-                info['driverSkinLivery'] = driver_info['driverSkinLivery']
-                info['helmet'] = driver_info['helmet']
-                info['helmetLivery'] = driver_info['helmetLivery']
-                info['idleAnimation'] = driver_info['idleAnimation']
-                info['celebrationAnimation'] = driver_info['celebrationAnimation']
+        self.apply_edits({id: {key: driver_info[key] for key in DRIVER_KEYS}})
 
     def get_car_info(self, id):
         # Return the car info needed for edit
-        # Search for correct driver in data
-        for driver in self.data:
-            if driver['racingTeamID'] == id:
-                info = driver['racingTeamConfiguration']
-                racername = info['racerName']
-                vehicle = info['vehicle']
-                vehiclelivery = info['vehicleLivery']
-                return {'racerName': racername, 'vehicle': vehicle,
-                        'vehicleLivery': vehiclelivery}
-        # If Id can't be found, return None
-        return None
+        # If id can't be found, return None
+        if id not in self.index:
+            return None
+        info = self.data[self.index[id]]['racingTeamConfiguration']
+        return {key: info[key] for key in ('racerName',) + CAR_KEYS}
 
     def change_car_info(self, id, car_info):
         # Change the car info in the replay
-        # Search for correct driver in data
-        for driver in self.data:
-            if driver['racingTeamID'] == id:
-                info = driver['racingTeamConfiguration']
-                info['vehicle'] = car_info['vehicle']
-                info['vehicleLivery'] = car_info['vehicleLivery']
+        self.apply_edits({id: {key: car_info[key] for key in CAR_KEYS}})
+
+    def apply_edits(self, edits):
+        # Change the configurations of many drivers at once
+        # edits maps racingTeamID to a dict with the values to change, drivers
+        # that can't be found are ignored
+        for id, edit in edits.items():
+            if id in self.index:
+                i = self.index[id]
+                _update_config(self.data[i]['racingTeamConfiguration'], edit)
+                self.changed.add(i)
+
+
+class ReplayEntryView(Mapping):
+    # Read-only view of one driver entry of a memory mapped .replay file
+    # Members are indexed and decoded only when they are accessed, decoded
+    # values are kept, so changes to them are visible through the view
+
+    def __init__(self, owner, start, end, members=None):
+        self.owner = owner
+        self.start = start
+        self.end = end
+        # Byte ranges of the members known so far and their decoded values
+        self.members = dict(members or {})
+        self.indexed = False
+        self.values = {}
+
+    def index(self):
+        # Find the byte ranges of all members of the entry
+        if not self.indexed:
+            self.members = {key: (start, end) for key, start, end
+                            in _iter_object(self.owner.buf, self.start)}
+            self.indexed = True
+
+    def span(self, key):
+        # Return the byte range of the value of the member key
+        if key not in self.members:
+            self.index()
+        return self.members[key]
+
+    def shift(self, shift):
+        # Move all byte ranges after the file has been saved
+        self.start = shift(self.start)
+        self.end = shift(self.end)
+        self.members = {key: (shift(start), shift(end))
+                        for key, (start, end) in self.members.items()}
+
+    def __getitem__(self, key):
+        if key not in self.values:
+            start, end = self.span(key)
+            self.values[key] = codec.loads(self.owner.buf[start:end])
+        return self.values[key]
+
+    def __contains__(self, key):
+        if key not in self.members:
+            self.index()
+        return key in self.members
+
+    def __iter__(self):
+        self.index()
+        return iter(self.members)
+
+    def __len__(self):
+        self.index()
+        return len(self.members)
+
+
+class MappedReplayFile(ReplayFile):
+    # Variant of ReplayFile that keeps the .replay file memory mapped
+    # Only the boundaries of the drivers are indexed on load, data contains a
+    # ReplayEntryView for each of them that decodes its members on access
+    buf = None
+
+    def __init__(self, filename):
+        self.file = None
+        ReplayFile.__init__(self, filename, config_only=True)
+
+    def load(self, filename):
+        # Map .replay file into memory and index the drivers in it
+        self.close()
+        self.filename = filename
+        self.changed = set()
+        self.file = open('{}.replay'.format(filename), 'rb')
+        _read_ahead(self.file)
+        self.buf = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+        self.data = self._index_entries()
+        self.build_index()
+
+    def _index_entries(self):
+        # Return a view for each entry of the top-level array
+        return [ReplayEntryView(self, start, end, members) for
+                start, end, members in _index_replay_entries(self.buf)]
+
+    def close(self):
+        # Unmap and close the .replay file
+        if self.buf is not None:
+            self.buf.close()
+            self.buf = None
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def save(self, filename):
+        # Encode .replay file into JSON format
+        # Only the changed configurations are encoded, everything else is
+        # copied from the mapped file
+        patches = {}
+        for i in self.changed:
+            config = self.data[i]['racingTeamConfiguration']
+            start, end = self.data[i].span('racingTeamConfiguration')
+            patches[i] = (start, end, codec.dumps(config).encode())
+        # The mapping is closed while saving, as mapped files can't be
+        # replaced on every platform
+        self.close()
+        try:
+            spans = _splice_file('{}.replay'.format(self.filename),
+                                 '{}.replay'.format(filename), patches)
+        except BaseException:
+            self.file = open('{}.replay'.format(self.filename), 'rb')
+            self.buf = mmap.mmap(self.file.fileno(), 0,
+                                 access=mmap.ACCESS_READ)
+            raise
+        # Map the saved file and move the views to their new byte ranges
+        shift = _position_shifter(
+            [(patches[i][:2], spans[i]) for i in patches])
+        for view in self.data:
+            view.shift(shift)
+        self.filename = filename
+        self.changed = set()
+        self.file = open('{}.replay'.format(filename), 'rb')
+        self.buf = mmap.mmap(self.file.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _import_numpy(feature='The columnar mode'):
+    # NumPy is only needed for some features, so it's imported on use
+    try:
+        import numpy
+    except ImportError:
+        raise ImportError('{} needs NumPy, install it with: '
+                          'pip install numpy'.format(feature)) from None
+    return numpy
+
+
+def _to_column(values, numpy):
+    # Convert a list of numbers of the same type, or a list of lists with the
+    # same length containing numbers of the same type, into a NumPy array
+    # Returns the list itself if it can't be converted without changing how
+    # the values are encoded (1 and 1.0 are different in JSON)
+    types = set(map(type, values))
+    if len(types) == 1 and list in types:
+        if len(set(map(len, values))) != 1:
+            return values
+        types = set(type(value) for row in values for value in row)
+    if types == {float}:
+        return numpy.array(values, dtype=numpy.float64)
+    if types == {int}:
+        try:
+            return numpy.array(values, dtype=numpy.int64)
+        except OverflowError:
+            return values
+    return values
+
+
+class FrameTable:
+    # Columnar representation of a list of frames (dicts with the same keys)
+    # or of a list of numbers, with one NumPy array per key
+    # Columns that can't be converted stay lists. If keys is None, the table
+    # represents a list of numbers in the column None
+    # Tables with less rows than this aren't worth converting
+    min_rows = 16
+
+    def __init__(self, keys, columns, length):
+        self.keys = keys
+        self.columns = columns
+        self.length = length
+
+    @classmethod
+    def convert(cls, values, numpy):
+        # Return a FrameTable for the list values, or None if it isn't a list
+        # of frames or numbers or if none of its columns would be an array
+        if len(values) < cls.min_rows:
+            return None
+        if type(values[0]) is dict:
+            keys = tuple(values[0])
+            for value in values:
+                if type(value) is not dict or tuple(value) != keys:
+                    return None
+            columns = {key: _to_column([value[key] for value in values],
+                                       numpy) for key in keys}
+        else:
+            keys = None
+            columns = {None: _to_column(values, numpy)}
+        if not any(isinstance(column, numpy.ndarray)
+                   for column in columns.values()):
+            return None
+        return cls(keys, columns, len(values))
+
+    def __len__(self):
+        return self.length
+
+    def to_list(self, start=0, stop=None):
+        # Return the rows from start to stop in their original form
+        columns = []
+        for column in self.columns.values():
+            column = column[start:stop]
+            if not isinstance(column, list):
+                column = column.tolist()
+            columns.append(column)
+        if self.keys is None:
+            return columns[0]
+        return [dict(zip(self.keys, row)) for row in zip(*columns)]
+
+
+class ColumnarReplayFile(ReplayFile):
+    # Variant of ReplayFile that stores the recorded race data in columns
+    # All lists of frames or numbers in the entries (except for the driver
+    # configuration) are replaced by FrameTables with a NumPy array per key.
+    # They are converted back to lists in batches when saving
+    # Needs NumPy
+    # Entries are nested this deep at most before they aren't searched for
+    # lists to convert anymore
+    max_depth = 4
+
+    def __init__(self, filename):
+        ReplayFile.__init__(self, filename, config_only=False)
+
+    def load(self, filename):
+        # Decode the entries of the .replay file one by one and convert them,
+        # so not all of the race data exists as Python objects at once
+        numpy = _import_numpy()
+        self.filename = filename
+        self.changed = set()
+        self.data = []
+        with open('{}.replay'.format(filename), 'rb') as file:
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as buf:
+                for start, end, members in _index_replay_entries(buf):
+                    entry = codec.loads(buf[start:end])
+                    for key, value in entry.items():
+                        if key not in _replay_config_keys:
+                            entry[key] = self._convert(value, numpy, 1)
+                    self.data.append(entry)
+                    _report_progress(end - start)
+        self.build_index()
+
+    def _convert(self, value, numpy, depth):
+        # Replace lists of frames or numbers in value by FrameTables
+        if isinstance(value, dict) and depth < self.max_depth:
+            for key in value:
+                value[key] = self._convert(value[key], numpy, depth + 1)
+        elif isinstance(value, list):
+            table = FrameTable.convert(value, numpy)
+            if table is not None:
+                return table
+            if depth < self.max_depth:
+                for i, element in enumerate(value):
+                    value[i] = self._convert(element, numpy, depth + 1)
+        return value
+
+    def get_tables(self, id):
+        # Return all FrameTables of a driver, mapped to the path of keys and
+        # list positions at which they are found in the entry
+        tables = {}
+
+        def find(value, path):
+            if isinstance(value, FrameTable):
+                tables[path] = value
+            elif isinstance(value, dict):
+                for key in value:
+                    find(value[key], path + (key,))
+            elif isinstance(value, list):
+                for i, element in enumerate(value):
+                    find(element, path + (i,))
+        if id in self.index:
+            find(self.data[self.index[id]], ())
+        return tables
 
 
 class HeaderFile:
@@ -142,17 +1378,53 @@ class HeaderFile:
 
     def __init__(self, filename):
         self.filename = filename
+        # Byte ranges of the entries of configsById in the file (None until
+        # they are needed for saving) and the ids of the drivers that have
+        # been changed since loading or saving
+        self.spans = None
+        self.changed = set()
         self.load(filename)
 
     def load(self, filename):
         # Decode .header file from JSON format
-        with open('{}.header'.format(filename), 'r') as file:
-            self.data = json.loads(file.readline())
+        self.filename = filename
+        self.changed = set()
+        with open('{}.header'.format(filename), 'rb') as file:
+            raw = file.read()
+        _report_progress(len(raw))
+        self.data = codec.loads(raw)
+        self.spans = None
+
+    def find_spans(self):
+        # Return the byte ranges of the entries of configsById in the file
+        # Most headers are only read for the race info, so this is only done
+        # when the header is saved
+        with open('{}.header'.format(self.filename), 'rb') as file:
+            raw = file.read()
+        spans = {}
+        for key, start, end in _iter_object(raw, _skip_whitespace(raw, 0)):
+            if key == 'configsById':
+                for id, id_start, id_end in _iter_object(raw, start):
+                    spans[id] = (id_start, id_end)
+        return spans
 
     def save(self, filename):
         # Encode .header file into JSON format
-        with open('{}.header'.format(filename), 'w') as file:
-            file.write(json.dumps(self.data, separators=(',', ':')))
+        # Only the changed driver configurations are encoded, everything else
+        # is copied from the file the header has been loaded from
+        if self.spans is None:
+            self.spans = self.find_spans()
+        patches = {}
+        for id in self.changed:
+            config = self.data['configsById'][id]
+            start, end = self.spans[id]
+            patches[id] = (start, end, codec.dumps(config).encode())
+        spans = _splice_file('{}.header'.format(self.filename),
+                             '{}.header'.format(filename), patches)
+        # Byte ranges now refer to the saved file
+        self.spans = _shift_spans(self.spans, spans)
+        self.filename = filename
+        self.changed = set()
 
     def get_race_info(self):
         # Return race data
@@ -165,1053 +1437,1612 @@ class HeaderFile:
 
     def change_driver_info(self, id, driver_info):
         # Change the driver info in the header
-        # Search for correct driver in data
-        data = self.data['configsById']
-        for driver in data:
-            if driver == id:
-                data[driver]['racerName'] = driver_info['racerName']
-                data[driver]['driverSkin'] = driver_info['driverSkin']
-                data[driver]['driverSkinLivery'] = driver_info[
-                    'driverSkinLivery']
-                data[driver]['helmet'] = driver_info['helmet']
-                data[driver]['helmetLivery'] = driver_info['helmetLivery']
-                data[driver]['idleAnimation'] = driver_info['idleAnimation']
-                data[driver]['celebrationAnimation'] = driver_info[
-                    'celebrationAnimation']
+        self.apply_edits({id: {key: driver_info[key] for key in DRIVER_KEYS}})
 
     def change_car_info(self, id, car_info):
         # Change the car info in the header
-        # Search for correct driver in data
-        data = self.data['configsById']
-        for driver in data:
-            if driver == id:
-                data[driver]['vehicle'] = car_info['vehicle']
-                data[driver]['vehicleLivery'] = car_info['vehicleLivery']
-
-
-class Config:
-    def __init__(self):
-        # Open config file and read all entries
-        # If the file doesn't exist, create it
-        self.config = {}
-        if os.path.isfile('config'):
-            with open('config') as file:
-                for line in file:
-                    key, value = line.strip().split('=', 1)
-                    self.config[key] = value
-        else:
-            open('config', 'a').close()
-
-    def save_config(self):
-        # Save config file
-        with open('config', 'w') as file:
-            for key in self.config:
-                file.write('{}={}\n'.format(key, self.config[key]))
-
-    def get_path(self):
-        # Return path saved in config file
-        # If path doesn't exist, set current path as default path and return it
-        if 'PATH' in self.config:
-            if os.path.exists(self.config['PATH']):
-                return self.config['PATH']
-        else:
-            # Get current path
-            path = os.getcwd()
-            self.set_path(path)
-            return path
-
-    def set_path(self, path):
-        # Update path in config file
-        path = path.replace('\\', '/')  # No backslash in path
-        if os.path.exists(path):
-            self.config['PATH'] = path
-            self.save_config()
-
-
-class GUI:
-    config = Config()
-    dir = config.get_path()
-    files = []
-    selected = None
-    replay_info = {}
-
-    def __init__(self):
-        # Create window
-        self.root = tk.Tk()
-        self.root.title('CS Replay Editor')
-        self.root.resizable(False, False)
-
-        # Adapt size of rows and columns to window
-        self.root.grid_columnconfigure(0, weight=1)
-        self.root.grid_columnconfigure(1, weight=1)
-        self.root.grid_rowconfigure(0, weight=0)
-        self.root.grid_rowconfigure(1, weight=1)
-
-        # Label and button to display and change the selected directory
-        dir_select = tk.Frame(self.root)
-        self.dir_label = tk.Label(dir_select, text=self.dir)
-        self.dir_label.grid(column=0, row=0, sticky='nesw')
-        dir_button = tk.Button(dir_select, text='Change',
-                               command=self.change_directory)
-        dir_button.grid(column=1, row=0, sticky='nesw')
-        dir_select.grid(column=0, row=0, columnspan=2, sticky='nesw')
-
-        # Listbox for all the replays that can be loaded
-        replay_selection = tk.Frame(self.root)
-        replay_selection.grid_columnconfigure(0, weight=1)  # Adapt to window
-        self.replay_box = tk.Listbox(replay_selection, exportselection=False)
-        self.replay_box.bind('<<ListboxSelect>>', self.replay_selected)
-        self.replay_box.grid(column=0, row=0, sticky='nesw')
-        scroll = tk.Scrollbar(replay_selection)
-        scroll.grid(column=1, row=0, sticky='nesw')
-        scroll.config(command=self.replay_box.yview)
-        self.replay_box.config(yscrollcommand=scroll.set)
-        replay_selection.grid(column=0, row=1, sticky='nesw')
-
-        # Replay info and edit button
-        rep_info = tk.Frame(self.root)
-        rep_info.grid_columnconfigure(0, weight=1)  # Adapt to window
-        self.info_1 = tk.Label(rep_info)
-        self.info_1.grid(column=0, row=0, sticky='nesw')
-        self.info_2 = tk.Label(rep_info)
-        self.info_2.grid(column=0, row=1, sticky='nesw')
-        self.info_3 = tk.Label(rep_info)
-        self.info_3.grid(column=0, row=2, sticky='nesw')
-        edit = tk.Button(rep_info, text='Edit', command=self.edit_replay)
-        edit.grid(column=0, row=3, sticky='nesw')
-        rep_info.grid(column=1, row=1, sticky='nesw')
-
-        # Find replays in current directory
-        self.load_replays()
-
-        # Start mainloop for GUI
-        self.root.mainloop()
-
-    def load_replays(self):
-        # Find loadable replays in current directory
-        # Each replay consists of a .header and .replay file with the same name
-        headers = []
-        replays = []
-        for file in os.listdir(self.dir):
-            if file.endswith('.header'):
-                headers.append(file[:-7])
-            elif file.endswith('.replay'):
-                replays.append(file[:-7])
-        files = []
-        for h in headers:
-            if h in replays:
-                files.append(h)
-        # Update the filelist
-        self.files = files
-
-        # Clear listbox and insert possible replays into it
-        self.replay_box.delete(0, 'end')
-        self.replay_box.insert('end', *self.files)
-
-    def change_directory(self):
-        # Prompt user to change directory. Updates files if changed
-        # Dialog will return '' if no directory has been selected, or the
-        # selected directory otherwise
-        new_dir = filedialog.askdirectory()
-        if new_dir:
-            if new_dir != self.dir:
-                self.dir = new_dir
-                self.dir_label.config(text=self.dir)
-                self.load_replays()
-
-                # Update config file
-                self.config.set_path(self.dir)
-
-                # Remove any replay infos stored or displayed from before
-                self.replay_info = {}
-                self.info_1.config(text='')
-                self.info_2.config(text='')
-                self.info_3.config(text='')
-
-    def replay_selected(self, event):
-        # If a replay is selected display replay info
-        selection = self.replay_box.get(self.replay_box.curselection())
-        # Only if a new replay is selected
-        if self.selected != selection:
-            self.selected = selection
-            if selection not in self.replay_info:
-                # Load info of replay file if not selected before
-                self.replay_info[selection] = Replay(
-                    os.path.join(self.dir, selection)).get_race_info()
-            # Display replay info on screen
-            info = self.replay_info[selection]
-            self.info_1.config(text='{} (#{})'.format(info[3], info[4]))
-            self.info_2.config(text='{} ({})'.format(info[1], info[2]))
-            self.info_3.config(text=info[0])
-
-    def edit_replay(self):
-        # Open the edit window for the selected replay
-        if self.selected:
-            edit = EditGUI(os.path.join(self.dir, self.selected))
-            # Hide main window until the edit window is closed
-            self.root.withdraw()
-            edit.window.wait_window()
-            self.root.deiconify()
-            self.load_replays()
-
-
-class EditGUI:
-    changed = False
-    name_labels = {}
-    driver_buttons = {}
-    car_buttons = {}
+        self.apply_edits({id: {key: car_info[key] for key in CAR_KEYS}})
+
+    def apply_edits(self, edits):
+        # Change the configurations of many drivers at once
+        # edits maps racingTeamID to a dict with the values to change, drivers
+        # that can't be found are ignored
+        configs = self.data['configsById']
+        for id, edit in edits.items():
+            if id in configs:
+                _update_config(configs[id], edit)
+                self.changed.add(id)
+
+
+# Extension of replay archives, which contain the .header and .replay file of
+# a replay in a single file
+ARCHIVE_EXTENSION = '.csreplay'
+# Compression methods for the .replay file in archives
+COMPRESSIONS = ('zlib', 'lzma', 'zstd')
+DEFAULT_COMPRESSION = 'zlib'
+
+
+def is_archive(filename):
+    # Check if filename refers to a replay archive instead of a .replay and
+    # .header file pair
+    return filename.endswith(ARCHIVE_EXTENSION)
+
+
+def _compression_objects(compression):
+    # Return functions creating a compressor and a decompressor object for
+    # the compression method, both with the interface of zlib
+    if compression == 'zlib':
+        import zlib
+        return zlib.compressobj, zlib.decompressobj
+    if compression == 'lzma':
+        import lzma
+        return lzma.LZMACompressor, lzma.LZMADecompressor
+    if compression == 'zstd':
+        try:
+            import zstandard
+        except ImportError:
+            raise ImportError('zstd compression needs zstandard, install it '
+                              'with: pip install zstandard') from None
+        return (lambda: zstandard.ZstdCompressor().compressobj(),
+                lambda: zstandard.ZstdDecompressor().decompressobj())
+    raise ValueError('Unknown compression: {}'.format(compression))
+
+
+class ReplayArchive:
+    # Single file containing the .header and the compressed .replay file of a
+    # replay. The file starts with a fixed size header (magic, version,
+    # compression, size of the .header file, size of the .replay file and of
+    # its compressed data), followed by the uncompressed .header file, so it
+    # can be read without decompressing anything, and the compressed .replay
+    header_format = struct.Struct('<4sBB2xQQQ')
+    magic = b'CSRA'
+    version = 1
 
     def __init__(self, filename):
+        # Read the header of the archive
         self.filename = filename
-
-        # Load replay file
-        self.replay = Replay(filename)
-        self.drivers = self.replay.get_drivers()
-
-        # Create popup window
-        self.window = tk.Toplevel()
-        self.window.title('Edit Replay')
-        self.window.protocol('WM_DELETE_WINDOW', self.close_window)
-        self.window.grab_set()
-        self.window.grid_columnconfigure(0, weight=1)
-        self.window.grid_columnconfigure(1, weight=1)
-        self.window.grid_columnconfigure(2, weight=1)
-        self.window.grid_columnconfigure(3, weight=1)
-
-        # Replay info as headline
-        info = self.replay.get_race_info()
-        headline = tk.Label(
-            self.window, text='{} (#{}) - {} ({}) - {}'.format(
-                info[3], info[4], info[1], info[2], info[0]))
-        headline.grid(column=0, row=0, columnspan=4, sticky='nesw')
-
-        # Create list of drivers with edit buttons
-        # Headline for each column
-        tk.Label(self.window, text='Name').grid(column=0, row=1, sticky='nesw')
-        tk.Label(self.window, text='Driver').grid(column=1, row=1, sticky='nesw')
-        tk.Label(self.window, text='Car').grid(column=2, row=1, sticky='nesw')
-        tk.Label(self.window, text='Grid').grid(column=3, row=1, sticky='nesw')
-        # Individual rows per driver
-        i = 2
-        for driver in self.drivers:
-            id = driver[0]
-            name = tk.Label(self.window, text=driver[1])
-            name.grid(column=0, row=i, sticky='nesw')
-            self.name_labels[id] = name
-            d_edit = tk.Button(self.window, text='Edit',
-                               command=lambda id=id: self.edit_driver(id))
-            d_edit.grid(column=1, row=i, sticky='nesw')
-            self.driver_buttons[id] = d_edit
-            c_edit = tk.Button(self.window, text='Edit',
-                               command=lambda id=id: self.edit_car(id))
-            c_edit.grid(column=2, row=i, sticky='nesw')
-            self.car_buttons[id] = c_edit
-            grid = tk.Label(self.window, text=driver[2])
-            grid.grid(column=3, row=i, sticky='nesw')
-            i += 1
-
-        # Create save button
-        save_button = tk.Button(self.window, text='Save changes', bg='#ACACAC',
-                                command=self.save_changes)
-        save_button.grid(column=0, row=i, columnspan=4, sticky='nesw')
-
-        # Set changed flag to False
-        self.changed = False
-
-    def update_names(self):
-        # In case a name has been changed, update all entries in the list
-        new_drivers = self.replay.get_drivers()
-        if new_drivers != self.drivers:
-            self.drivers = new_drivers
-            for d in self.drivers:
-                id = d[0]
-                name = d[1]
-                self.name_labels[id].config(text=name)
-
-    def edit_driver(self, id):
-        # Open an edit window for the selected driver
-        edit = EditDriverGUI(self, self.replay, id)
-        edit.window.wait_window()
-        self.update_names()
-
-    def edit_car(self, id):
-        # Open an edit window for the selected car
-        edit = EditCarGUI(self, self.replay, id)
-        edit.window.wait_window()
-        self.update_names()
-
-    def save_changes(self):
-        # Prompt user to select filename for changed replay (and header)
-        # Dialog will return '' if no filename has been selected, or the
-        # selected filename otherwise
-        curr_path, curr_file = os.path.split(self.filename)
-        save_location = filedialog.asksaveasfilename(
-            defaultextension='.replay',
-            filetypes=(('Replay and header files', '*.replay;*.header'),
-                       ('All Files', '*.*')),
-            initialdir=curr_path,
-            initialfile='{}.replay'.format(curr_file))
-        if save_location:
-            if (save_location.endswith('.replay') or
-                    save_location.endswith('.header')):
-                # Remove extension (not needed in Replay class)
-                save_location = save_location[:-7]
-            # Save the replay and header file with the specified filename
-            self.replay.save(save_location)
-
-        self.changed = False
-
-    def set_changed(self, event=None):
-        # Set changed flag to True
-        self.changed = True
-
-    def close_window(self):
-        # Check if there have been changes
-        # If so, ask if they should be saved
-        if self.changed:
-            save = messagebox.askyesnocancel(
-                'Save changes?', 'Do you want to save your changes?')
-            if save is None:  # Cancel selected
-                return
-            elif save:  # Yes selected
-                self.save_changes()
-            else:  # No selected
-                pass
-        self.window.destroy()
-
-
-class EditDriverGUI:
-    # Track if there have been changes
-    changed = False
-    saved_name = None
-    saved_color_suit = None
-    saved_color_helmet = None
-
-    # Values for liveries and designs for GUI and replay files
-    # Might be incomplete and can change in future updates of the game
-
-    # Suit
-    # Values for replay file
-    suit_driverskin = {
-        'Female': 'driverskin-classic-f',
-        'Male': 'driverskin-classic-m',
-        'Stig Female': 'driverskin-trivia-f',
-        'Stig Male': 'driverskin-trivia-m'
-    }
-    suit_driverskinlivery = {
-        'Female': {
-            'Sidelines': 'driverskinmaterial-10-f-1',
-            'Slick': 'driverskinmaterial-6-f-1',
-            'Roads': 'driverskinmaterial-7-f-1',
-            'Split': 'driverskinmaterial-8-f-1',
-            'Honor': 'driverskinmaterial-9-f-1',
-            'Dragon': 'driverskinmaterial-arrows-f-2',
-            'Classic': 'driverskinmaterial-classic-f-0',
-            'Royal': 'driverskinmaterial-diagonals-f-1',
-            'Satelite': 'driverskinmaterial-satellite-f-3',
-            'Oil': 'driverskinmaterial-split-f-1',
-            'Stripes': 'driverskinmaterial-stripes-f-1'
-        },
-        'Male': {
-            'Sidelines': 'driverskinmaterial-10-m-1',
-            'Slick': 'driverskinmaterial-6-m-1',
-            'Roads': 'driverskinmaterial-7-m-1',
-            'Split': 'driverskinmaterial-8-m-1',
-            'Honor': 'driverskinmaterial-9-m-1',
-            'Dragon': 'driverskinmaterial-arrows-m-2',
-            'Classic': 'driverskinmaterial-classic-m-0',
-            'Royal': 'driverskinmaterial-diagonals-m-1',
-            'Satelite': 'driverskinmaterial-satellite-m-3',
-            'Oil': 'driverskinmaterial-split-m-1',
-            'Stripes': 'driverskinmaterial-stripes-m-1'
-        },
-        'Stig Female': {
-            'Stig': 'driverskinmaterial-trivia-f-1'
-        },
-        'Stig Male': {
-            'Stig': 'driverskinmaterial-trivia-m-1'
-        }
-    }
-    # Values for GUI
-    suit_body = []
-    suit_design = {}
-    for suit in suit_driverskinlivery:
-        suit_body.append(suit)
-        suit_design[suit] = list(suit_driverskinlivery[suit].keys())
-    # Reverse to get the GUI values from the replay value
-    inv_driverskinlivery = {}
-    for i in suit_driverskinlivery.items():
-        for j in i[1].items():
-            inv_driverskinlivery[j[1]] = (i[0], j[0])
-
-    # Helmet
-    # Values for replay file
-    helmet_helmet_value = {
-        'Ace': 'helmet-0-contemporary-full-face',
-        'Legacy': 'helmet-1-modern-full-face',
-        'Classic': 'helmet-2-classic-open-face',
-        'Stig': 'helmet-3-contemporary-trivia'
-    }
-    helmet_helmetlivery = {
-        'Ace': {
-            'Simple': 'helmetmaterial-contemporary-full-face-0',
-            'Layers': 'helmetmaterial-contemporary-full-face-1',
-            'Zoom': 'helmetmaterial-contemporary-full-face-10',
-            'Cirrus': 'helmetmaterial-contemporary-full-face-11',
-            'Abstract': 'helmetmaterial-contemporary-full-face-2',
-            'Demon': 'helmetmaterial-contemporary-full-face-3',
-            'Headband': 'helmetmaterial-contemporary-full-face-4',
-            'Blade': 'helmetmaterial-contemporary-full-face-5',
-            'Iron': 'helmetmaterial-contemporary-full-face-6',
-            'Model': 'helmetmaterial-contemporary-full-face-7',
-            'Apex': 'helmetmaterial-contemporary-full-face-8',
-            'Cat': 'helmetmaterial-contemporary-full-face-9'
-        },
-        'Legacy': {
-            'Simple': 'helmetmaterial-modern-full-face-0',
-            'Space': 'helmetmaterial-modern-full-face-1',
-            'Trace': 'helmetmaterial-modern-full-face-2',
-            'Belts': 'helmetmaterial-modern-full-face-3',
-            'Arrow': 'helmetmaterial-modern-full-face-4',
-            'Eyes': 'helmetmaterial-modern-full-face-5',
-            'Banner': 'helmetmaterial-modern-full-face-6',
-            'Gradient': 'helmetmaterial-modern-full-face-7',
-            'Jaw': 'helmetmaterial-modern-full-face-8',
-            'Apex': 'helmetmaterial-modern-full-face-9'
-        },
-        'Classic': {
-            'Simple': 'helmetmaterial-classic-open-face-0',
-            'Parallel': 'helmetmaterial-classic-open-face-1',
-            'Classic': 'helmetmaterial-classic-open-face-2',
-            'Vintage': 'helmetmaterial-classic-open-face-3',
-            'Serio': 'helmetmaterial-classic-open-face-4',
-            'Curva': 'helmetmaterial-classic-open-face-5',
-            'Knight': 'helmetmaterial-classic-open-face-6'
-        },
-        'Stig': {
-            'Default': 'helmetmaterial-contemporary-pig-0'
-        }
-    }
-    # Values for GUI
-    helmet_helmet = []
-    helmet_design = {}
-    for helmet in helmet_helmetlivery:
-        helmet_helmet.append(helmet)
-        helmet_design[helmet] = list(helmet_helmetlivery[helmet].keys())
-    # Reverse to get the GUI values from the replay value
-    inv_helmetlivery = {}
-    for i in helmet_helmetlivery.items():
-        for j in i[1].items():
-            inv_helmetlivery[j[1]] = (i[0], j[0])
-
-    def __init__(self, parent, replay, id):
-        self.parent = parent
-        self.replay = replay
-        self.id = id
-
-        # Load curent data out of the replay file
-        self.driver_info = self.replay.get_driver_info(id)
-        racername = self.driver_info['racerName']
-
-        # Create popup window
-        self.window = tk.Toplevel()
-        self.window.title('Edit Driver')
-        self.window.protocol('WM_DELETE_WINDOW', self.close_window)
-        self.window.grab_set()
-        self.window.grid_columnconfigure(0, weight=1)
-        self.window.grid_columnconfigure(1, weight=1)
-        self.window.grid_columnconfigure(2, weight=1)
-        self.window.grid_columnconfigure(3, weight=1)
-
-        # racerName as headline
-        self.headline = tk.Label(self.window,
-                                 text='Edit {}'.format(racername))
-        self.headline.grid(column=0, row=0, columnspan=4, sticky='nesw')
-
-        # Edit racerName
-        text_name = tk.Label(self.window, text='Name')
-        text_name.grid(column=0, row=1, sticky='nesw')
-        self.name_field = tk.Entry(self.window)
-        self.name_field.insert(0, racername)
-        self.name_field.grid(column=1, row=1, columnspan=2, sticky='nesw')
-
-        # Edit driverSkin and driverSkinLivery
-        # All designs are available for all bodys => set dropdown values
-        text_skin = tk.Label(self.window, text='Skin')
-        text_skin.grid(column=0, row=2, sticky='nesw')
-        self.body_dd = ttk.Combobox(self.window, values=self.suit_body,
-                                    state='readonly', exportselection=False)
-        self.body_dd.grid(column=1, row=2, sticky='nesw')
-        self.body_dd.bind('<<ComboboxSelected>>', self.body_selected)
-        self.suit_design_dd = ttk.Combobox(self.window, values=[],
-                                           state='readonly',)
-        self.suit_design_dd.grid(column=2, row=2, sticky='nesw')
-        self.suit_design_dd.bind('<<ComboboxSelected>>', self.set_changed)
-        self.suit_color = ColorPalette(self.window, 3)
-        self.suit_color.grid(column=3, row=2, sticky='nesw')
-
-        # Edit helmet and helmetLivery
-        # Each helmet has its own set of designs that have to be loaded into
-        # the second dropdown menu
-        text_helmet = tk.Label(self.window, text='Helmet')
-        text_helmet.grid(column=0, row=3, sticky='nesw')
-        self.helmet_dd = ttk.Combobox(self.window, values=self.helmet_helmet,
-                                      state='readonly', exportselection=False)
-        self.helmet_dd.grid(column=1, row=3, sticky='nesw')
-        self.helmet_dd.bind('<<ComboboxSelected>>', self.helmet_selected)
-        self.helmet_design_dd = ttk.Combobox(self.window, values=[],
-                                             state='readonly')
-        self.helmet_design_dd.grid(column=2, row=3, sticky='nesw')
-        self.helmet_design_dd.bind('<<ComboboxSelected>>', self.set_changed)
-        self.helmet_color = ColorPalette(self.window, 5)
-        self.helmet_color.grid(column=3, row=3, sticky='nesw')
-
-        # Save changes button
-        self.save_button = tk.Button(self.window, text='Save changes',
-                                     bg='#ACACAC', command=self.save)
-        self.save_button.grid(column=0, row=4, columnspan=4, sticky='nesw')
-
-        # Set the selected values to the current values out of the replay file
-        self.load_current_values(self.driver_info)
-
-        # Set changed flag to False and remember name value
-        self.saved_name = racername
-        self.saved_color_suit = self.suit_color.get_colors()
-        self.saved_color_helmet = self.helmet_color.get_colors()
-        self.changed = False
-
-    def load_current_values(self, driver_info):
-        # Track if there have been changes
-        changed = False
-
-        # Set the values currently set in the replay file (if possible)
-        driverskinlivery = driver_info['driverSkinLivery'][0]
-        helmetlivery = driver_info['helmetLivery'][0]
-        if driverskinlivery in self.inv_driverskinlivery:
-            body_curr, body_design_curr = self.inv_driverskinlivery[
-                driverskinlivery]
+        with open(filename, 'rb') as file:
+            prefix = file.read(self.header_format.size)
+        if len(prefix) != self.header_format.size:
+            raise ValueError('{} is not a replay archive'.format(filename))
+        (magic, version, compression, self.header_size, self.replay_size,
+         self.body_size) = self.header_format.unpack(prefix)
+        if magic != self.magic:
+            raise ValueError('{} is not a replay archive'.format(filename))
+        if version != self.version:
+            raise ValueError('Unsupported archive version {} in {}'.format(
+                version, filename))
+        if compression >= len(COMPRESSIONS):
+            raise ValueError('Unknown compression {} in {}'.format(
+                compression, filename))
+        self.compression = COMPRESSIONS[compression]
+
+    def read_header(self):
+        # Return the content of the .header file
+        with open(self.filename, 'rb') as file:
+            file.seek(self.header_format.size)
+            return file.read(self.header_size)
+
+    def extract_header(self, target):
+        # Write the .header file to target (without extension)
+        with open('{}.header'.format(target), 'wb') as file:
+            file.write(self.read_header())
+
+    def iter_replay(self):
+        # Decompress the .replay file and yield its content in chunks
+        decompressor = _compression_objects(self.compression)[1]()
+        size = 0
+        with open(self.filename, 'rb') as source:
+            source.seek(self.header_format.size + self.header_size)
+            remaining = self.body_size
+            while remaining:
+                chunk = source.read(min(_copy_chunk_size, remaining))
+                if not chunk:
+                    raise ValueError('{} is truncated'.format(self.filename))
+                remaining -= len(chunk)
+                data = decompressor.decompress(chunk)
+                size += len(data)
+                _report_progress(len(data))
+                yield data
+        if hasattr(decompressor, 'flush'):
+            data = decompressor.flush()
+            size += len(data)
+            yield data
+        if size != self.replay_size:
+            raise ValueError('{} is corrupted'.format(self.filename))
+
+    def extract_replay(self, target):
+        # Decompress the .replay file to target (without extension)
+        with open('{}.replay'.format(target), 'wb') as file:
+            for data in self.iter_replay():
+                file.write(data)
+
+    def extract(self, target):
+        # Write the .header and .replay file to target (without extension)
+        self.extract_header(target)
+        self.extract_replay(target)
+
+    @classmethod
+    def pack(cls, source, target, compression=DEFAULT_COMPRESSION):
+        # Write the .header and .replay file of source (without extension)
+        # into the archive target
+        # The archive is written to a temporary file first, so target is only
+        # replaced once it is complete
+        compressor = _compression_objects(compression)[0]()
+        with open('{}.header'.format(source), 'rb') as file:
+            header = file.read()
+        temp = '{}.tmp'.format(target)
+        try:
+            with open(temp, 'wb') as file:
+                # Sizes are written after the body has been compressed
+                file.write(bytes(cls.header_format.size))
+                file.write(header)
+                replay_size = 0
+                body_size = 0
+                with open('{}.replay'.format(source), 'rb') as replay:
+                    while True:
+                        chunk = replay.read(_copy_chunk_size)
+                        if not chunk:
+                            break
+                        replay_size += len(chunk)
+                        _report_progress(len(chunk))
+                        data = compressor.compress(chunk)
+                        file.write(data)
+                        body_size += len(data)
+                data = compressor.flush()
+                file.write(data)
+                body_size += len(data)
+                file.seek(0)
+                file.write(cls.header_format.pack(
+                    cls.magic, cls.version, COMPRESSIONS.index(compression),
+                    len(header), replay_size, body_size))
+        except BaseException:
+            if os.path.exists(temp):
+                os.remove(temp)
+            raise
+        os.replace(temp, target)
+
+
+# Extension of edit overlays, which store the changed driver configurations
+# of a replay without a copy of its files
+OVERLAY_EXTENSION = '.csoverlay'
+
+
+def is_overlay(filename):
+    # Check if filename refers to an edit overlay
+    return filename.endswith(OVERLAY_EXTENSION)
+
+
+def replay_hash(filename):
+    # Return the SHA-256 of the content of the .header and .replay file of a
+    # replay (without extension) or a replay archive, as hex string
+    # Archives have the same hash as the files they have been packed from
+    digest = hashlib.sha256()
+    if is_archive(filename):
+        archive = ReplayArchive(filename)
+        digest.update(archive.read_header())
+        for data in archive.iter_replay():
+            digest.update(data)
+    else:
+        for extension in ('header', 'replay'):
+            _hash_file(digest, '{}.{}'.format(filename, extension))
+    return digest.hexdigest()
+
+
+def _hash_file(digest, filename):
+    # Add the content of the file to the hash object digest in chunks
+    with open(filename, 'rb') as file:
+        while True:
+            chunk = file.read(_copy_chunk_size)
+            if not chunk:
+                break
+            digest.update(chunk)
+            _report_progress(len(chunk))
+
+
+class ReplayOverlay:
+    # Small JSON file with the edits (see Replay.apply_edits) to a base
+    # replay, which is referenced by its path relative to the overlay and by
+    # the hash of its content (see replay_hash)
+    version = 1
+
+    def __init__(self, base, hash, edits):
+        # base is the path of the base replay (without extension or with
+        # ARCHIVE_EXTENSION)
+        self.base = base
+        self.hash = hash
+        self.edits = edits
+
+    @classmethod
+    def read(cls, filename):
+        # Load an overlay, the path of the base is made absolute again
+        with open(filename) as file:
+            data = json.load(file)
+        if data.get('version') != cls.version:
+            raise ValueError('Unsupported overlay version {} in {}'.format(
+                data.get('version'), filename))
+        base = os.path.join(os.path.dirname(os.path.abspath(filename)),
+                            data['base'])
+        return cls(os.path.normpath(base), data['hash'], data['edits'])
+
+    def write(self, filename):
+        # Save the overlay with the path of the base relative to it
+        base = os.path.relpath(os.path.abspath(self.base),
+                               os.path.dirname(os.path.abspath(filename)))
+        data = {'version': self.version, 'base': base.replace(os.sep, '/'),
+                'hash': self.hash, 'edits': self.edits}
+        with open(filename, 'w') as file:
+            json.dump(data, file, separators=(',', ':'))
+
+    def check_base(self):
+        # Raise a ValueError if the base has been changed since the overlay
+        # has been created
+        if replay_hash(self.base) != self.hash:
+            raise ValueError('The replay {} has been changed since the '
+                             'overlay has been created'.format(self.base))
+
+
+def materialize(overlay, target):
+    # Write the base of an overlay with its edits applied to target (without
+    # extension or with ARCHIVE_EXTENSION)
+    Replay(overlay).save(target)
+
+
+def find_replays(directory):
+    # Find loadable replays in the directory, sorted by name
+    # Each replay consists of a .header and .replay file with the same name
+    return sorted(DirectoryTracker(directory).scan())
+
+
+def _file_identity(entry):
+    # Return a value that stays the same if the file of a directory entry is
+    # renamed. The inode is known from the listing on POSIX systems, on
+    # Windows size and modification time are known from it instead
+    if os.name == 'nt':
+        stat = entry.stat()
+        return stat.st_size, stat.st_mtime_ns
+    return entry.inode()
+
+
+class DirectoryTracker:
+    # Keeps track of the replays in a directory
+    # The directory is only listed again if its modification time changed,
+    # which happens when files are added, removed or renamed. The changes are
+    # computed with set operations on the names of the replays
+    # Modification times less than this many ns ago aren't trusted, as later
+    # changes within the resolution of the file system wouldn't change it
+    mtime_resolution = 2 * 10 ** 9
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.replays = set()
+        self.identities = {}
+        self.mtime = None
+
+    def scan(self):
+        # List the directory and return the set of all replays in it
+        mtime = os.stat(self.directory).st_mtime_ns
+        headers = {}
+        replays = set()
+        with os.scandir(self.directory) as entries:
+            for entry in entries:
+                if entry.name.endswith('.header'):
+                    headers[entry.name[:-7]] = entry
+                elif entry.name.endswith('.replay'):
+                    replays.add(entry.name[:-7])
+        self.replays = replays.intersection(headers)
+        self.identities = {name: _file_identity(headers[name])
+                           for name in self.replays}
+        if time.time_ns() - mtime < self.mtime_resolution:
+            self.mtime = None
         else:
-            body_curr, body_design_curr = None, None
-        if helmetlivery in self.inv_helmetlivery:
-            helmet_curr, helmet_design_curr = self.inv_helmetlivery[
-                helmetlivery]
-        else:
-            helmet_curr, helmet_design_curr = None, None
-
-        # Suit body and design
-        # Set selected body first, then update values from design
-        if body_curr in self.suit_body:
-            self.body_dd.current(self.suit_body.index(body_curr))
-            self.body_selected()  # Load values for second dropdown box
-            if body_design_curr in self.suit_design[body_curr]:
-                self.suit_design_dd.current(
-                    self.suit_design[body_curr].index(body_design_curr))
-            else:
-                self.suit_design_dd.current(0)
-        else:
-            self.body_dd.current(0)
-            self.suit_design_dd.current(0)
-        suit_colors = driver_info['driverSkinLivery'][1]
-        self.suit_color.set_colors(suit_colors)
-
-        # Helmet and design
-        # Set selected helmet first, then update values for design
-        if helmet_curr in self.helmet_helmet:
-            self.helmet_dd.current(self.helmet_helmet.index(helmet_curr))
-            self.helmet_selected()  # Load values for second dropdown box
-            if helmet_design_curr in self.helmet_design[helmet_curr]:
-                self.helmet_design_dd.current(
-                    self.helmet_design[helmet_curr].index(helmet_design_curr))
+            self.mtime = mtime
+        return self.replays
+
+    def poll(self):
+        # Return the replays that have been added and removed, and a list of
+        # renamed replays (old and new name) since the last scan
+        if self.mtime is not None:
+            if os.stat(self.directory).st_mtime_ns == self.mtime:
+                return set(), set(), []
+        old_replays = self.replays
+        old_identities = self.identities
+        self.scan()
+        added = self.replays - old_replays
+        removed = old_replays - self.replays
+        # A replay has been renamed if its .header file is still the same
+        added_by_identity = {self.identities[name]: name for name in added}
+        renamed = []
+        for name in removed:
+            new_name = added_by_identity.get(old_identities[name])
+            if new_name in added:
+                renamed.append((name, new_name))
+                added.discard(new_name)
+        removed.difference_update(old for old, new in renamed)
+        return added, removed, renamed
+
+
+def read_race_info(directory, name):
+    # Read the race info and the driver configurations out of the .header
+    # file of a replay
+    # Returns size and modification time of the file, race info and
+    # configsById
+    path = os.path.join(directory, name)
+    stat = os.stat('{}.header'.format(path))
+    replay = Replay(path, lazy=True)
+    return ((stat.st_size, stat.st_mtime_ns), replay.get_race_info(),
+            replay.header.data['configsById'])
+
+
+def read_index_entry(directory, name):
+    # Read the values ReplayIndex.store takes for a replay
+    # A replay that can't be read is stored with None as race info, so it
+    # isn't read again until it changes. Returns None if the .header file
+    # doesn't exist anymore
+    try:
+        return read_race_info(directory, name)
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    try:
+        stat = os.stat(os.path.join(directory, '{}.header'.format(name)))
+    except OSError:
+        return None
+    return (stat.st_size, stat.st_mtime_ns), None, {}
+
+
+class LRUCache:
+    # Dict-like cache that only keeps the maxsize most recently used entries
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self.data = OrderedDict()
+
+    def __contains__(self, key):
+        return key in self.data
+
+    def __len__(self):
+        return len(self.data)
+
+    def __getitem__(self, key):
+        self.data.move_to_end(key)
+        return self.data[key]
+
+    def __setitem__(self, key, value):
+        self.data[key] = value
+        self.data.move_to_end(key)
+        while len(self.data) > self.maxsize:
+            self.data.popitem(last=False)
+
+    def get(self, key, default=None):
+        if key in self.data:
+            return self[key]
+        return default
+
+    def pop(self, key, default=None):
+        return self.data.pop(key, default)
+
+    def clear(self):
+        self.data.clear()
+
+
+# Filters of ReplayIndex.query, mapped to the column they compare, the
+# catalog whose names can be used instead of the values (see
+# _filter_values) and whether they name a design of the catalog
+QUERY_FILTERS = {
+    'name': ('replays.name', None, False),
+    'track': ('replays.track', None, False),
+    'scenario': ('replays.scenario', None, False),
+    'racer': ('drivers.racerName', None, False),
+    'suit': ('drivers.driverSkin', 'suit', False),
+    'suit_design': ('drivers.driverSkinLivery', 'suit', True),
+    'helmet': ('drivers.helmet', 'helmet', False),
+    'helmet_design': ('drivers.helmetLivery', 'helmet', True),
+    'car': ('drivers.vehicle', 'car', False),
+    'car_design': ('drivers.vehicleLivery', 'car', True),
+    'number': ('drivers.number', None, False),
+}
+
+
+def parse_filter(words):
+    # Parse filters for ReplayIndex.query out of words in the form key:value
+    # (keys out of QUERY_FILTERS), words without a key filter by name
+    # Returns a dict of filters, raises ValueError for invalid filters
+    filters = {}
+    for word in words:
+        key, separator, value = word.partition(':')
+        if not separator:
+            key, value = 'name', word
+        if key not in QUERY_FILTERS:
+            raise ValueError('Unknown filter {}, use one of {}'.format(
+                key, ', '.join(QUERY_FILTERS)))
+        if key == 'number':
+            try:
+                value = int(value)
+            except ValueError:
+                raise ValueError('Number has to be a number') from None
+        filters[key] = value
+    return filters
+
+
+def _filter_values(kind, design, text):
+    # Return the values in the replay files a filter text stands for, the
+    # text itself and the values of the names (or design names) of the
+    # catalog that match it, ignoring case
+    values = {text}
+    catalog = get_catalog(kind)
+    text = text.lower()
+    if design:
+        values.update(value for designs in catalog.liveries.values()
+                      for name, value in designs.items()
+                      if name.lower() == text)
+    else:
+        values.update(value for name, value in catalog.values.items()
+                      if name.lower() == text)
+    return sorted(values)
+
+
+def _list_item(value, i, types):
+    # Return item i of a list out of a driver configuration if it has one of
+    # the types, None otherwise
+    if isinstance(value, list) and len(value) > i:
+        if isinstance(value[i], types) and not isinstance(value[i], bool):
+            return value[i]
+    return None
+
+
+class ReplayIndex:
+    # Persistent cache for the race info and the driver configurations of
+    # the replays in a directory, stored in an SQLite database inside the
+    # directory
+    # An entry is only used while size and modification time of the .header
+    # file are unchanged, otherwise the file is read again
+    # The drivers of all replays are kept in their own table with indexes on
+    # the configuration values, so replays can be queried without opening
+    # them (see query)
+    filename = '.cs_replay_index.sqlite'
+    version = 2
+    # Columns of the replays and drivers table that are indexed
+    indexed = {
+        'replays': ('track', 'scenario'),
+        'drivers': ('replay', 'racerName', 'driverSkin', 'driverSkinLivery',
+                    'helmet', 'helmetLivery', 'vehicle', 'vehicleLivery',
+                    'number'),
+    }
+    # Number of replays read before their entries are committed, see read
+    commit_interval = 500
+
+    def __init__(self, directory):
+        self.directory = directory
+        try:
+            self.db = sqlite3.connect(os.path.join(directory, self.filename))
+            # The files of the write-ahead log stay while the index is open,
+            # unlike the rollback journal that is created and deleted on every
+            # commit, so commits don't change the modification time of the
+            # directory that DirectoryTracker watches
+            self.db.execute('PRAGMA journal_mode=WAL')
+            self.create_tables()
+        except sqlite3.Error:
+            # Directory isn't writable, only cache while the program runs
+            self.db = sqlite3.connect(':memory:')
+            self.create_tables()
+
+    def create_tables(self):
+        # Create the tables, or recreate them if they are from another version
+        # Values are compared ignoring case, except the names of the replays
+        version = self.db.execute('PRAGMA user_version').fetchone()[0]
+        if version != self.version:
+            self.db.execute('DROP TABLE IF EXISTS replays')
+            self.db.execute('DROP TABLE IF EXISTS drivers')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS replays ('
+            'name TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, '
+            'timestamp, track TEXT COLLATE NOCASE, path, '
+            'scenario TEXT COLLATE NOCASE, scenario_index)')
+        self.db.execute(
+            'CREATE TABLE IF NOT EXISTS drivers ('
+            'replay TEXT, position INTEGER, id TEXT, '
+            'racerName TEXT COLLATE NOCASE, driverSkin TEXT COLLATE NOCASE, '
+            'driverSkinLivery TEXT COLLATE NOCASE, '
+            'helmet TEXT COLLATE NOCASE, helmetLivery TEXT COLLATE NOCASE, '
+            'vehicle TEXT COLLATE NOCASE, vehicleLivery TEXT COLLATE NOCASE, '
+            'number INTEGER)')
+        for table, columns in self.indexed.items():
+            for column in columns:
+                self.db.execute(
+                    'CREATE INDEX IF NOT EXISTS {0}_{1} ON {0} ({1})'.format(
+                        table, column))
+        self.db.execute('PRAGMA user_version = {}'.format(self.version))
+        self.db.commit()
+
+    def close(self):
+        self.db.close()
+
+    def stat(self, name):
+        # Return size and modification time of the .header file of a replay
+        stat = os.stat(os.path.join(self.directory, '{}.header'.format(name)))
+        return stat.st_size, stat.st_mtime_ns
+
+    def lookup(self, names):
+        # Return a dict with the race info of all replays out of names that
+        # have an up to date entry, None for replays that couldn't be read
+        names = list(names)
+        cached = {}
+        for i in range(0, len(names), 500):  # SQLite limits the parameters
+            chunk = names[i:i + 500]
+            for row in self.db.execute(
+                    'SELECT name, size, mtime, timestamp, track, path, '
+                    'scenario, scenario_index FROM replays WHERE name IN '
+                    '({})'.format(', '.join('?' * len(chunk))), chunk):
+                cached[row[0]] = row[1:]
+        infos = {}
+        for name in names:
+            if name in cached:
+                try:
+                    stat = self.stat(name)
+                except OSError:
+                    continue
+                if stat == cached[name][:2]:
+                    info = cached[name][2:]
+                    infos[name] = info if info[0] is not None else None
+        return infos
+
+    def stale(self, names):
+        # Return the replays out of names without an up to date entry
+        entries = {row[0]: row[1:] for row in self.db.execute(
+            'SELECT name, size, mtime FROM replays')}
+        stale = []
+        for name in names:
+            try:
+                stat = self.stat(name)
+            except OSError:
+                continue
+            if entries.get(name) != stat:
+                stale.append(name)
+        return stale
+
+    def infos(self):
+        # Return a dict with the race info of all replays in the index, None
+        # for replays that couldn't be read. Entries aren't checked against
+        # the files, see stale
+        infos = {}
+        for row in self.db.execute(
+                'SELECT name, timestamp, track, path, scenario, '
+                'scenario_index FROM replays'):
+            infos[row[0]] = row[1:] if row[1] is not None else None
+        return infos
+
+    def store(self, name, stat, info, configs):
+        # Store the values returned by read_race_info for a replay, info is
+        # None if the replay couldn't be read
+        # Changes are written to the database with commit
+        self.db.execute('DELETE FROM drivers WHERE replay = ?', (name,))
+        self.db.execute(
+            'INSERT OR REPLACE INTO replays VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+            (name,) + tuple(stat) + tuple(info or (None,) * 5))
+        rows = []
+        for position, (id, config) in enumerate(configs.items()):
+            if not isinstance(config, dict):
+                continue
+            rows.append((name, position, id, config.get('racerName'),
+                         config.get('driverSkin'),
+                         _list_item(config.get('driverSkinLivery'), 0, str),
+                         config.get('helmet'),
+                         _list_item(config.get('helmetLivery'), 0, str),
+                         config.get('vehicle'),
+                         _list_item(config.get('vehicleLivery'), 0, str),
+                         _list_item(config.get('vehicleLivery'), 2, int)))
+        self.db.executemany(
+            'INSERT INTO drivers VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            rows)
+
+    def commit(self):
+        self.db.commit()
+
+    def read(self, names, map=map):
+        # Read the .header files of the replays in names and store them
+        # map is used to read them, e.g. the map of an executor
+        # Committed every commit_interval replays, so an interrupted build
+        # keeps the entries read so far and the journal stays small
+        entries = map(functools.partial(read_index_entry, self.directory),
+                      names)
+        for i, (name, entry) in enumerate(zip(names, entries), 1):
+            if entry is not None:
+                self.store(name, *entry)
+            if i % self.commit_interval == 0:
+                self.commit()
+        self.commit()
+
+    def query(self, filters):
+        # Return the names of the indexed replays that match all filters (see
+        # parse_filter), sorted by name
+        # All filters on drivers have to match the same driver. Values can be
+        # given as in the replay files or as the names in the editor
+        conditions = ['replays.timestamp IS NOT NULL']
+        parameters = []
+        drivers = False
+        for key, value in filters.items():
+            column, kind, design = QUERY_FILTERS[key]
+            drivers = drivers or column.startswith('drivers.')
+            if key == 'name':
+                conditions.append('instr(lower({}), lower(?))'.format(column))
+                parameters.append(value)
+            elif kind is not None:
+                values = _filter_values(kind, design, value)
+                conditions.append('{} IN ({})'.format(
+                    column, ', '.join('?' * len(values))))
+                parameters.extend(values)
             else:
-                self.helmet_design_dd.current(0)
+                conditions.append('{} = ?'.format(column))
+                parameters.append(value)
+        tables = 'replays'
+        if drivers:
+            tables += ' JOIN drivers ON drivers.replay = replays.name'
+        return [row[0] for row in self.db.execute(
+            'SELECT DISTINCT replays.name FROM {} WHERE {} '
+            'ORDER BY replays.name'.format(tables, ' AND '.join(conditions)),
+            parameters)]
+
+    def remove(self, names):
+        # Remove the entries of the replays in names
+        names = [(name,) for name in names]
+        self.db.executemany('DELETE FROM replays WHERE name = ?', names)
+        self.db.executemany('DELETE FROM drivers WHERE replay = ?', names)
+        self.db.commit()
+
+    def rename(self, old, new):
+        # Move the entry of a renamed replay, size and modification time of
+        # the file don't change when renaming it
+        self.db.execute('DELETE FROM replays WHERE name = ?', (new,))
+        self.db.execute('DELETE FROM drivers WHERE replay = ?', (new,))
+        self.db.execute('UPDATE replays SET name = ? WHERE name = ?',
+                        (new, old))
+        self.db.execute('UPDATE drivers SET replay = ? WHERE replay = ?',
+                        (new, old))
+        self.db.commit()
+
+    def prune(self, names):
+        # Remove all entries for replays that are not in names anymore
+        names = set(names)
+        removed = [row[0] for row in
+                   self.db.execute('SELECT name FROM replays')
+                   if row[0] not in names]
+        self.remove(removed)
+
+
+def load_size(filename):
+    # Estimate the bytes reported as progress while loading filename (any
+    # replay, archive or overlay Replay accepts)
+    if is_overlay(filename):
+        # The base is hashed before it's loaded
+        return 2 * load_size(ReplayOverlay.read(filename).base)
+    if is_archive(filename):
+        # Decompressed and then read again
+        archive = ReplayArchive(filename)
+        return 2 * archive.replay_size + archive.header_size
+    return _replay_size(filename)
+
+
+def save_size(replay, filename):
+    # Estimate the bytes reported as progress while saving replay to filename
+    if is_overlay(filename):
+        return 0
+    size = _replay_size(replay.source)
+    if is_archive(filename):
+        # Saved and then compressed
+        size *= 2
+    return size
+
+
+# Directory with the livery catalogs, one data file per game version
+CATALOG_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                 'catalogs')
+# Game version whose catalogs are used, see set_catalog_version
+catalog_version = '1.2.0'
+
+
+class LiveryCatalog:
+    # Names of the suits, helmets or cars shown in the editor and of their
+    # designs, mapped to the values in the replay files
+    # The lists for the dropdown boxes and the reverse map from a design
+    # value to the names are built once when the catalog is loaded
+
+    def __init__(self, values, liveries):
+        # values maps each name to its value, liveries maps each name to a
+        # dict of design names and values
+        self.values = values
+        self.liveries = liveries
+        # Values for GUI
+        self.names = list(liveries)
+        self.designs = {name: list(designs)
+                        for name, designs in liveries.items()}
+        # Reverse to get the GUI values from the replay value
+        self.inverse = {value: (name, design)
+                        for name, designs in liveries.items()
+                        for design, value in designs.items()}
+
+
+@functools.lru_cache(maxsize=None)
+def _load_catalogs(version):
+    # Load the catalogs of a game version out of its data file
+    # Thanks to Kikwik for helping me gather the design names of the cars
+    filename = os.path.join(CATALOG_DIRECTORY, '{}.json'.format(version))
+    with open(filename) as file:
+        data = json.load(file)
+    if data.get('format') != 1:
+        raise ValueError('Unsupported catalog format in {}'.format(filename))
+    # The data file records the game version it describes
+    if data.get('game_version') != version:
+        raise ValueError('{} is not the catalog of version {}'.format(
+            filename, version))
+    return {kind: LiveryCatalog(catalog['values'], catalog['liveries'])
+            for kind, catalog in data['catalogs'].items()}
+
+
+def get_catalog(kind, version=None):
+    # Return the catalog of suits, helmets or cars (kind is suit, helmet or
+    # car) of the game version (default: catalog_version)
+    # Each data file is only loaded on first use
+    return _load_catalogs(version or catalog_version)[kind]
+
+
+def set_catalog_version(version):
+    # Use the catalogs of another game version, which have to be in
+    # CATALOG_DIRECTORY as <version>.json
+    global catalog_version
+    if not os.path.isfile(os.path.join(CATALOG_DIRECTORY,
+                                       '{}.json'.format(version))):
+        raise ValueError('No catalog for version {}'.format(version))
+    catalog_version = version
+
+
+# Environment variable that enables profiling like the --profile option
+PROFILE_ENV = 'CS_REPLAY_EDITOR_PROFILE'
+# Profiler collecting the timing spans, None if profiling is disabled
+profiler = None
+
+
+def _file_size(filename):
+    # Return the size of the file, or 0 if it doesn't exist
+    try:
+        return os.path.getsize(filename)
+    except OSError:
+        return 0
+
+
+class Profiler:
+    # Collects timing spans of the hot paths of the editor
+    # Methods are only wrapped when profiling is enabled, so there is no
+    # overhead otherwise. For each span, the number of calls, the time, the
+    # bytes read and written and the number of memory blocks still allocated
+    # after the call (objects created and kept) are summed up
+    fields = ('calls', 'seconds', 'max_seconds', 'bytes_read',
+              'bytes_written', 'objects')
+
+    def __init__(self):
+        self.spans = OrderedDict()
+        self.lock = threading.Lock()
+
+    def record(self, name, seconds, read=0, written=0, objects=0):
+        # Add one call to the span name
+        with self.lock:
+            span = self.spans.get(name)
+            if span is None:
+                span = self.spans[name] = dict.fromkeys(self.fields, 0)
+            span['calls'] += 1
+            span['seconds'] += seconds
+            span['max_seconds'] = max(span['max_seconds'], seconds)
+            span['bytes_read'] += read
+            span['bytes_written'] += written
+            span['objects'] += objects
+
+    def wrap(self, cls, method, read=None, written=None):
+        # Replace the method of cls by a wrapper that records a span named
+        # after both. read and written are functions of the arguments and the
+        # result of a call that return the number of bytes read and written
+        function = getattr(cls, method)
+        name = '{}.{}'.format(cls.__name__, method)
+
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            blocks = sys.getallocatedblocks()
+            start = time.perf_counter()
+            result = function(*args, **kwargs)
+            seconds = time.perf_counter() - start
+            self.record(name, seconds,
+                        read(args, result) if read else 0,
+                        written(args, result) if written else 0,
+                        sys.getallocatedblocks() - blocks)
+            return result
+        setattr(cls, method, wrapper)
+
+    def summary(self):
+        # Return the spans as table
+        lines = ['{:<34}{:>7}{:>11}{:>11}{:>11}{:>11}{:>11}'.format(
+            'Span', 'Calls', 'Total (s)', 'Max (s)', 'Read (MB)',
+            'Write (MB)', 'Objects')]
+        with self.lock:
+            for name, span in self.spans.items():
+                lines.append(
+                    '{:<34}{:>7}{:>11.3f}{:>11.3f}{:>11.2f}{:>11.2f}'
+                    '{:>11}'.format(name, span['calls'], span['seconds'],
+                                    span['max_seconds'],
+                                    span['bytes_read'] / 2 ** 20,
+                                    span['bytes_written'] / 2 ** 20,
+                                    span['objects']))
+        return '\n'.join(lines)
+
+    def report(self, output=None):
+        # Print the summary to stderr, or write the spans as JSON to the file
+        # output
+        if output is None or output == '-':
+            print(self.summary(), file=sys.stderr)
         else:
-            self.helmet_dd.current(0)
-            self.helmet_design_dd.current(0)
-        helmet_colors = driver_info['helmetLivery']
-        helmet_colors = [helmet_colors[1], helmet_colors[2], helmet_colors[3],
-                         helmet_colors[4], helmet_colors[5]]
-        self.helmet_color.set_colors(helmet_colors)
-
-    def body_selected(self, event=None):
-        # Executed when the body dropdown box is selected
-        # Load the correct values in the second dropdown box
-        body = self.body_dd.get()
-        self.suit_design_dd.config(values=self.suit_design[body])
-        self.suit_design_dd.current(0)
-        self.set_changed()
-
-    def helmet_selected(self, event=None):
-        # Executed when the helmet dropdown box is selected
-        # Load the correct values in the second dropdown box
-        helmet = self.helmet_dd.get()
-        self.helmet_design_dd.config(values=self.helmet_design[helmet])
-        self.helmet_design_dd.current(0)
-        self.set_changed()
-
-    def save(self):
-        def restore_elements():
-            # Restore style of changed elements after (un)successful saving
-            self.save_button.config(bg='#ACACAC', text='Save changes')
-            self.name_field.config(bg='#FFFFFF')
-
-        driver_info = self.driver_info
-        # Get values from GUI elements
-        name = self.name_field.get()
-        suit = self.body_dd.get()
-        suit_design = self.suit_design_dd.get()
-        suit_colors = self.suit_color.get_colors()
-        helmet = self.helmet_dd.get()
-        helmet_design = self.helmet_design_dd.get()
-        helmet_colors = self.helmet_color.get_colors()
-        # Get values for replay file
-        # Add colors to liveries, like in replay file
-        driverskinlivery = [self.suit_driverskinlivery[suit][suit_design],
-                            suit_colors]
-        driverskin = self.suit_driverskin[suit]
-        helmetlivery = [self.helmet_helmetlivery[helmet][helmet_design],
-                        helmet_colors[0], helmet_colors[1], helmet_colors[2],
-                        helmet_colors[3], helmet_colors[4]]
-        helmet = self.helmet_helmet_value[helmet]
-
-        # Check if values are valid
-        # Name has to be in ascii
-        if not all(ord(c) < 128 for c in name):
-            # Change color of button and text field to red
-            self.save_button.config(bg='#FF0000', text='Invalid input')
-            self.name_field.config(bg='#FF0000')
-            self.window.after(2000, restore_elements)
-            return False
-
-        # Change values in driver info to selected values in the GUI
-        driver_info['racerName'] = name
-        driver_info['driverSkin'] = driverskin
-        driver_info['driverSkinLivery'] = driverskinlivery
-        driver_info['helmet'] = helmet
-        driver_info['helmetLivery'] = helmetlivery
-
-        # Update values in replay, set changed flag to False and remember values
-        self.replay.change_driver_info(self.id, driver_info)
-        self.changed = False
-        self.saved_name = name
-        self.saved_color_suit = self.suit_color.get_colors()
-        self.saved_color_helmet = self.helmet_color.get_colors()
-        self.parent.set_changed()
-
-        # Change color and text of button
-        self.save_button.config(bg='#00FF00', text='Changes saved')
-        self.window.after(2000, restore_elements)
-
-        return True
-
-    def set_changed(self, event=None):
-        # Set changed flag to True
-        self.changed = True
-
-    def close_window(self):
-        # Check if there have been changes
-        # If so, ask if they should be saved
-        if (self.changed or self.saved_name != self.name_field.get() or
-                self.saved_color_suit != self.suit_color.get_colors() or
-                self.saved_color_helmet != self.helmet_color.get_colors()):
-            save = messagebox.askyesnocancel(
-                'Save changes?', 'Do you want to save your changes?')
-            if save is None:  # Cancel selected
-                return
-            elif save:  # Yes selected
-                saved = self.save()
-                # Don't destroy the window if there has been illegal input
-                if not saved:
-                    return
-            else:  # No selected
-                pass
-        self.window.destroy()
-
-
-class EditCarGUI:
-    # Track if there have been changes
-    changed = False
-    saved_number = None
-    saved_car_color = None
-
-    # Values for liveries and designs for GUI and replay files
-    # Might be incomplete and can change in future updates of the game
-    # Thanks to Kikwik for helping me gather the design names
-
-    # Car
-    # Values for replay file
-    car_vehicle = {
-        'Agitator': '4x4-agitator',
-        'Brusso': '50s-gt-brusso',
-        'Osprey': '60s-gp-osprey',
-        'Mantra': '80s-gp-generic',
-        'Piccino': 'bambino-cup-bambino',
-        'Bonk': 'eurotruck-geiger',
-        'Storm': 'gp-spectre',
-        'Panther': 'gt-panther',
-        'Conquest': 'prototype-conquest',
-        'Vost': 'rally-vost',
-        'Impact': 'stock-car',
-        'Feather': 'superlights-feather',
-        'Loose Cannon': 'trans-am-generic'
-    }
-    car_vehiclelivery = {
-        'Agitator': {
-            'Factory': 'vehiclematerial-4x4-agitator-0',
-            'Blocks': 'vehiclematerial-4x4-alligator-1',
-            'Groove': 'vehiclematerial-4x4-alligator-2',
-            'Arrow': 'vehiclematerial-4x4-alligator-3',
-            'Boulder': 'vehiclematerial-4x4-alligator-4',
-            'Highway': 'vehiclematerial-4x4-alligator-5',
-            'Bull': 'vehiclematerial-4x4-alligator-6',
-            'Galaxy': 'vehiclematerial-4x4-alligator-7',
-            'Bison': 'vehiclematerial-4x4-alligator-8'
-        },
-        'Brusso': {
-            'Factory': 'vehiclematerial-50s-gt-brusso-0',
-            'Vintage': 'vehiclematerial-50s-gt-brusso-1',
-            'Davanti': 'vehiclematerial-50s-gt-brusso-2',
-            'Livery 4 (?)': 'vehiclematerial-50s-gt-brusso-3',
-            'Classico': 'vehiclematerial-50s-gt-brusso-4',
-            'Wrap': 'vehiclematerial-50s-gt-brusso-5'
-        },
-        'Osprey': {
-            'Factory': 'vehiclematerial-60s-gp-osprey-0',
-            'Forge': 'vehiclematerial-60s-gp-osprey-1',
-            'Dive': 'vehiclematerial-60s-gp-osprey-2',
-            'Faccia': 'vehiclematerial-60s-gp-osprey-3',
-            'Wind': 'vehiclematerial-60s-gp-osprey-4',
-            'Speed': 'vehiclematerial-60s-gp-osprey-5',
-            'Warp': 'vehiclematerial-60s-gp-osprey-6',
-            'Beam': 'vehiclematerial-60s-gp-osprey-7'
-        },
-        'Mantra': {
-            'Factory': 'vehiclematerial-80s-gp-generic-0',
-            'Pro': 'vehiclematerial-80s-gp-generic-1',
-            'Radiant': 'vehiclematerial-80s-gp-generic-2',
-            'Ferocce (?)': 'vehiclematerial-80s-gp-generic-3',
-            'Slick': 'vehiclematerial-80s-gp-generic-4',
-            'Layers': 'vehiclematerial-80s-gp-generic-5',
-            'Triangle (?)': 'vehiclematerial-80s-gp-generic-6',
-            'Modern': 'vehiclematerial-80s-gp-generic-7',
-            'Ray': 'vehiclematerial-80s-gp-generic-8'
-        },
-        'Piccino': {
-            'Factory': 'vehiclematerial-piccino-cup-0',
-            'Classic': 'vehiclematerial-piccino-cup-1',
-            'Trace': 'vehiclematerial-piccino-cup-2',
-            'Play': 'vehiclematerial-piccino-cup-3',
-            'Concept': 'vehiclematerial-piccino-cup-4',
-            'Livery 6 (?)': 'vehiclematerial-piccino-cup-5',
-            'Dexterous': 'vehiclematerial-piccino-cup-6',
-            'Blocks': 'vehiclematerial-piccino-cup-7',
-            'Gift': 'vehiclematerial-piccino-cup-8'
-        },
-        'Bonk': {
-            'Factory': 'vehiclematerial-eurotruck-geiger-0',
-            'Tour': 'vehiclematerial-eurotruck-geiger-1',
-            'Bonk': 'vehiclematerial-eurotruck-geiger-2',
-            'Duo': 'vehiclematerial-eurotruck-geiger-3',
-            'Escalator': 'vehiclematerial-eurotruck-geiger-4',
-            'Cyclops': 'vehiclematerial-eurotruck-geiger-5',
-            'Swerve': 'vehiclematerial-eurotruck-geiger-6',
-            'Rino': 'vehiclematerial-eurotruck-geiger-7',
-        },
-        'Storm': {
-            'Factory': 'vehiclematerial-gp-spectre-0',
-            'Suit': 'vehiclematerial-gp-spectre-1',
-            'Legacy': 'vehiclematerial-gp-spectre-2',
-            'Vento': 'vehiclematerial-gp-spectre-3',
-            'Elegance': 'vehiclematerial-gp-spectre-4',
-            'Impact': 'vehiclematerial-gp-spectre-5',
-            'Silk': 'vehiclematerial-gp-spectre-6',
-            'Royal': 'vehiclematerial-gp-spectre-7',
-            'Drive': 'vehiclematerial-gp-spectre-8',
-            'Livery 10 (?)': 'vehiclematerial-gp-spectre-9'
-        },
-        'Panther': {
-            'Factory': 'vehiclematerial-gt-panther-0',
-            'Classic': 'vehiclematerial-gt-panther-1',
-            'Contrast': 'vehiclematerial-gt-panther-2',
-            'Champion': 'vehiclematerial-gt-panther-3',
-            'Dagger': 'vehiclematerial-gt-panther-4',
-            'Abstract (?)': 'vehiclematerial-gt-panther-5',
-            'Polygon': 'vehiclematerial-gt-panther-6',
-            'Uncharted': 'vehiclematerial-gt-panther-7',
-            'Boost (?)': 'vehiclematerial-gt-panther-8'
-        },
-        'Conquest': {
-            'Factory': 'vehiclematerial-prototype-conquest-0',
-            'Myth': 'vehiclematerial-prototype-conquest-1',
-            'Demonic': 'vehiclematerial-prototype-conquest-2',
-            'Wave': 'vehiclematerial-prototype-conquest-3',
-            'Vite': 'vehiclematerial-prototype-conquest-4',
-            'Flame': 'vehiclematerial-prototype-conquest-5',
-            'Feathers': 'vehiclematerial-prototype-conquest-6',
-            'Livery 8 (?)': 'vehiclematerial-prototype-conquest-7',
-            'Livery 9 (?)': 'vehiclematerial-prototype-conquest-8'
-        },
-        'Vost': {
-            'Factory': 'vehiclematerial-rally-vost-0',
-            'Stripes': 'vehiclematerial-rally-vost-1',
-            'Champion': 'vehiclematerial-rally-vost-2',
-            'Demon': 'vehiclematerial-rally-vost-3',
-            'Geometric': 'vehiclematerial-rally-vost-4',
-            'Wild': 'vehiclematerial-rally-vost-5',
-            'Multiverse': 'vehiclematerial-rally-vost-6',
-            'Livery 8 (?)': 'vehiclematerial-rally-vost-7',
-            'Dart': 'vehiclematerial-rally-vost-8'
-        },
-        'Impact': {
-            'Factory': 'vehiclematerial-stock-car-0',
-            'Daring': 'vehiclematerial-stock-car-1',
-            'Venom': 'vehiclematerial-stock-car-2',
-            'Arrow': 'vehiclematerial-stock-car-3',
-            'Fire': 'vehiclematerial-stock-car-4',
-            'Livery 6 (?)': 'vehiclematerial-stock-car-5',
-            'Livery 7 (?)': 'vehiclematerial-stock-car-6',
-            'Livery 8 (?)': 'vehiclematerial-stock-car-7',
-            'Livery 9 (?)': 'vehiclematerial-stock-car-8',
-            'Slick': 'vehiclematerial-stock-car-9'
-        },
-        'Feather': {
-            'Factory': 'vehiclematerial-superlights-feather-0',
-            'Classic': 'vehiclematerial-superlights-feather-1',
-            'Prince': 'vehiclematerial-superlights-feather-2',
-            'Vintage': 'vehiclematerial-superlights-feather-3',
-            'Cara': 'vehiclematerial-superlights-feather-4',
-            'Knight': 'vehiclematerial-superlights-feather-5',
-            'Timeless': 'vehiclematerial-superlights-feather-6'
-        },
-        'Loose Cannon': {
-            'Factory': 'vehiclematerial-trans-am-generic-0',
-            'Snake (?)': 'vehiclematerial-trans-am-generic-1',
-            'Desert': 'vehiclematerial-trans-am-generic-2',
-            'Transform': 'vehiclematerial-trans-am-generic-3',
-            'Bumper': 'vehiclematerial-trans-am-generic-4',
-            'Fine': 'vehiclematerial-trans-am-generic-5',
-            'Rear': 'vehiclematerial-trans-am-generic-6',
-            'Vintage': 'vehiclematerial-trans-am-generic-7',
-            'Velo': 'vehiclematerial-trans-am-generic-8'
-        }
+            with self.lock:
+                spans = dict(self.spans)
+            with open(output, 'w') as file:
+                json.dump(spans, file, indent=4)
+
+
+def enable_profiling(output=None):
+    # Wrap the hot paths in timing spans and report them on exit, see
+    # Profiler.report for output
+    # The summary can also be printed on demand with profiler.report() or
+    # F12 in the main window. Spans in the worker processes of the commands
+    # are not included, the GUI is wrapped when it is imported (see
+    # CS_Replay_Editor_GUI.profile_gui)
+    global profiler
+    if profiler is not None:
+        return profiler
+    profiler = Profiler()
+
+    def size(extension):
+        # Size of the file read or written by load or save(self, filename)
+        return lambda args, result: _file_size('{}.{}'.format(
+            args[1], extension))
+
+    for cls in (ReplayFile, MappedReplayFile, ColumnarReplayFile):
+        # Subclasses override load and save, so each is wrapped separately
+        if 'load' in vars(cls):
+            profiler.wrap(cls, 'load', read=size('replay'))
+        if 'save' in vars(cls):
+            profiler.wrap(cls, 'save', written=size('replay'))
+    profiler.wrap(HeaderFile, 'load', read=size('header'))
+    profiler.wrap(HeaderFile, 'save', written=size('header'))
+    # Parse and encode time of the JSON of all files
+    profiler.wrap(JSONCodec, 'loads',
+                  read=lambda args, result: len(args[1]))
+    profiler.wrap(JSONCodec, 'dumps',
+                  written=lambda args, result: len(result))
+    profiler.wrap(JSONCodec, 'write',
+                  written=lambda args, result: _file_size(args[1]))
+    atexit.register(profiler.report, output)
+    return profiler
+
+
+# Keys that can be changed with the batch command, number is the car number
+EDIT_KEYS = DRIVER_KEYS + CAR_KEYS + ('number',)
+
+
+def edit_drivers(replay, edits):
+    # Apply edits to the matching drivers of the replay
+    # edits maps a racerName or racingTeamID (or '*' for all other drivers)
+    # to a dict with the values that should be changed (keys out of
+    # EDIT_KEYS, number is the car number)
+    # Returns the number of changed drivers
+    changes = {}
+    for id, name, grid in replay.get_drivers():
+        edit = edits.get(id, edits.get(name, edits.get('*')))
+        if not edit:
+            continue
+        change = {key: edit[key] for key in DRIVER_KEYS + CAR_KEYS
+                  if key in edit}
+        if 'number' in edit:
+            vehiclelivery = change.get(
+                'vehicleLivery', replay.get_car_info(id)['vehicleLivery'])
+            vehiclelivery = list(vehiclelivery)
+            vehiclelivery[2] = edit['number']
+            change['vehicleLivery'] = vehiclelivery
+        changes[id] = change
+    replay.apply_edits(changes)
+    return len(changes)
+
+
+def _replay_size(filename):
+    # Return the combined size of the .replay and .header file
+    return (os.path.getsize('{}.replay'.format(filename)) +
+            os.path.getsize('{}.header'.format(filename)))
+
+
+def _batch_edit(filename, target, edits):
+    # Apply edits to one replay and save it to target
+    # Runs in the worker processes of the batch command
+    start = time.perf_counter()
+    replay = Replay(filename)
+    changed = edit_drivers(replay, edits)
+    replay.save(target)
+    return changed, _replay_size(filename), time.perf_counter() - start
+
+
+def load_edits(filename):
+    # Load and check the edits for the batch command out of a JSON file
+    with open(filename) as file:
+        edits = json.load(file)
+    if not isinstance(edits, dict):
+        raise ValueError('Edits have to be a JSON object')
+    for driver, edit in edits.items():
+        if not isinstance(edit, dict):
+            raise ValueError('Edit for {} has to be a JSON object'.format(
+                driver))
+        _check_edit(driver, edit, EDIT_KEYS)
+    return edits
+
+
+def _check_edit(driver, edit, keys):
+    # Check the keys and the number of an edit for driver
+    for key in edit:
+        if key not in keys:
+            raise ValueError('Unknown key {} in edit for {}'.format(
+                key, driver))
+    number = edit.get('number', 0)
+    if not isinstance(number, int) or not 0 <= number <= 99:
+        raise ValueError('Number for {} has to be between 0 and 99'.format(
+            driver))
+
+
+def batch(args):
+    # Apply the edits to every replay in the directory, spread over a pool of
+    # worker processes, and report the throughput for each file
+    try:
+        edits = load_edits(args.edits)
+    except (OSError, ValueError) as e:
+        print('Invalid edits: {}'.format(e), file=sys.stderr)
+        return 2
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+    output = args.output or args.directory
+
+    names = find_replays(args.directory)
+    failed = 0
+    total_size = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=args.workers) as executor:
+        futures = {}
+        for name in names:
+            future = executor.submit(
+                _batch_edit, os.path.join(args.directory, name),
+                os.path.join(output, name), edits)
+            futures[future] = name
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                changed, size, seconds = future.result()
+            except Exception as e:
+                failed += 1
+                print('{}: failed ({})'.format(name, e), file=sys.stderr)
+                continue
+            total_size += size
+            print('{}: {} drivers changed, {:.1f} MB in {:.3f} s '
+                  '({:.1f} MB/s)'.format(name, changed, size / 2 ** 20,
+                                         seconds,
+                                         size / 2 ** 20 / max(seconds, 1e-9)))
+    seconds = time.perf_counter() - start
+    print('{} replays ({} failed), {:.1f} MB in {:.3f} s: {:.1f} files/s, '
+          '{:.1f} MB/s'.format(len(names), failed, total_size / 2 ** 20,
+                               seconds, len(names) / max(seconds, 1e-9),
+                               total_size / 2 ** 20 / max(seconds, 1e-9)))
+    return 1 if failed else 0
+
+
+# Keys of a preset, the configuration of a driver and car without the name
+PRESET_KEYS = tuple(key for key in EDIT_KEYS if key != 'racerName')
+
+
+def load_preset(filename):
+    # Load and check a preset out of a JSON file
+    with open(filename) as file:
+        preset = json.load(file)
+    name = os.path.basename(filename)
+    if not isinstance(preset, dict):
+        raise ValueError('Preset {} has to be a JSON object'.format(name))
+    _check_edit(name, preset, PRESET_KEYS)
+    return preset
+
+
+def save_preset(filename, replay, id):
+    # Save the driver and car of a driver of the replay as preset
+    preset = replay.get_driver_info(id)
+    preset.update(replay.get_car_info(id))
+    del preset['racerName']
+    preset['number'] = preset['vehicleLivery'][2]
+    with open(filename, 'w') as file:
+        json.dump(preset, file, indent=4)
+
+
+def hex_to_rgb(colors, numpy):
+    # Convert a list of colors in the format of ColorPalette ('rrggbb' or
+    # '#rrggbb') into an array of RGB values with one row per color
+    text = ''.join(color[-6:] for color in colors)
+    return numpy.frombuffer(bytes.fromhex(text), dtype=numpy.uint8).reshape(
+        len(colors), 3)
+
+
+def nearest_colors(colors, palette):
+    # Return the color of the palette nearest to each of the colors
+    # Colors and palette are lists of colors in the format of ColorPalette
+    # The distances of all colors to all palette colors are computed at once
+    numpy = _import_numpy('Recoloring')
+    if not colors:
+        return []
+    unique, inverse = numpy.unique(
+        [color[-6:].lower() for color in colors], return_inverse=True)
+    rgb = hex_to_rgb(unique, numpy).astype(numpy.int32)
+    targets = hex_to_rgb(palette, numpy).astype(numpy.int32)
+    distances = ((rgb[:, None, :] - targets[None, :, :]) ** 2).sum(axis=2)
+    nearest = distances.argmin(axis=1)[inverse.reshape(-1)]
+    return [palette[i][-6:] for i in nearest]
+
+
+def _livery_colors(config):
+    # Return all colors of the suit, helmet and car livery of a driver
+    # configuration, in the order _replace_livery_colors expects them
+    return (list(config['driverSkinLivery'][1]) +
+            list(config['helmetLivery'][1:6]) +
+            list(config['vehicleLivery'][1]))
+
+
+def _check_liveries(replay):
+    # Raise ValueError if a driver of the replay has a livery without the
+    # colors or the car number that apply_presets changes
+    for id, name, grid in replay.get_drivers():
+        config = dict(replay.get_driver_info(id), **replay.get_car_info(id))
+        for key, index in (('driverSkinLivery', 1), ('helmetLivery', 5),
+                           ('vehicleLivery', 2)):
+            livery = config[key]
+            if (not isinstance(livery, list) or len(livery) <= index or
+                    key != 'helmetLivery' and not isinstance(livery[1], list)):
+                raise ValueError('Malformed {} of {}'.format(key, name))
+
+
+def _replace_livery_colors(config, colors):
+    # Return the liveries of a driver configuration with their colors
+    # replaced by colors (see _livery_colors)
+    suit = config['driverSkinLivery']
+    helmet = config['helmetLivery']
+    vehicle = config['vehicleLivery']
+    suit_end = len(suit[1])
+    helmet_end = suit_end + len(helmet[1:6])
+    return {
+        'driverSkinLivery': [suit[0], colors[:suit_end]] + list(suit[2:]),
+        'helmetLivery': [helmet[0]] + colors[suit_end:helmet_end] +
+                        list(helmet[6:]),
+        'vehicleLivery': [vehicle[0], colors[helmet_end:]] + list(vehicle[2:]),
     }
-    # Values for GUI
-    car_car = []
-    car_design = {}
-    for car in car_vehiclelivery:
-        car_car.append(car)
-        car_design[car] = list(car_vehiclelivery[car].keys())
-    # Reverse to get the GUI values from the replay value
-    inv_vehiclelivery = {}
-    for i in car_vehiclelivery.items():
-        for j in i[1].items():
-            inv_vehiclelivery[j[1]] = (i[0], j[0])
-
-    def __init__(self, parent, replay, id):
-        self.parent = parent
-        self.replay = replay
-        self.id = id
-
-        # Load current data out of the replay file
-        self.car_info = self.replay.get_car_info(id)
-        racername = self.car_info['racerName']
-
-        # Create popup window
-        self.window = tk.Toplevel()
-        self.window.title('Edit Car')
-        self.window.protocol('WM_DELETE_WINDOW', self.close_window)
-        self.window.grab_set()
-        self.window.grid_columnconfigure(0, weight=1)
-        self.window.grid_columnconfigure(1, weight=1)
-        self.window.grid_columnconfigure(2, weight=1)
-        self.window.grid_columnconfigure(3, weight=1)
-
-        # racerName as headline
-        self.headline = tk.Label(self.window,
-                                 text='Edit {}'.format(racername))
-        self.headline.grid(column=0, row=0, columnspan=4, sticky='nesw')
-
-        # Edit vehicle and vehicleLivery
-        # Each car has its own set of designs that have to be loaded into
-        # the second dropdown menu
-        text_car = tk.Label(self.window, text='Car')
-        text_car.grid(column=0, row=1, sticky='nesw')
-        self.car_dd = ttk.Combobox(self.window, values=self.car_car,
-                                   state='readonly', exportselection=False)
-        self.car_dd.grid(column=1, row=1, sticky='nesw')
-        self.car_dd.bind('<<ComboboxSelected>>', self.car_selected)
-        self.car_design_dd = ttk.Combobox(self.window, values=[],
-                                          state='readonly',)
-        self.car_design_dd.grid(column=2, row=1, sticky='nesw')
-        self.car_design_dd.bind('<<ComboboxSelected>>', self.set_changed)
-        self.car_color = ColorPalette(self.window, 4)
-        self.car_color.grid(column=3, row=1, sticky='nesw')
-
-        # Edit car number
-        number = self.car_info['vehicleLivery'][2]
-        text_number = tk.Label(self.window, text='Number')
-        text_number.grid(column=0, row=2, sticky='nesw')
-        self.number_field = tk.Entry(self.window)
-        self.number_field.insert(0, number)
-        self.number_field.grid(column=1, row=2, sticky='nesw')
-
-        # Save changes button
-        self.save_button = tk.Button(self.window, text='Save changes',
-                                     bg='#ACACAC', command=self.save)
-        self.save_button.grid(column=0, row=3, columnspan=4, sticky='nesw')
-
-        # Set the selected values to the current values out of the replay file
-        self.load_current_values(self.car_info)
-
-        # Set changed flag to False and remember number and color values
-        self.saved_number = number
-        self.saved_car_color = self.car_color.get_colors()
-        self.changed = False
-
-    def load_current_values(self, car_info):
-        # Set the values currently set in the replay file (if possible)
-        vehiclelivery = car_info['vehicleLivery'][0]
-        if vehiclelivery in self.inv_vehiclelivery:
-            vehicle_curr, design_curr = self.inv_vehiclelivery[vehiclelivery]
-        else:
-            vehicle_curr, design_curr = None, None
-
-        # Car and design
-        if vehicle_curr in self.car_car:
-            self.car_dd.current(self.car_car.index(vehicle_curr))
-            self.car_selected()  # Load values for second dropdown box
-            if design_curr in self.car_design[vehicle_curr]:
-                self.car_design_dd.current(
-                    self.car_design[vehicle_curr].index(design_curr))
-            else:
-                self.car_design_dd.current(0)
+
+
+def apply_presets(replays, presets, palettes):
+    # Apply presets and team palettes to the drivers of many replays in one
+    # pass. presets and palettes map a racerName or racingTeamID (or '*' for
+    # all drivers) to a preset (see load_preset) or a list of colors. The
+    # presets are applied first, then every livery color of the matched
+    # drivers is replaced by the nearest color of their palette
+    # The colors of all replays are matched against each palette at once
+    # Returns the number of drivers changed by presets and by palettes
+    changed = 0
+    for replay in replays:
+        changed += edit_drivers(replay, presets)
+
+    # Collect the colors of all drivers per palette
+    matches = {}
+    for replay in replays:
+        for id, name, grid in replay.get_drivers():
+            key = next((key for key in (id, name, '*') if key in palettes),
+                       None)
+            if key is not None:
+                matches.setdefault(key, []).append((replay, id))
+    recolored = 0
+    for key, drivers in matches.items():
+        configs = [dict(replay.get_driver_info(id), **replay.get_car_info(id))
+                   for replay, id in drivers]
+        # Only valid colors are matched, anything else in the liveries is
+        # kept as it is
+        colors = [_livery_colors(config) for config in configs]
+        flat = nearest_colors([color for driver in colors
+                               for color in driver if _is_color(color)],
+                              palettes[key])
+        position = 0
+        for (replay, id), config, driver in zip(drivers, configs, colors):
+            new = []
+            for color in driver:
+                if _is_color(color):
+                    color = flat[position]
+                    position += 1
+                new.append(color)
+            if new != driver:
+                replay.apply_edits({id: _replace_livery_colors(config, new)})
+                recolored += 1
+    return changed, recolored
+
+
+def load_pass(filename):
+    # Load the presets and palettes for the presets command out of a JSON
+    # file with the keys presets (racerName or racingTeamID mapped to the
+    # path of a preset file, relative to this file) and palettes (mapped to
+    # a list of colors)
+    with open(filename) as file:
+        data = json.load(file)
+    directory = os.path.dirname(os.path.abspath(filename))
+    presets = {driver: load_preset(os.path.join(directory, path))
+               for driver, path in data.get('presets', {}).items()}
+    palettes = data.get('palettes', {})
+    for driver, palette in palettes.items():
+        if (not isinstance(palette, list) or not palette or
+                not all(_is_color(color) for color in palette)):
+            raise ValueError('Palette for {} has to be a list of colors'.format(
+                driver))
+    return presets, palettes
+
+
+def _is_color(color):
+    # Check if color is a color in the format of ColorPalette
+    return (isinstance(color, str) and
+            re.fullmatch('#?[0-9a-fA-F]{6}', color) is not None)
+
+
+def preset_replays(args):
+    # Apply presets and palettes to every replay of the directory in one pass
+    try:
+        presets, palettes = load_pass(args.presets)
+    except (OSError, ValueError, KeyError) as e:
+        print('Invalid presets: {}'.format(e), file=sys.stderr)
+        return 2
+    if args.output:
+        os.makedirs(args.output, exist_ok=True)
+    output = args.output or args.directory
+
+    start = time.perf_counter()
+    names = find_replays(args.directory)
+    failed = 0
+    loaded = []
+    for name in names:
+        try:
+            replay = Replay(os.path.join(args.directory, name))
+            _check_liveries(replay)
+        except Exception as e:
+            failed += 1
+            print('{}: failed ({})'.format(name, e), file=sys.stderr)
         else:
-            self.car_dd.current(0)
-            self.car_design_dd.current(0)
-
-        car_colors = car_info['vehicleLivery'][1]
-        self.car_color.set_colors(car_colors)
-
-    def car_selected(self, event=None):
-        # Executed when the car dropdown box is selected
-        # Load the correct values in the second dropdown box
-        car = self.car_dd.get()
-        self.car_design_dd.config(values=self.car_design[car])
-        self.car_design_dd.current(0)
-
-    def save(self):
-        def restore_elements():
-            # Restore style of changed elements after (un)successful saving
-            self.save_button.config(bg='#ACACAC', text='Save changes')
-            self.number_field.config(bg='#FFFFFF')
-
-        car_info = self.car_info
-        # Get values from GUI elements
-        car = self.car_dd.get()
-        design = self.car_design_dd.get()
-        car_colors = self.car_color.get_colors()
-        number = self.number_field.get()
-
-        # Check if values are valid
-        # Number has to be between 0 and 99
-        if not number.isdecimal() or not 0 <= int(number) <= 99:
-            # Change color of button and text field to red
-            self.save_button.config(bg='#FF0000', text='Invalid input')
-            self.number_field.config(bg='#FF0000')
-            self.window.after(2000, restore_elements)
-            return False
-        number = int(number)
-
-        # Get values for replay file
-        # Add colors to liveries, like in replay file
-        vehiclelivery = [self.car_vehiclelivery[car][design], car_colors,
-                         number]
-        vehicle = self.car_vehicle[car]
-
-        # Change values in driver info to selected values in the GUI
-        car_info['vehicle'] = vehicle
-        car_info['vehicleLivery'] = vehiclelivery
-
-        # Update values in replay, set changed flag to False and remember values
-        self.replay.change_car_info(self.id, car_info)
-        self.changed = False
-        self.saved_number = number
-        self.saved_car_color = car_colors
-        self.parent.set_changed()
-
-        # Change color and text of button
-        self.save_button.config(bg='#00FF00', text='Changes saved')
-        self.window.after(2000, restore_elements)
-
-        return True
-
-    def set_changed(self, event=None):
-        # Set changed flag to True
-        self.changed = True
-
-    def close_window(self):
-        # Check if there have been changes
-        # If so, ask if they should be saved
-        if (self.changed or str(self.saved_number) != self.number_field.get() or
-                self.saved_car_color != self.car_color.get_colors()):
-            save = messagebox.askyesnocancel(
-                'Save changes?', 'Do you want to save your changes?')
-            if save is None:  # Cancel selected
-                return
-            elif save:  # Yes selected
-                saved = self.save()
-                # Don't destroy the window if there has been illegal input
-                if not saved:
-                    return
-            else:  # No selected
-                pass
-        self.window.destroy()
-
-
-class ColorPalette(tk.Frame):
-    # Frame containing a specified amount of buttons with color choosers
-    def __init__(self, parent, colors=1):
-        tk.Frame.__init__(self, parent)
-        self.colors = []
-
-        # Always have at least one color, also if input is invalid
-        if not isinstance(colors, int) or colors < 1:
-            colors = 1
-
-        # Add the color buttons
-        for i in range(colors):
-            self.grid_columnconfigure(i, weight=1)
-            button = tk.Button(self, bg='#FFFFFF', text='   ',
-                               command=lambda x=i: self.choose_color(x))
-            button.grid(column=i, row=0, sticky='nesw')
-            self.colors.append(button)
-
-    def choose_color(self, index):
-        # Open a color chooser window and change the color of the button
-        color = colorchooser.askcolor(parent=self)[1]
-        self.colors[index].config(bg=color)
-
-    def set_colors(self, colors):
-        # Set the colors of the buttons to the colors of the given list
-        # Only if the right amount of colors is given
-        num_buttons = len(self.colors)
-        if isinstance(self.colors, list) and num_buttons == len(colors):
-            for i in range(len(self.colors)):
-                if colors[i].startswith('#'):
-                    self.colors[i].config(bg=colors[i])
-                else:
-                    self.colors[i].config(bg='#{}'.format(colors[i]))
-
-    def get_colors(self):
-        # Return a list of the colors selected
-        colors = []
-        for button in self.colors:
-            colors.append(button.cget('bg')[1:])
-        return colors
-
-
-def main():
-    GUI()
+            loaded.append((name, replay))
+    changed, recolored = apply_presets([replay for name, replay in loaded],
+                                       presets, palettes)
+    for name, replay in loaded:
+        try:
+            replay.save(os.path.join(output, name))
+        except Exception as e:
+            failed += 1
+            print('{}: failed ({})'.format(name, e), file=sys.stderr)
+    print('{} replays ({} failed): {} drivers changed by presets, {} '
+          'recolored in {:.3f} s'.format(len(names), failed, changed,
+                                        recolored,
+                                        time.perf_counter() - start))
+    return 1 if failed else 0
+
+
+def find_driver(replay, driver):
+    # Return the racingTeamID of the driver of the replay with the
+    # racingTeamID or racerName driver, or None if there is none
+    for id, name, grid in replay.get_drivers():
+        if driver in (id, name):
+            return id
+    return None
+
+
+def export_preset(args):
+    # Save the driver and car of a driver of a replay as preset file
+    try:
+        replay = Replay(args.replay)
+    except (OSError, ValueError, KeyError) as e:
+        print('Invalid replay: {}'.format(e), file=sys.stderr)
+        return 2
+    id = find_driver(replay, args.driver)
+    if id is None:
+        print('No driver {} in {}'.format(args.driver, args.replay),
+              file=sys.stderr)
+        return 2
+    save_preset(args.preset, replay, id)
+    return 0
+
+
+# Catalog and number of colors of each livery of a driver configuration
+LIVERY_CHECKS = (('driverSkinLivery', 'suit', 3),
+                 ('helmetLivery', 'helmet', 5),
+                 ('vehicleLivery', 'car', 4))
+
+
+def _livery_palette(key, livery):
+    # Return the colors of a livery out of a driver configuration, see
+    # _livery_colors
+    if key == 'helmetLivery':
+        return livery[1:]
+    return livery[1] if len(livery) > 1 else None
+
+
+def validate_config(config, version=None):
+    # Check a driver configuration against the catalogs of the game version
+    # (default: catalog_version)
+    # Returns a list of (check, key, value) for each problem found, check is
+    # malformed (config isn't an object), unknown_livery, malformed_colors or
+    # car_number
+    if not isinstance(config, dict):
+        return [('malformed', None, config)]
+    issues = []
+    for key, kind, count in LIVERY_CHECKS:
+        livery = config.get(key)
+        if not isinstance(livery, list) or not livery:
+            issues.append(('malformed_colors', key, livery))
+            continue
+        # Names of liveries are strings, anything else can't be looked up
+        if (not isinstance(livery[0], str) or
+                livery[0] not in get_catalog(kind, version).inverse):
+            issues.append(('unknown_livery', key, livery[0]))
+        colors = _livery_palette(key, livery)
+        if (not isinstance(colors, list) or len(colors) != count or
+                not all(_is_color(color) for color in colors)):
+            issues.append(('malformed_colors', key, colors))
+    vehiclelivery = config.get('vehicleLivery')
+    if isinstance(vehiclelivery, list) and len(vehiclelivery) > 1:
+        number = vehiclelivery[2] if len(vehiclelivery) > 2 else None
+        # bool is an int, but not a car number
+        if (not isinstance(number, int) or isinstance(number, bool) or
+                not 0 <= number <= 99):
+            issues.append(('car_number', 'vehicleLivery', number))
+    return issues
+
+
+def validate_replay(filename, version=None):
+    # Check the driver configurations of a replay and compare the .replay
+    # file with configsById of the .header file
+    # Only the configurations of the .replay file are parsed
+    # Returns a list of issues, each a dict with the racingTeamID (driver),
+    # the check (see validate_config, header_mismatch or unreadable), the key
+    # of the configuration and the value
+    # Configurations that aren't objects are reported as malformed, in the
+    # .header file with the key configsById
+    try:
+        replay = ReplayFile(filename, config_only=True)
+        header = HeaderFile(filename)
+        configs = header.data['configsById']
+        if not isinstance(configs, dict):
+            raise TypeError('configsById is not an object')
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        return [{'driver': None, 'check': 'unreadable', 'key': None,
+                 'value': str(e)}]
+    issues = []
+    for driver in replay.data:
+        id = driver['racingTeamID']
+        config = driver.get('racingTeamConfiguration')
+        for check, key, value in validate_config(config, version):
+            issues.append({'driver': id, 'check': check, 'key': key,
+                           'value': value})
+        if id not in configs:
+            issues.append({'driver': id, 'check': 'header_mismatch',
+                           'key': None, 'value': 'missing in .header'})
+            continue
+        if not isinstance(configs[id], dict):
+            issues.append({'driver': id, 'check': 'malformed',
+                           'key': 'configsById', 'value': configs[id]})
+            continue
+        if not isinstance(config, dict):
+            continue
+        for key in DRIVER_KEYS + CAR_KEYS:
+            if config.get(key) != configs[id].get(key):
+                issues.append({'driver': id, 'check': 'header_mismatch',
+                               'key': key,
+                               'value': {'replay': config.get(key),
+                                         'header': configs[id].get(key)}})
+    for id in configs:
+        if id not in replay.index:
+            issues.append({'driver': id, 'check': 'header_mismatch',
+                           'key': None, 'value': 'missing in .replay'})
+    return issues
+
+
+def validate_replays(args):
+    # Check every replay of the directory in a pool of worker processes and
+    # write one JSON object per issue (see validate_replay) to the output
+    # The replays are handed to the workers in chunks, as checking a single
+    # replay takes far less time than sending it to a worker
+    start = time.perf_counter()
+    names = find_replays(args.directory)
+    workers = args.workers or os.cpu_count() or 1
+    chunksize = max(1, min(64, len(names) // (workers * 4)))
+    output = (open(args.output, 'w') if args.output and args.output != '-'
+              else sys.stdout)
+    invalid = 0
+    total = 0
+    try:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = executor.map(
+                validate_replay,
+                [os.path.join(args.directory, name) for name in names],
+                [catalog_version] * len(names), chunksize=chunksize)
+            for name, issues in zip(names, results):
+                if issues:
+                    invalid += 1
+                    total += len(issues)
+                for issue in issues:
+                    output.write(json.dumps(dict(replay=name, **issue)) +
+                                 '\n')
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    print('{} replays checked in {:.3f} s: {} issues in {} replays'.format(
+        len(names), time.perf_counter() - start, total, invalid),
+        file=sys.stderr)
+    return 1 if invalid else 0
+
+
+def query_replays(args):
+    # Print the replays of the directory that match the filters, using the
+    # index of the directory (see ReplayIndex.query)
+    # Replays without an up to date entry are read in a pool of worker
+    # processes first
+    try:
+        filters = parse_filter(args.filters)
+    except ValueError as e:
+        print('Invalid filter: {}'.format(e), file=sys.stderr)
+        return 2
+    start = time.perf_counter()
+    names = find_replays(args.directory)
+    index = ReplayIndex(args.directory)
+    try:
+        index.prune(names)
+        stale = index.stale(names)
+        if stale:
+            workers = args.workers or os.cpu_count() or 1
+            chunksize = max(1, min(64, len(stale) // (workers * 4)))
+            with ProcessPoolExecutor(max_workers=workers) as executor:
+                index.read(stale, functools.partial(executor.map,
+                                                    chunksize=chunksize))
+        matches = index.query(filters)
+    finally:
+        index.close()
+    for name in matches:
+        print(name)
+    print('{} of {} replays match ({} indexed) in {:.3f} s'.format(
+        len(matches), len(names), len(stale), time.perf_counter() - start),
+        file=sys.stderr)
+    return 0
+
+
+def _pack(source, target, compression):
+    # Pack one replay into an archive, runs in the worker processes
+    ReplayArchive.pack(source, target, compression)
+    return _replay_size(source), os.path.getsize(target)
+
+
+def _extract(source, target):
+    # Extract one archive, runs in the worker processes
+    ReplayArchive(source).extract(target)
+    return os.path.getsize(source), _replay_size(target)
+
+
+def _materialize(source, target):
+    # Materialize one overlay, runs in the worker processes
+    materialize(source, target)
+    return os.path.getsize(source), _replay_size(target)
+
+
+def _convert_replays(jobs, workers):
+    # Run the jobs (name mapped to function and arguments) of the import,
+    # export and materialize command in a pool of worker processes
+    # The jobs return the size of the files they read and wrote
+    failed = 0
+    total_read = 0
+    total_written = 0
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(function, *arguments): name
+                   for name, (function, arguments) in jobs.items()}
+        for future in as_completed(futures):
+            name = futures[future]
+            try:
+                read, written = future.result()
+            except Exception as e:
+                failed += 1
+                print('{}: failed ({})'.format(name, e), file=sys.stderr)
+                continue
+            total_read += read
+            total_written += written
+    seconds = time.perf_counter() - start
+    print('{} replays ({} failed) in {:.3f} s: {:.1f} MB read, {:.1f} MB '
+          'written'.format(len(jobs), failed, seconds, total_read / 2 ** 20,
+                           total_written / 2 ** 20))
+    return 1 if failed else 0
+
+
+def import_replays(args):
+    # Pack every replay of the directory into an archive
+    os.makedirs(args.output, exist_ok=True)
+    jobs = {}
+    for name in find_replays(args.directory):
+        jobs[name] = (_pack, (os.path.join(args.directory, name),
+                              os.path.join(args.output,
+                                           name + ARCHIVE_EXTENSION),
+                              args.compression))
+    return _convert_replays(jobs, args.workers)
+
+
+def export_replays(args):
+    # Extract every archive of the directory into a .replay and .header file
+    os.makedirs(args.output, exist_ok=True)
+    jobs = {}
+    for entry in os.scandir(args.directory):
+        if entry.is_file() and is_archive(entry.name):
+            name = entry.name[:-len(ARCHIVE_EXTENSION)]
+            jobs[name] = (_extract, (entry.path,
+                                     os.path.join(args.output, name)))
+    return _convert_replays(jobs, args.workers)
+
+
+def materialize_overlays(args):
+    # Write every overlay of the directory as .replay and .header file
+    os.makedirs(args.output, exist_ok=True)
+    jobs = {}
+    for entry in os.scandir(args.directory):
+        if entry.is_file() and is_overlay(entry.name):
+            name = entry.name[:-len(OVERLAY_EXTENSION)]
+            jobs[name] = (_materialize, (entry.path,
+                                         os.path.join(args.output, name)))
+    return _convert_replays(jobs, args.workers)
+
+
+def main(argv=None):
+    # Start the GUI if no command is given, otherwise run the command
+    parser = argparse.ArgumentParser(
+        description='Editor for Circuit Superstars replay files. '
+                    'Starts the editor window if no command is given.')
+    parser.add_argument(
+        '--profile', action='store_true',
+        help='Time loading and saving and print a summary on exit (also '
+             'enabled by setting {} to 1 or to a .json file)'.format(
+                 PROFILE_ENV))
+    parser.add_argument('--profile-output', metavar='FILE',
+                        help='Write the profiling summary as JSON to FILE')
+    parser.add_argument(
+        '--catalog', metavar='VERSION',
+        help='Game version of the names of suits, helmets and cars '
+             '(catalogs/VERSION.json, default: {})'.format(catalog_version))
+    commands = parser.add_subparsers(dest='command')
+
+    command = commands.add_parser(
+        'batch', help='Change drivers and cars in every replay of a directory')
+    command.add_argument('directory', help='Directory with the replays')
+    command.add_argument(
+        'edits', help='JSON file mapping racerName or racingTeamID to the '
+                      'values to change: {}'.format(', '.join(EDIT_KEYS)))
+    location = command.add_mutually_exclusive_group(required=True)
+    location.add_argument('-o', '--output',
+                          help='Directory to save the changed replays to')
+    location.add_argument('--in-place', action='store_true',
+                          help='Overwrite the replays')
+    command.add_argument('-w', '--workers', type=int, default=None,
+                         help='Number of worker processes '
+                              '(default: number of CPUs)')
+    command.set_defaults(function=batch)
+
+    command = commands.add_parser(
+        'presets', help='Apply presets and team palettes to every replay of '
+                        'a directory in one pass')
+    command.add_argument('directory', help='Directory with the replays')
+    command.add_argument(
+        'presets', help='JSON file with presets (racerName or racingTeamID '
+                        'mapped to a preset file) and palettes (mapped to a '
+                        'list of colors, * for all drivers)')
+    location = command.add_mutually_exclusive_group(required=True)
+    location.add_argument('-o', '--output',
+                          help='Directory to save the changed replays to')
+    location.add_argument('--in-place', action='store_true',
+                          help='Overwrite the replays')
+    command.set_defaults(function=preset_replays)
+
+    command = commands.add_parser(
+        'save-preset', help='Save the driver and car of a driver of a replay '
+                            'as preset file')
+    command.add_argument('replay', help='Replay (without extension)')
+    command.add_argument('driver', help='racerName or racingTeamID')
+    command.add_argument('preset', help='Preset file to write')
+    command.set_defaults(function=export_preset)
+
+    command = commands.add_parser(
+        'validate', help='Check the liveries, colors and car numbers of every '
+                         'replay of a directory and compare the .replay and '
+                         '.header files')
+    command.add_argument('directory', help='Directory with the replays')
+    command.add_argument('-o', '--output',
+                         help='File to write the issues to as JSON Lines '
+                              '(default: stdout)')
+    command.add_argument('-w', '--workers', type=int, default=None,
+                         help='Number of worker processes '
+                              '(default: number of CPUs)')
+    command.set_defaults(function=validate_replays)
+
+    command = commands.add_parser(
+        'query', help='List the replays of a directory with a track, '
+                      'scenario or driver configuration')
+    command.add_argument('directory', help='Directory with the replays')
+    command.add_argument(
+        'filters', nargs='*',
+        help='Filters in the form key:value, keys are {}. Filters on drivers '
+             'have to match the same driver, words without a key filter by '
+             'name'.format(', '.join(QUERY_FILTERS)))
+    command.add_argument('-w', '--workers', type=int, default=None,
+                         help='Number of worker processes '
+                              '(default: number of CPUs)')
+    command.set_defaults(function=query_replays)
+
+    command = commands.add_parser(
+        'import', help='Pack the replays of a directory into archives '
+                       '({})'.format(ARCHIVE_EXTENSION))
+    command.add_argument('directory', help='Directory with the replays')
+    command.add_argument('-o', '--output', required=True,
+                         help='Directory to save the archives to')
+    command.add_argument('-c', '--compression', choices=COMPRESSIONS,
+                         default=DEFAULT_COMPRESSION,
+                         help='Compression of the .replay files '
+                              '(default: {})'.format(DEFAULT_COMPRESSION))
+    command.add_argument('-w', '--workers', type=int, default=None,
+                         help='Number of worker processes '
+                              '(default: number of CPUs)')
+    command.set_defaults(function=import_replays)
+
+    command = commands.add_parser(
+        'export', help='Extract the archives of a directory into the '
+                       '.replay and .header files the game reads')
+    command.add_argument('directory', help='Directory with the archives')
+    command.add_argument('-o', '--output', required=True,
+                         help='Directory to save the replays to')
+    command.add_argument('-w', '--workers', type=int, default=None,
+                         help='Number of worker processes '
+                              '(default: number of CPUs)')
+    command.set_defaults(function=export_replays)
+
+    command = commands.add_parser(
+        'materialize', help='Write the edit overlays ({}) of a directory as '
+                            '.replay and .header files'.format(
+                                OVERLAY_EXTENSION))
+    command.add_argument('directory', help='Directory with the overlays')
+    command.add_argument('-o', '--output', required=True,
+                         help='Directory to save the replays to')
+    command.add_argument('-w', '--workers', type=int, default=None,
+                         help='Number of worker processes '
+                              '(default: number of CPUs)')
+    command.set_defaults(function=materialize_overlays)
+
+    args = parser.parse_args(argv)
+    if args.catalog:
+        try:
+            set_catalog_version(args.catalog)
+        except ValueError as e:
+            parser.error(str(e))
+    profile = os.environ.get(PROFILE_ENV, '')
+    if args.profile or args.profile_output or profile not in ('', '0'):
+        # Any value of the environment variable other than a .json file
+        # prints the summary
+        if args.profile_output is None and profile.endswith('.json'):
+            args.profile_output = profile
+        enable_profiling(args.profile_output)
+    if args.command is None:
+        # The GUI is only imported when it is started, so the commands and
+        # their worker processes don't need tkinter
+        import CS_Replay_Editor_GUI as gui
+        if profiler is not None:
+            gui.profile_gui(profiler)
+        gui.GUI()
+        return 0
+    return args.function(args)
 
 
 if __name__ == '__main__':
-    main()
+    # Run main of the imported module instead of this script, so the GUI
+    # and the worker processes use the same module (and its settings)
+    import CS_Replay_Editor
+    sys.exit(CS_Replay_Editor.main())
@@ -0,0 +1,1376 @@
+import bisect
+import os
+import queue
+import shlex
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import tkinter as tk
+from tkinter import filedialog, ttk, colorchooser, messagebox
+
+import CS_Replay_Editor as editor
+from CS_Replay_Editor import (ARCHIVE_EXTENSION, OVERLAY_EXTENSION, Cancelled,
+                              DirectoryTracker, LRUCache, ProgressTracker,
+                              Replay, ReplayIndex, get_catalog, is_archive,
+                              is_overlay, load_size, parse_filter,
+                              read_index_entry, save_size)
+
+
+class Config:
+    def __init__(self):
+        # Open config file and read all entries
+        # If the file doesn't exist, create it
+        self.config = {}
+        if os.path.isfile('config'):
+            with open('config') as file:
+                for line in file:
+                    key, value = line.strip().split('=', 1)
+                    self.config[key] = value
+        else:
+            open('config', 'a').close()
+
+    def save_config(self):
+        # Save config file
+        with open('config', 'w') as file:
+            for key in self.config:
+                file.write('{}={}\n'.format(key, self.config[key]))
+
+    def get_path(self):
+        # Return path saved in config file
+        # If there is none or it doesn't exist anymore, set current path as
+        # default path and return it
+        if os.path.isdir(self.config.get('PATH', '')):
+            return self.config['PATH']
+        # Get current path
+        path = os.getcwd()
+        self.set_path(path)
+        return path
+
+    def set_path(self, path):
+        # Update path in config file
+        path = path.replace('\\', '/')  # No backslash in path
+        if os.path.exists(path):
+            self.config['PATH'] = path
+            self.save_config()
+
+
+class GUI:
+    files = []
+    # Replays shown in the list, filtered and sorted, and the position of
+    # the first visible one
+    shown = []
+    offset = 0
+    # Filters for the index (see parse_filter) and words that the name, date,
+    # track or scenario have to contain
+    filter = None
+    terms = []
+    sort_column = 'name'
+    sort_reverse = False
+    selected = None
+    # Columns of the list and the number of rows shown at once
+    # Only these rows exist as widgets, scrolling changes their values
+    columns = (('name', 'Replay', 180), ('timestamp', 'Date', 140),
+               ('track', 'Track', 120), ('scenario', 'Scenario', 160))
+    visible_rows = 20
+    # Number of replay infos kept in memory, number of replays before and
+    # after the visible ones whose info is loaded in the background and the
+    # interval in ms in which loaded infos are taken over
+    cache_size = 2048
+    prefetch_margin = 50
+    poll_interval = 50
+    # Interval in ms in which the directory is checked for changes
+    refresh_interval = 2000
+    # Delay in ms after typing before the filter is applied
+    filter_delay = 150
+
+    def __init__(self):
+        # Directory saved in the config file
+        self.config = Config()
+        self.dir = self.config.get_path()
+
+        # Create window
+        self.root = tk.Tk()
+        self.root.title('CS Replay Editor')
+        self.root.resizable(False, False)
+
+        # Adapt size of rows and columns to window
+        self.root.grid_columnconfigure(0, weight=1)
+        self.root.grid_columnconfigure(1, weight=1)
+        self.root.grid_rowconfigure(0, weight=0)
+        self.root.grid_rowconfigure(1, weight=0)
+        self.root.grid_rowconfigure(2, weight=1)
+
+        # Label and button to display and change the selected directory
+        dir_select = tk.Frame(self.root)
+        self.dir_label = tk.Label(dir_select, text=self.dir)
+        self.dir_label.grid(column=0, row=0, sticky='nesw')
+        dir_button = tk.Button(dir_select, text='Change',
+                               command=self.change_directory)
+        dir_button.grid(column=1, row=0, sticky='nesw')
+        dir_select.grid(column=0, row=0, columnspan=2, sticky='nesw')
+
+        # Entry to filter the replays while typing, see apply_filter
+        filter_select = tk.Frame(self.root)
+        filter_select.grid_columnconfigure(1, weight=1)  # Adapt to window
+        tk.Label(filter_select, text='Filter:').grid(column=0, row=0)
+        self.filter_entry = tk.Entry(filter_select)
+        self.filter_entry.bind('<KeyRelease>', self.schedule_filter)
+        self.filter_entry.bind('<Return>', self.apply_filter)
+        self.filter_entry.grid(column=1, row=0, sticky='nesw')
+        self.filter_label = tk.Label(filter_select)
+        self.filter_label.grid(column=2, row=0, sticky='nesw')
+        filter_select.grid(column=0, row=1, columnspan=2, sticky='nesw')
+        self.filter_job = None
+
+        # List of the replays that can be loaded, sorted by clicking on the
+        # column headings
+        replay_selection = tk.Frame(self.root)
+        replay_selection.grid_columnconfigure(0, weight=1)  # Adapt to window
+        self.replay_list = ttk.Treeview(
+            replay_selection, columns=[column[0] for column in self.columns],
+            show='headings', height=self.visible_rows, selectmode='browse')
+        for column, heading, width in self.columns:
+            self.replay_list.heading(
+                column, text=heading,
+                command=lambda column=column: self.sort_by(column))
+            self.replay_list.column(column, width=width)
+        for row in range(self.visible_rows):
+            self.replay_list.insert('', 'end', iid=str(row))
+        self.replay_list.bind('<<TreeviewSelect>>', self.replay_selected)
+        self.replay_list.bind('<MouseWheel>', self.wheel_scrolled)
+        self.replay_list.bind('<Button-4>', self.wheel_scrolled)
+        self.replay_list.bind('<Button-5>', self.wheel_scrolled)
+        for key, step in (('<Up>', -1), ('<Down>', 1),
+                          ('<Prior>', -self.visible_rows),
+                          ('<Next>', self.visible_rows)):
+            self.replay_list.bind(
+                key, lambda event, step=step: self.move_selection(step))
+        self.replay_list.grid(column=0, row=0, sticky='nesw')
+        self.scroll = tk.Scrollbar(replay_selection, command=self.yview)
+        self.scroll.grid(column=1, row=0, sticky='nesw')
+        replay_selection.grid(column=0, row=2, sticky='nesw')
+
+        # Replay info and edit button
+        rep_info = tk.Frame(self.root)
+        rep_info.grid_columnconfigure(0, weight=1)  # Adapt to window
+        self.info_1 = tk.Label(rep_info)
+        self.info_1.grid(column=0, row=0, sticky='nesw')
+        self.info_2 = tk.Label(rep_info)
+        self.info_2.grid(column=0, row=1, sticky='nesw')
+        self.info_3 = tk.Label(rep_info)
+        self.info_3.grid(column=0, row=2, sticky='nesw')
+        edit = tk.Button(rep_info, text='Edit', command=self.edit_replay)
+        edit.grid(column=0, row=3, sticky='nesw')
+        rep_info.grid(column=1, row=2, sticky='nesw')
+
+        # Replay infos are loaded by a thread pool in the background
+        # Finished loads are put into the results queue by the worker threads
+        # and taken over in process_results, which runs in the Tk thread
+        self.replay_info = LRUCache(self.cache_size)
+        self.pending = {}
+        # Race info of all replays as sort and filter keys, see load_keys
+        self.keys = {}
+        self.search = {}
+        self.ranks = {}
+        self.keys_loaded = False
+        # Replays that are read before the keys are loaded
+        self.waiting = set()
+        self.results = queue.Queue()
+        self.executor = ThreadPoolExecutor(max_workers=4)
+        self.prefetch_job = None
+        self.root.after(self.poll_interval, self.process_results)
+        self.root.after(self.refresh_interval, self.poll_directory)
+
+        # Print the profiling summary on demand (see enable_profiling)
+        if editor.profiler is not None:
+            self.root.bind('<F12>', lambda event: editor.profiler.report())
+
+        # Find replays in current directory
+        self.index = ReplayIndex(self.dir)
+        self.load_replays()
+
+        # Start mainloop for GUI
+        self.root.mainloop()
+        for future in self.pending.values():
+            future.cancel()
+        self.executor.shutdown(wait=False)
+        self.index.close()
+
+    def load_replays(self):
+        # Find loadable replays in current directory and update the filelist
+        # The filelist is kept sorted, so entries can be found with bisect
+        self.tracker = DirectoryTracker(self.dir)
+        self.files = sorted(self.tracker.scan())
+        # Remove entries of removed replays from the index and forget loaded
+        # infos, as replays might have changed. Up to date infos are taken out
+        # of the index again when they are needed
+        self.index.prune(self.files)
+        self.replay_info.clear()
+        self.keys = {}
+        self.search = {}
+        self.ranks = {}
+        self.keys_loaded = False
+        self.waiting = set()
+        self.offset = 0
+        self.update_view()
+
+    def update_view(self):
+        # Show the replays matching the filter in the selected order
+        # Filters and sorting by anything but the name need the race info of
+        # all replays, replays without an up to date entry in the index are
+        # read in the background first
+        if (self.filter or self.terms or self.sort_column != 'name') and \
+                not self.keys_loaded:
+            stale = self.index.stale(self.files)
+            for name in stale:
+                if name not in self.pending:
+                    self.request_info(name)
+            self.waiting = set(stale)
+            if stale:
+                self.filter_label.config(
+                    text='Indexing {} replays...'.format(len(stale)))
+                return
+            self.load_keys()
+        self.show_view()
+
+    def load_keys(self):
+        # Take the race info of all replays out of the index and precompute
+        # the text the filter words are searched in
+        infos = self.index.infos()
+        self.keys = {name: infos.get(name) for name in self.files}
+        self.search = {name: self.search_text(name, info)
+                       for name, info in self.keys.items()}
+        self.ranks = {}
+        self.keys_loaded = True
+
+    def set_key(self, name, info):
+        # Update the keys of a replay whose info has been read
+        if self.keys_loaded:
+            self.keys[name] = info
+            self.search[name] = self.search_text(name, info)
+            self.ranks = {}
+
+    @staticmethod
+    def search_text(name, info):
+        # Return the text the filter words are searched in for a replay
+        if info is None:
+            return name.lower()
+        return '\n'.join(str(value) for value in (name,) + info[:2] +
+                         info[3:4]).lower()
+
+    @staticmethod
+    def sort_key(column, info):
+        # Return the key to sort a replay by column, replays without info are
+        # sorted last
+        if info is None:
+            return 1, ''
+        if column == 'timestamp':
+            return 0, str(info[0])
+        if column == 'track':
+            return 0, str(info[1]).lower()
+        index = info[4] if isinstance(info[4], int) else 0
+        return 0, str(info[3]).lower(), index
+
+    def get_ranks(self, column):
+        # Return the position of each replay if all were sorted by column
+        # It is only computed once after the keys change, so sorting a
+        # filtered list afterwards is a lookup per replay
+        if column not in self.ranks:
+            order = sorted(self.files, key=lambda name: self.sort_key(
+                column, self.keys.get(name)))
+            self.ranks[column] = {name: i for i, name in enumerate(order)}
+        return self.ranks[column]
+
+    def show_view(self):
+        # Filter and sort the filelist with the precomputed keys and show it
+        # The filelist is sorted by name already
+        names = self.files
+        if self.filter:
+            matches = set(self.index.query(self.filter))
+            names = [name for name in names if name in matches]
+        for term in self.terms:
+            search = self.search
+            names = [name for name in names if term in search[name]]
+        if self.sort_column != 'name':
+            names = sorted(names, key=self.get_ranks(self.sort_column).get)
+        if self.sort_reverse:
+            names = names[::-1]
+        self.shown = names
+        if self.filter or self.terms:
+            self.filter_label.config(text='{} of {} replays'.format(
+                len(names), len(self.files)))
+        else:
+            self.filter_label.config(text='')
+        self.scroll_to(self.offset)
+
+    def sort_by(self, column):
+        # Sort the list by column, sorting by the same column again reverses
+        # the order
+        if column == self.sort_column:
+            self.sort_reverse = not self.sort_reverse
+        else:
+            self.sort_column = column
+            self.sort_reverse = False
+        self.offset = 0
+        for name, heading, width in self.columns:
+            if name == column:
+                heading += ' \u25bc' if self.sort_reverse else ' \u25b2'
+            self.replay_list.heading(name, text=heading)
+        self.update_view()
+
+    def schedule_filter(self, event=None):
+        # Apply the filter once typing has paused for a moment
+        if self.filter_job is not None:
+            self.root.after_cancel(self.filter_job)
+        self.filter_job = self.root.after(self.filter_delay,
+                                          self.apply_filter)
+
+    def apply_filter(self, event=None):
+        # Show only the replays matching the filter entered
+        # Words in the form key:value are filters for the index (see
+        # parse_filter), other words have to be part of the name, date, track
+        # or scenario
+        if self.filter_job is not None:
+            self.root.after_cancel(self.filter_job)
+            self.filter_job = None
+        try:
+            words = shlex.split(self.filter_entry.get())
+            filters = parse_filter(word for word in words if ':' in word)
+        except ValueError as e:
+            # Show the error instead of interrupting the typing
+            self.filter_label.config(text=str(e))
+            return
+        terms = [word.lower() for word in words if ':' not in word]
+        if filters == (self.filter or {}) and terms == self.terms:
+            return
+        self.filter = filters or None
+        self.terms = terms
+        self.offset = 0
+        self.update_view()
+
+    def refresh_replays(self):
+        # Update the filelist with the changes in the directory since it has
+        # been listed, the list shown is filtered and sorted again
+        try:
+            added, removed, renamed = self.tracker.poll()
+        except OSError:
+            return  # Directory not available at the moment
+        for old, new in renamed:
+            self.index.rename(old, new)
+            info = self.replay_info.pop(old)
+            if info is not None:
+                self.replay_info[new] = info
+        removed.update(old for old, new in renamed)
+        added.update(new for old, new in renamed)
+        self.index.remove(removed)
+        for name in removed:
+            i = bisect.bisect_left(self.files, name)
+            del self.files[i]
+            self.replay_info.pop(name)
+            self.keys.pop(name, None)
+            self.search.pop(name, None)
+        for name in sorted(added):
+            i = bisect.bisect_left(self.files, name)
+            self.files.insert(i, name)
+        self.ranks = {}
+        if added:
+            # The new replays have to be indexed first
+            self.keys_loaded = False
+
+        # Keep renamed replays selected
+        for old, new in renamed:
+            if old == self.selected:
+                self.selected = new
+        if self.selected in removed:
+            self.selected = None
+            self.show_info(())
+        if added or removed:
+            self.update_view()
+
+    def poll_directory(self):
+        # Check the directory for changes regularly
+        self.refresh_replays()
+        self.root.after(self.refresh_interval, self.poll_directory)
+
+    def scroll_to(self, offset):
+        # Show the replays from position offset on in the rows of the list
+        # and update the scrollbar
+        count = len(self.shown)
+        self.offset = max(0, min(offset, count - self.visible_rows))
+        if count:
+            self.scroll.set(self.offset / count,
+                            (self.offset + self.visible_rows) / count)
+        else:
+            self.scroll.set(0, 1)
+        self.render()
+        self.schedule_prefetch()
+
+    def yview(self, *args):
+        # Scroll the list, called by the scrollbar
+        if args[0] == 'moveto':
+            self.scroll_to(int(float(args[1]) * len(self.shown)))
+        elif args[0] == 'scroll':
+            step = int(args[1])
+            if args[2] == 'pages':
+                step *= self.visible_rows
+            self.scroll_to(self.offset + step)
+
+    def wheel_scrolled(self, event):
+        # Scroll the list with the mouse wheel
+        if event.num == 4 or event.delta > 0:
+            self.scroll_to(self.offset - 3)
+        else:
+            self.scroll_to(self.offset + 3)
+        return 'break'
+
+    def move_selection(self, step):
+        # Select the replay step rows above or below the selected one and
+        # scroll it into view
+        if not self.shown:
+            return 'break'
+        try:
+            i = self.shown.index(self.selected) + step
+        except ValueError:
+            i = self.offset
+        i = max(0, min(i, len(self.shown) - 1))
+        if i < self.offset:
+            self.scroll_to(i)
+        elif i >= self.offset + self.visible_rows:
+            self.scroll_to(i - self.visible_rows + 1)
+        self.select(self.shown[i])
+        return 'break'
+
+    def render(self):
+        # Fill the rows of the list with the visible replays
+        selected = None
+        for row in range(self.visible_rows):
+            i = self.offset + row
+            if i < len(self.shown):
+                name = self.shown[i]
+                info = self.replay_info.get(name, self.keys.get(name))
+                if info:
+                    values = (name, info[0], info[1],
+                              '{} (#{})'.format(info[3], info[4]))
+                else:
+                    values = (name, '', '', '')
+                if name == self.selected:
+                    selected = str(row)
+            else:
+                values = ('', '', '', '')
+            self.replay_list.item(str(row), values=values)
+        if selected is not None:
+            self.replay_list.selection_set(selected)
+        elif self.replay_list.selection():
+            self.replay_list.selection_remove(self.replay_list.selection())
+
+    def schedule_prefetch(self):
+        # Prefetch once scrolling has paused for a moment
+        if self.prefetch_job is not None:
+            self.root.after_cancel(self.prefetch_job)
+        self.prefetch_job = self.root.after(100, self.prefetch)
+
+    def prefetch(self):
+        # Load the infos of the visible replays and the replays around them
+        self.prefetch_job = None
+        if not self.shown:
+            return
+        start = max(0, self.offset - self.prefetch_margin)
+        end = min(len(self.shown),
+                  self.offset + self.visible_rows + self.prefetch_margin)
+        missing = [name for name in self.shown[start:end]
+                   if name not in self.replay_info and
+                   name not in self.pending]
+        # Take what is up to date out of the index, read the rest
+        for name, info in self.index.lookup(missing).items():
+            self.replay_info[name] = info
+        for name in missing:
+            if name not in self.replay_info:
+                self.request_info(name)
+        self.render()
+
+    def request_info(self, name):
+        # Read the info of a replay in the thread pool
+        directory = self.dir
+        future = self.executor.submit(read_index_entry, directory, name)
+        self.pending[name] = future
+        # The callback runs in the worker thread, so it must not touch Tk
+        future.add_done_callback(
+            lambda future: self.results.put((directory, name, future)))
+
+    def process_results(self):
+        # Take over the infos loaded in the background
+        # Runs in the Tk thread and reschedules itself, even if taking over
+        # the infos fails
+        try:
+            self.take_results()
+        finally:
+            self.root.after(self.poll_interval, self.process_results)
+
+    def take_results(self):
+        # Take over the infos of all finished loads
+        changed = False
+        while True:
+            try:
+                directory, name, future = self.results.get_nowait()
+            except queue.Empty:
+                break
+            if directory != self.dir or future.cancelled():
+                continue  # Directory has been changed since
+            self.pending.pop(name, None)
+            changed = True
+            try:
+                entry = future.result()
+            except Exception:
+                entry = None
+            if entry is None:
+                info = None
+            else:
+                stat, info, configs = entry
+                self.store_index(name, stat, info, configs)
+                self.replay_info[name] = info
+                self.set_key(name, info)
+            if name == self.selected:
+                self.show_info(info)
+            if name in self.waiting:
+                self.waiting.discard(name)
+                if not self.waiting:
+                    self.commit_index()
+                    self.update_view()
+        if changed:
+            self.commit_index()
+            self.render()
+
+    def store_index(self, name, stat, info, configs):
+        # Store the info of a replay in the index
+        # The index is only a cache, so if it can't be written (e.g. the disk
+        # is full or it's locked) the info is still shown and just loaded
+        # again next time
+        try:
+            self.index.store(name, stat, info, configs)
+        except sqlite3.Error:
+            pass
+
+    def commit_index(self):
+        # Commit the infos stored in the index, see store_index
+        try:
+            self.index.commit()
+        except sqlite3.Error:
+            pass
+
+    def change_directory(self):
+        # Prompt user to change directory. Updates files if changed
+        # Dialog will return '' if no directory has been selected, or the
+        # selected directory otherwise
+        new_dir = filedialog.askdirectory()
+        if new_dir:
+            if new_dir != self.dir:
+                self.dir = new_dir
+                self.dir_label.config(text=self.dir)
+                self.index.close()
+                self.index = ReplayIndex(self.dir)
+                self.pending = {}
+                self.load_replays()
+
+                # Update config file
+                self.config.set_path(self.dir)
+
+                # Remove any replay infos displayed from before
+                self.selected = None
+                self.show_info(())
+
+    def replay_selected(self, event):
+        # If a replay is selected display replay info
+        selection = self.replay_list.selection()
+        if not selection:
+            return
+        i = self.offset + int(selection[0])
+        if i < len(self.shown):
+            self.select(self.shown[i])
+
+    def select(self, name):
+        # Select a replay and display its info
+        # Only if a new replay is selected
+        if self.selected != name:
+            self.selected = name
+            self.display_replay(name)
+            self.render()
+
+    def display_replay(self, name):
+        # Display the info of a replay, it is loaded first if necessary
+        if name not in self.replay_info:
+            # Take info out of the index if it is up to date there
+            info = self.index.lookup([name]).get(name)
+            if info is not None:
+                self.replay_info[name] = info
+        if name in self.replay_info:
+            self.show_info(self.replay_info[name])
+        else:
+            # Load info in the background, it is displayed when loaded
+            self.info_1.config(text='Loading...')
+            self.info_2.config(text='')
+            self.info_3.config(text='')
+            if name not in self.pending:
+                self.request_info(name)
+
+    def show_info(self, info):
+        # Display replay info on screen, an empty info clears it and None
+        # shows that the replay couldn't be read
+        if info is None:
+            self.info_1.config(text='Replay could not be read')
+            self.info_2.config(text='')
+            self.info_3.config(text='')
+            return
+        if not info:
+            self.info_1.config(text='')
+            self.info_2.config(text='')
+            self.info_3.config(text='')
+            return
+        self.info_1.config(text='{} (#{})'.format(info[3], info[4]))
+        self.info_2.config(text='{} ({})'.format(info[1], info[2]))
+        self.info_3.config(text=info[0])
+
+    def edit_replay(self):
+        # Load the selected replay in the background and open the edit window
+        # for it once it has been loaded
+        if self.selected:
+            filename = os.path.join(self.dir, self.selected)
+            try:
+                total = load_size(filename)
+            except (OSError, ValueError) as e:
+                messagebox.showerror('Error', str(e))
+                return
+            ProgressWindow(self.root, 'Loading replay', total, Replay,
+                           (filename,),
+                           lambda replay: self.open_editor(filename, replay))
+
+    def open_editor(self, filename, replay):
+        # Open the edit window for the loaded replay
+        edit = EditGUI(filename, replay)
+        # Hide main window until the edit window is closed
+        self.root.withdraw()
+        edit.window.wait_window()
+        self.root.deiconify()
+        # Replays might have been added or changed. Added, removed and
+        # renamed replays are taken over by refresh_replays, replays that
+        # have been overwritten are read again
+        self.refresh_replays()
+        for location in edit.saved_locations:
+            directory, name = os.path.split(location)
+            if (os.path.normcase(os.path.abspath(directory)) ==
+                    os.path.normcase(os.path.abspath(self.dir)) and
+                    name in self.tracker.replays):
+                self.replay_info.pop(name)
+                self.request_info(name)
+        self.update_view()
+        if self.selected:
+            self.display_replay(self.selected)
+
+
+class ProgressWindow:
+    # Runs function(*args) in a worker thread while showing a progress bar
+    # for the bytes it processes (see ProgressTracker) and a cancel button
+    # The window stays responsive, the result is passed to on_done in the Tk
+    # thread through after. Errors are shown in a message box, nothing is
+    # called if the work has been cancelled
+    poll_interval = 50
+
+    def __init__(self, parent, title, total, function, args, on_done):
+        self.parent = parent
+        self.on_done = on_done
+        self.tracker = ProgressTracker(total)
+        self.result = None
+        self.error = None
+        self.finished = False
+        # Restore the grab of the parent window afterwards
+        self.previous_grab = parent.grab_current()
+
+        self.window = tk.Toplevel(parent)
+        self.window.title(title)
+        self.window.resizable(False, False)
+        self.window.transient(parent)
+        self.window.protocol('WM_DELETE_WINDOW', self.cancel)
+        self.label = tk.Label(self.window, text='{}...'.format(title))
+        self.label.grid(column=0, row=0, sticky='nesw')
+        self.bar = ttk.Progressbar(self.window, length=300, maximum=1000,
+                                   mode='determinate')
+        self.bar.grid(column=0, row=1, sticky='nesw')
+        self.cancel_button = tk.Button(self.window, text='Cancel',
+                                       command=self.cancel)
+        self.cancel_button.grid(column=0, row=2, sticky='nesw')
+        self.window.grab_set()
+
+        thread = threading.Thread(target=self.run, args=(function, args),
+                                  daemon=True)
+        thread.start()
+        self.window.after(self.poll_interval, self.poll)
+
+    def run(self, function, args):
+        # Runs in the worker thread, which never touches Tk
+        try:
+            self.result = self.tracker.run(function, *args)
+        except BaseException as e:
+            self.error = e
+        self.finished = True
+
+    def poll(self):
+        # Update the progress bar until the work is finished
+        if not self.finished:
+            self.bar['value'] = self.tracker.fraction() * 1000
+            self.window.after(self.poll_interval, self.poll)
+            return
+        self.window.grab_release()
+        self.window.destroy()
+        if self.previous_grab is not None:
+            self.previous_grab.grab_set()
+        if isinstance(self.error, Cancelled):
+            return
+        if self.error is not None:
+            messagebox.showerror('Error', str(self.error), parent=self.parent)
+            return
+        self.on_done(self.result)
+
+    def cancel(self):
+        # Ask the worker thread to stop, the window closes once it did
+        self.tracker.cancel()
+        self.cancel_button.config(state='disabled')
+        self.label.config(text='Cancelling...')
+
+
+class EditGUI:
+    changed = False
+    name_labels = {}
+    driver_buttons = {}
+    car_buttons = {}
+
+    def __init__(self, filename, replay=None):
+        self.filename = filename
+        # Paths (without extension) the replay has been saved to
+        self.saved_locations = []
+
+        # Load replay file, unless it has already been loaded
+        self.replay = replay if replay is not None else Replay(filename)
+        self.drivers = self.replay.get_drivers()
+
+        # Create popup window
+        self.window = tk.Toplevel()
+        self.window.title('Edit Replay')
+        self.window.protocol('WM_DELETE_WINDOW', self.close_window)
+        self.window.grab_set()
+        self.window.grid_columnconfigure(0, weight=1)
+        self.window.grid_columnconfigure(1, weight=1)
+        self.window.grid_columnconfigure(2, weight=1)
+        self.window.grid_columnconfigure(3, weight=1)
+
+        # Replay info as headline
+        info = self.replay.get_race_info()
+        headline = tk.Label(
+            self.window, text='{} (#{}) - {} ({}) - {}'.format(
+                info[3], info[4], info[1], info[2], info[0]))
+        headline.grid(column=0, row=0, columnspan=4, sticky='nesw')
+
+        # Create list of drivers with edit buttons
+        # Headline for each column
+        tk.Label(self.window, text='Name').grid(column=0, row=1, sticky='nesw')
+        tk.Label(self.window, text='Driver').grid(column=1, row=1, sticky='nesw')
+        tk.Label(self.window, text='Car').grid(column=2, row=1, sticky='nesw')
+        tk.Label(self.window, text='Grid').grid(column=3, row=1, sticky='nesw')
+        # Individual rows per driver
+        i = 2
+        for driver in self.drivers:
+            id = driver[0]
+            name = tk.Label(self.window, text=driver[1])
+            name.grid(column=0, row=i, sticky='nesw')
+            self.name_labels[id] = name
+            d_edit = tk.Button(self.window, text='Edit',
+                               command=lambda id=id: self.edit_driver(id))
+            d_edit.grid(column=1, row=i, sticky='nesw')
+            self.driver_buttons[id] = d_edit
+            c_edit = tk.Button(self.window, text='Edit',
+                               command=lambda id=id: self.edit_car(id))
+            c_edit.grid(column=2, row=i, sticky='nesw')
+            self.car_buttons[id] = c_edit
+            grid = tk.Label(self.window, text=driver[2])
+            grid.grid(column=3, row=i, sticky='nesw')
+            i += 1
+
+        # Create undo and redo buttons for the changes of the edit windows
+        self.undo_button = tk.Button(self.window, text='Undo',
+                                     command=self.undo)
+        self.undo_button.grid(column=0, row=i, columnspan=2, sticky='nesw')
+        self.redo_button = tk.Button(self.window, text='Redo',
+                                     command=self.redo)
+        self.redo_button.grid(column=2, row=i, columnspan=2, sticky='nesw')
+        self.window.bind('<Control-z>', self.undo)
+        self.window.bind('<Control-y>', self.redo)
+        self.window.bind('<Control-Z>', self.redo)  # Ctrl+Shift+Z
+        self.update_history()
+        i += 1
+
+        # Create save button
+        save_button = tk.Button(self.window, text='Save changes', bg='#ACACAC',
+                                command=self.save_changes)
+        save_button.grid(column=0, row=i, columnspan=4, sticky='nesw')
+
+        # Set changed flag to False
+        self.changed = False
+
+    def update_names(self):
+        # In case a name has been changed, update all entries in the list
+        new_drivers = self.replay.get_drivers()
+        if new_drivers != self.drivers:
+            self.drivers = new_drivers
+            for d in self.drivers:
+                id = d[0]
+                name = d[1]
+                self.name_labels[id].config(text=name)
+
+    def edit_driver(self, id):
+        # Open an edit window for the selected driver
+        edit = EditDriverGUI(self, self.replay, id)
+        edit.window.wait_window()
+        self.update_names()
+        self.update_history()
+
+    def edit_car(self, id):
+        # Open an edit window for the selected car
+        edit = EditCarGUI(self, self.replay, id)
+        edit.window.wait_window()
+        self.update_names()
+        self.update_history()
+
+    def undo(self, event=None):
+        # Revert the last change made in an edit window
+        if self.replay.undo():
+            self.changed = True
+        self.update_names()
+        self.update_history()
+
+    def redo(self, event=None):
+        # Make the last reverted change again
+        if self.replay.redo():
+            self.changed = True
+        self.update_names()
+        self.update_history()
+
+    def update_history(self):
+        # Only enable the undo and redo buttons if there is something to undo
+        # or redo
+        self.undo_button.config(
+            state='normal' if self.replay.undo_stack else 'disabled')
+        self.redo_button.config(
+            state='normal' if self.replay.redo_stack else 'disabled')
+
+    def save_changes(self, on_saved=None):
+        # Prompt user to select filename for changed replay (and header)
+        # Dialog will return '' if no filename has been selected, or the
+        # selected filename otherwise
+        # The replay is saved in the background, on_saved is called once
+        # it has been saved
+        # Archives and overlays are saved with their extension
+        curr_path, curr_file = os.path.split(self.filename)
+        if not is_archive(curr_file) and not is_overlay(curr_file):
+            curr_file = '{}.replay'.format(curr_file)
+        save_location = filedialog.asksaveasfilename(
+            defaultextension='.replay',
+            filetypes=(('Replay and header files', '*.replay;*.header'),
+                       ('Replay archive', '*' + ARCHIVE_EXTENSION),
+                       ('Edit overlay (changes only)',
+                        '*' + OVERLAY_EXTENSION),
+                       ('All Files', '*.*')),
+            initialdir=curr_path,
+            initialfile=curr_file)
+        if save_location:
+            if (save_location.endswith('.replay') or
+                    save_location.endswith('.header')):
+                # Remove extension (not needed in Replay class)
+                save_location = save_location[:-7]
+            # Save the replay and header file with the specified filename
+            ProgressWindow(self.window, 'Saving replay',
+                           save_size(self.replay, save_location),
+                           self.replay.save, (save_location,),
+                           lambda result: self.saved(on_saved, save_location))
+        else:
+            self.saved(on_saved)
+
+    def saved(self, on_saved=None, location=None):
+        # Called once the replay has been saved (to location, if it has been
+        # saved at all)
+        self.changed = False
+        if location is not None:
+            self.saved_locations.append(location)
+        if on_saved is not None:
+            on_saved()
+
+    def set_changed(self, event=None):
+        # Set changed flag to True
+        self.changed = True
+
+    def close_window(self):
+        # Check if there have been changes
+        # If so, ask if they should be saved
+        if self.changed:
+            save = messagebox.askyesnocancel(
+                'Save changes?', 'Do you want to save your changes?')
+            if save is None:  # Cancel selected
+                return
+            elif save:  # Yes selected
+                # Closed once the replay has been saved
+                self.save_changes(self.window.destroy)
+                return
+            else:  # No selected
+                pass
+        self.window.destroy()
+
+
+class EditDriverGUI:
+    # Track if there have been changes
+    changed = False
+    saved_name = None
+    saved_color_suit = None
+    saved_color_helmet = None
+
+    def __init__(self, parent, replay, id):
+        self.parent = parent
+        self.replay = replay
+        self.id = id
+
+        # Suits and helmets with their designs
+        self.suits = get_catalog('suit')
+        self.helmets = get_catalog('helmet')
+
+        # Load curent data out of the replay file
+        self.driver_info = self.replay.get_driver_info(id)
+        racername = self.driver_info['racerName']
+
+        # Create popup window
+        self.window = tk.Toplevel()
+        self.window.title('Edit Driver')
+        self.window.protocol('WM_DELETE_WINDOW', self.close_window)
+        self.window.grab_set()
+        self.window.grid_columnconfigure(0, weight=1)
+        self.window.grid_columnconfigure(1, weight=1)
+        self.window.grid_columnconfigure(2, weight=1)
+        self.window.grid_columnconfigure(3, weight=1)
+
+        # racerName as headline
+        self.headline = tk.Label(self.window,
+                                 text='Edit {}'.format(racername))
+        self.headline.grid(column=0, row=0, columnspan=4, sticky='nesw')
+
+        # Edit racerName
+        text_name = tk.Label(self.window, text='Name')
+        text_name.grid(column=0, row=1, sticky='nesw')
+        self.name_field = tk.Entry(self.window)
+        self.name_field.insert(0, racername)
+        self.name_field.grid(column=1, row=1, columnspan=2, sticky='nesw')
+
+        # Edit driverSkin and driverSkinLivery
+        # All designs are available for all bodys => set dropdown values
+        text_skin = tk.Label(self.window, text='Skin')
+        text_skin.grid(column=0, row=2, sticky='nesw')
+        self.body_dd = ttk.Combobox(self.window, values=self.suits.names,
+                                    state='readonly', exportselection=False)
+        self.body_dd.grid(column=1, row=2, sticky='nesw')
+        self.body_dd.bind('<<ComboboxSelected>>', self.body_selected)
+        self.suit_design_dd = ttk.Combobox(self.window, values=[],
+                                           state='readonly',)
+        self.suit_design_dd.grid(column=2, row=2, sticky='nesw')
+        self.suit_design_dd.bind('<<ComboboxSelected>>', self.set_changed)
+        self.suit_color = ColorPalette(self.window, 3)
+        self.suit_color.grid(column=3, row=2, sticky='nesw')
+
+        # Edit helmet and helmetLivery
+        # Each helmet has its own set of designs that have to be loaded into
+        # the second dropdown menu
+        text_helmet = tk.Label(self.window, text='Helmet')
+        text_helmet.grid(column=0, row=3, sticky='nesw')
+        self.helmet_dd = ttk.Combobox(self.window, values=self.helmets.names,
+                                      state='readonly', exportselection=False)
+        self.helmet_dd.grid(column=1, row=3, sticky='nesw')
+        self.helmet_dd.bind('<<ComboboxSelected>>', self.helmet_selected)
+        self.helmet_design_dd = ttk.Combobox(self.window, values=[],
+                                             state='readonly')
+        self.helmet_design_dd.grid(column=2, row=3, sticky='nesw')
+        self.helmet_design_dd.bind('<<ComboboxSelected>>', self.set_changed)
+        self.helmet_color = ColorPalette(self.window, 5)
+        self.helmet_color.grid(column=3, row=3, sticky='nesw')
+
+        # Save changes button
+        self.save_button = tk.Button(self.window, text='Save changes',
+                                     bg='#ACACAC', command=self.save)
+        self.save_button.grid(column=0, row=4, columnspan=4, sticky='nesw')
+
+        # Set the selected values to the current values out of the replay file
+        self.load_current_values(self.driver_info)
+
+        # Set changed flag to False and remember name value
+        self.saved_name = racername
+        self.saved_color_suit = self.suit_color.get_colors()
+        self.saved_color_helmet = self.helmet_color.get_colors()
+        self.changed = False
+
+    def load_current_values(self, driver_info):
+        # Track if there have been changes
+        changed = False
+
+        # Set the values currently set in the replay file (if possible)
+        driverskinlivery = driver_info['driverSkinLivery'][0]
+        helmetlivery = driver_info['helmetLivery'][0]
+        if driverskinlivery in self.suits.inverse:
+            body_curr, body_design_curr = self.suits.inverse[
+                driverskinlivery]
+        else:
+            body_curr, body_design_curr = None, None
+        if helmetlivery in self.helmets.inverse:
+            helmet_curr, helmet_design_curr = self.helmets.inverse[
+                helmetlivery]
+        else:
+            helmet_curr, helmet_design_curr = None, None
+
+        # Suit body and design
+        # Set selected body first, then update values from design
+        if body_curr in self.suits.names:
+            self.body_dd.current(self.suits.names.index(body_curr))
+            self.body_selected()  # Load values for second dropdown box
+            if body_design_curr in self.suits.designs[body_curr]:
+                self.suit_design_dd.current(
+                    self.suits.designs[body_curr].index(body_design_curr))
+            else:
+                self.suit_design_dd.current(0)
+        else:
+            self.body_dd.current(0)
+            self.suit_design_dd.current(0)
+        suit_colors = driver_info['driverSkinLivery'][1]
+        self.suit_color.set_colors(suit_colors)
+
+        # Helmet and design
+        # Set selected helmet first, then update values for design
+        if helmet_curr in self.helmets.names:
+            self.helmet_dd.current(self.helmets.names.index(helmet_curr))
+            self.helmet_selected()  # Load values for second dropdown box
+            if helmet_design_curr in self.helmets.designs[helmet_curr]:
+                self.helmet_design_dd.current(
+                    self.helmets.designs[helmet_curr].index(helmet_design_curr))
+            else:
+                self.helmet_design_dd.current(0)
+        else:
+            self.helmet_dd.current(0)
+            self.helmet_design_dd.current(0)
+        helmet_colors = driver_info['helmetLivery']
+        helmet_colors = [helmet_colors[1], helmet_colors[2], helmet_colors[3],
+                         helmet_colors[4], helmet_colors[5]]
+        self.helmet_color.set_colors(helmet_colors)
+
+    def body_selected(self, event=None):
+        # Executed when the body dropdown box is selected
+        # Load the correct values in the second dropdown box
+        body = self.body_dd.get()
+        self.suit_design_dd.config(values=self.suits.designs[body])
+        self.suit_design_dd.current(0)
+        self.set_changed()
+
+    def helmet_selected(self, event=None):
+        # Executed when the helmet dropdown box is selected
+        # Load the correct values in the second dropdown box
+        helmet = self.helmet_dd.get()
+        self.helmet_design_dd.config(values=self.helmets.designs[helmet])
+        self.helmet_design_dd.current(0)
+        self.set_changed()
+
+    def save(self):
+        def restore_elements():
+            # Restore style of changed elements after (un)successful saving
+            self.save_button.config(bg='#ACACAC', text='Save changes')
+            self.name_field.config(bg='#FFFFFF')
+
+        driver_info = self.driver_info
+        # Get values from GUI elements
+        name = self.name_field.get()
+        suit = self.body_dd.get()
+        suit_design = self.suit_design_dd.get()
+        suit_colors = self.suit_color.get_colors()
+        helmet = self.helmet_dd.get()
+        helmet_design = self.helmet_design_dd.get()
+        helmet_colors = self.helmet_color.get_colors()
+        # Get values for replay file
+        # Add colors to liveries, like in replay file
+        driverskinlivery = [self.suits.liveries[suit][suit_design],
+                            suit_colors]
+        driverskin = self.suits.values[suit]
+        helmetlivery = [self.helmets.liveries[helmet][helmet_design],
+                        helmet_colors[0], helmet_colors[1], helmet_colors[2],
+                        helmet_colors[3], helmet_colors[4]]
+        helmet = self.helmets.values[helmet]
+
+        # Check if values are valid
+        # Name has to be in ascii
+        if not all(ord(c) < 128 for c in name):
+            # Change color of button and text field to red
+            self.save_button.config(bg='#FF0000', text='Invalid input')
+            self.name_field.config(bg='#FF0000')
+            self.window.after(2000, restore_elements)
+            return False
+
+        # Change values in driver info to selected values in the GUI
+        driver_info['racerName'] = name
+        driver_info['driverSkin'] = driverskin
+        driver_info['driverSkinLivery'] = driverskinlivery
+        driver_info['helmet'] = helmet
+        driver_info['helmetLivery'] = helmetlivery
+
+        # Update values in replay, set changed flag to False and remember values
+        self.replay.change_driver_info(self.id, driver_info)
+        self.changed = False
+        self.saved_name = name
+        self.saved_color_suit = self.suit_color.get_colors()
+        self.saved_color_helmet = self.helmet_color.get_colors()
+        self.parent.set_changed()
+
+        # Change color and text of button
+        self.save_button.config(bg='#00FF00', text='Changes saved')
+        self.window.after(2000, restore_elements)
+
+        return True
+
+    def set_changed(self, event=None):
+        # Set changed flag to True
+        self.changed = True
+
+    def close_window(self):
+        # Check if there have been changes
+        # If so, ask if they should be saved
+        if (self.changed or self.saved_name != self.name_field.get() or
+                self.saved_color_suit != self.suit_color.get_colors() or
+                self.saved_color_helmet != self.helmet_color.get_colors()):
+            save = messagebox.askyesnocancel(
+                'Save changes?', 'Do you want to save your changes?')
+            if save is None:  # Cancel selected
+                return
+            elif save:  # Yes selected
+                saved = self.save()
+                # Don't destroy the window if there has been illegal input
+                if not saved:
+                    return
+            else:  # No selected
+                pass
+        self.window.destroy()
+
+
+class EditCarGUI:
+    # Track if there have been changes
+    changed = False
+    saved_number = None
+    saved_car_color = None
+
+    def __init__(self, parent, replay, id):
+        self.parent = parent
+        self.replay = replay
+        self.id = id
+
+        # Cars with their designs
+        self.cars = get_catalog('car')
+
+        # Load current data out of the replay file
+        self.car_info = self.replay.get_car_info(id)
+        racername = self.car_info['racerName']
+
+        # Create popup window
+        self.window = tk.Toplevel()
+        self.window.title('Edit Car')
+        self.window.protocol('WM_DELETE_WINDOW', self.close_window)
+        self.window.grab_set()
+        self.window.grid_columnconfigure(0, weight=1)
+        self.window.grid_columnconfigure(1, weight=1)
+        self.window.grid_columnconfigure(2, weight=1)
+        self.window.grid_columnconfigure(3, weight=1)
+
+        # racerName as headline
+        self.headline = tk.Label(self.window,
+                                 text='Edit {}'.format(racername))
+        self.headline.grid(column=0, row=0, columnspan=4, sticky='nesw')
+
+        # Edit vehicle and vehicleLivery
+        # Each car has its own set of designs that have to be loaded into
+        # the second dropdown menu
+        text_car = tk.Label(self.window, text='Car')
+        text_car.grid(column=0, row=1, sticky='nesw')
+        self.car_dd = ttk.Combobox(self.window, values=self.cars.names,
+                                   state='readonly', exportselection=False)
+        self.car_dd.grid(column=1, row=1, sticky='nesw')
+        self.car_dd.bind('<<ComboboxSelected>>', self.car_selected)
+        self.car_design_dd = ttk.Combobox(self.window, values=[],
+                                          state='readonly',)
+        self.car_design_dd.grid(column=2, row=1, sticky='nesw')
+        self.car_design_dd.bind('<<ComboboxSelected>>', self.set_changed)
+        self.car_color = ColorPalette(self.window, 4)
+        self.car_color.grid(column=3, row=1, sticky='nesw')
+
+        # Edit car number
+        number = self.car_info['vehicleLivery'][2]
+        text_number = tk.Label(self.window, text='Number')
+        text_number.grid(column=0, row=2, sticky='nesw')
+        self.number_field = tk.Entry(self.window)
+        self.number_field.insert(0, number)
+        self.number_field.grid(column=1, row=2, sticky='nesw')
+
+        # Save changes button
+        self.save_button = tk.Button(self.window, text='Save changes',
+                                     bg='#ACACAC', command=self.save)
+        self.save_button.grid(column=0, row=3, columnspan=4, sticky='nesw')
+
+        # Set the selected values to the current values out of the replay file
+        self.load_current_values(self.car_info)
+
+        # Set changed flag to False and remember number and color values
+        self.saved_number = number
+        self.saved_car_color = self.car_color.get_colors()
+        self.changed = False
+
+    def load_current_values(self, car_info):
+        # Set the values currently set in the replay file (if possible)
+        vehiclelivery = car_info['vehicleLivery'][0]
+        if vehiclelivery in self.cars.inverse:
+            vehicle_curr, design_curr = self.cars.inverse[vehiclelivery]
+        else:
+            vehicle_curr, design_curr = None, None
+
+        # Car and design
+        if vehicle_curr in self.cars.names:
+            self.car_dd.current(self.cars.names.index(vehicle_curr))
+            self.car_selected()  # Load values for second dropdown box
+            if design_curr in self.cars.designs[vehicle_curr]:
+                self.car_design_dd.current(
+                    self.cars.designs[vehicle_curr].index(design_curr))
+            else:
+                self.car_design_dd.current(0)
+        else:
+            self.car_dd.current(0)
+            self.car_design_dd.current(0)
+
+        car_colors = car_info['vehicleLivery'][1]
+        self.car_color.set_colors(car_colors)
+
+    def car_selected(self, event=None):
+        # Executed when the car dropdown box is selected
+        # Load the correct values in the second dropdown box
+        car = self.car_dd.get()
+        self.car_design_dd.config(values=self.cars.designs[car])
+        self.car_design_dd.current(0)
+
+    def save(self):
+        def restore_elements():
+            # Restore style of changed elements after (un)successful saving
+            self.save_button.config(bg='#ACACAC', text='Save changes')
+            self.number_field.config(bg='#FFFFFF')
+
+        car_info = self.car_info
+        # Get values from GUI elements
+        car = self.car_dd.get()
+        design = self.car_design_dd.get()
+        car_colors = self.car_color.get_colors()
+        number = self.number_field.get()
+
+        # Check if values are valid
+        # Number has to be between 0 and 99
+        if not number.isdecimal() or not 0 <= int(number) <= 99:
+            # Change color of button and text field to red
+            self.save_button.config(bg='#FF0000', text='Invalid input')
+            self.number_field.config(bg='#FF0000')
+            self.window.after(2000, restore_elements)
+            return False
+        number = int(number)
+
+        # Get values for replay file
+        # Add colors to liveries, like in replay file
+        vehiclelivery = [self.cars.liveries[car][design], car_colors,
+                         number]
+        vehicle = self.cars.values[car]
+
+        # Change values in driver info to selected values in the GUI
+        car_info['vehicle'] = vehicle
+        car_info['vehicleLivery'] = vehiclelivery
+
+        # Update values in replay, set changed flag to False and remember values
+        self.replay.change_car_info(self.id, car_info)
+        self.changed = False
+        self.saved_number = number
+        self.saved_car_color = car_colors
+        self.parent.set_changed()
+
+        # Change color and text of button
+        self.save_button.config(bg='#00FF00', text='Changes saved')
+        self.window.after(2000, restore_elements)
+
+        return True
+
+    def set_changed(self, event=None):
+        # Set changed flag to True
+        self.changed = True
+
+    def close_window(self):
+        # Check if there have been changes
+        # If so, ask if they should be saved
+        if (self.changed or str(self.saved_number) != self.number_field.get() or
+                self.saved_car_color != self.car_color.get_colors()):
+            save = messagebox.askyesnocancel(
+                'Save changes?', 'Do you want to save your changes?')
+            if save is None:  # Cancel selected
+                return
+            elif save:  # Yes selected
+                saved = self.save()
+                # Don't destroy the window if there has been illegal input
+                if not saved:
+                    return
+            else:  # No selected
+                pass
+        self.window.destroy()
+
+
+class ColorPalette(tk.Frame):
+    # Frame containing a specified amount of buttons with color choosers
+    def __init__(self, parent, colors=1):
+        tk.Frame.__init__(self, parent)
+        self.colors = []
+
+        # Always have at least one color, also if input is invalid
+        if not isinstance(colors, int) or colors < 1:
+            colors = 1
+
+        # Add the color buttons
+        for i in range(colors):
+            self.grid_columnconfigure(i, weight=1)
+            button = tk.Button(self, bg='#FFFFFF', text='   ',
+                               command=lambda x=i: self.choose_color(x))
+            button.grid(column=i, row=0, sticky='nesw')
+            self.colors.append(button)
+
+    def choose_color(self, index):
+        # Open a color chooser window and change the color of the button
+        color = colorchooser.askcolor(parent=self)[1]
+        self.colors[index].config(bg=color)
+
+    def set_colors(self, colors):
+        # Set the colors of the buttons to the colors of the given list
+        # Only if the right amount of colors is given
+        num_buttons = len(self.colors)
+        if isinstance(self.colors, list) and num_buttons == len(colors):
+            for i in range(len(self.colors)):
+                if colors[i].startswith('#'):
+                    self.colors[i].config(bg=colors[i])
+                else:
+                    self.colors[i].config(bg='#{}'.format(colors[i]))
+
+    def get_colors(self):
+        # Return a list of the colors selected
+        colors = []
+        for button in self.colors:
+            colors.append(button.cget('bg')[1:])
+        return colors
+
+
+def profile_gui(profiler):
+    # Wrap the slow parts of the windows in timing spans of the profiler (see
+    # CS_Replay_Editor.enable_profiling)
+    profiler.wrap(GUI, 'load_replays')
+    profiler.wrap(GUI, 'replay_selected')
+    profiler.wrap(EditGUI, '__init__')
@@ -0,0 +1,488 @@
+import argparse
+import filecmp
+import importlib
+import json
+import multiprocessing
+import os
+import platform
+import random
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import CS_Replay_Editor as editor
+
+
+# Ways of loading a .replay file that can be compared
+LOAD_MODES = {
+    'full': lambda filename: editor.ReplayFile(filename),
+    'config': lambda filename: editor.ReplayFile(filename, config_only=True),
+    'mapped': lambda filename: editor.MappedReplayFile(filename),
+    'columnar': lambda filename: editor.ColumnarReplayFile(filename),
+}
+
+
+def save_whole(filename, data):
+    # Save like before streaming: encode everything, then write it
+    with open(filename, 'w') as file:
+        file.write(json.dumps(data, separators=(',', ':')))
+
+
+# Ways of saving a fully loaded .replay file that can be compared
+SAVE_METHODS = {
+    'whole': save_whole,
+    'stream': editor._write_json,
+}
+
+
+def generate_replay(filename, drivers=8, frames=2000, seed=0):
+    # Write a synthetic .replay and .header file (filename without extension)
+    # with the structure of the files of the game
+    # Each driver has frames recorded positions with random values
+    rng = random.Random(seed)
+    entries = []
+    configs = {}
+    for i in range(drivers):
+        id = 'racingteam-{:04d}'.format(i)
+        config = {
+            'racerName': 'Driver {}'.format(i + 1),
+            'driverSkin': rng.choice(['driverskin-classic-f',
+                                      'driverskin-classic-m']),
+            'driverSkinLivery': ['driverskinmaterial-6-m-1',
+                                 ['{:06x}'.format(rng.getrandbits(24))
+                                  for _ in range(3)]],
+            'helmet': 'helmet-0-contemporary-full-face',
+            'helmetLivery': ['helmetmaterial-contemporary-full-face-3'] +
+                            ['{:06x}'.format(rng.getrandbits(24))
+                             for _ in range(5)],
+            'idleAnimation': 'driveridleanimation-0',
+            'celebrationAnimation': 'drivercelebrationanimation-0',
+            'vehicle': 'vehicle-gt-panther',
+            'vehicleLivery': ['vehiclematerial-gt-panther-2',
+                              ['{:06x}'.format(rng.getrandbits(24))
+                               for _ in range(4)], i + 1],
+        }
+        configs[id] = config
+        entries.append({
+            'racingTeamID': id,
+            'racingTeamConfiguration': config,
+            'startPositionIndex': i,
+            'frames': [{'time': frame / 60,
+                        'x': rng.uniform(-500, 500),
+                        'y': rng.uniform(-500, 500),
+                        'rotation': rng.uniform(-3.15, 3.15),
+                        'speed': rng.uniform(0, 90),
+                        'gear': rng.randint(1, 6)}
+                       for frame in range(frames)],
+            'events': [{'type': 'lap', 'frame': frame}
+                       for frame in range(0, frames, 600)],
+        })
+    header = {
+        'timeStampUtc': '2022-03-{:02d}T12:00:00Z'.format(seed % 28 + 1),
+        'track': 'Track {}'.format(seed % 10),
+        'path': rng.choice(['Forward', 'Reverse']),
+        'metadata': {'scenario_name': 'Grand Prix',
+                     'index_in_scenario': seed % 5},
+        'configsById': configs,
+    }
+    with open('{}.replay'.format(filename), 'w') as file:
+        file.write(json.dumps(entries, separators=(',', ':')))
+    with open('{}.header'.format(filename), 'w') as file:
+        file.write(json.dumps(header, separators=(',', ':')))
+
+
+def generate_replays(directory, files, drivers, frames, seed=0):
+    # Write files synthetic replays into directory and return their names
+    os.makedirs(directory, exist_ok=True)
+    names = []
+    for i in range(files):
+        name = 'replay-{:05d}'.format(i)
+        generate_replay(os.path.join(directory, name), drivers, frames,
+                        seed + i)
+        names.append(name)
+    return names
+
+
+def generate(args):
+    # Write synthetic replays for the benchmarks
+    generate_replays(args.directory, args.files, args.drivers, args.frames,
+                     args.seed)
+
+
+def peak_rss():
+    # Return the peak resident set size of this process in bytes
+    # Only available on Unix-like systems
+    import resource
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if sys.platform == 'darwin':
+        return peak  # Already in bytes
+    return peak * 1024
+
+
+def measure_load(args):
+    # Load the replay in the given mode and read every driver and car info
+    # Prints the wall time and the peak RSS of the process as JSON
+    start = time.perf_counter()
+    if args.mode != 'baseline':
+        replay_file = LOAD_MODES[args.mode](args.filename)
+        for id, name, grid in replay_file.get_drivers():
+            replay_file.get_driver_info(id)
+            replay_file.get_car_info(id)
+    elapsed = time.perf_counter() - start
+    print(json.dumps({'mode': args.mode, 'seconds': elapsed,
+                      'peak_rss': peak_rss()}))
+
+
+def rss(args):
+    # Compare the peak RSS of the load modes
+    # Each mode is measured in a fresh process, so the peaks are independent
+    # The baseline is the peak of a process that only imports the editor
+    print('{:<10}{:>12}{:>16}{:>16}'.format(
+        'Mode', 'Time (s)', 'Peak RSS (MB)', 'Above base (MB)'))
+    base = None
+    for mode in ['baseline'] + args.modes:
+        output = subprocess.run(
+            [sys.executable, __file__, 'measure-load', mode, args.filename],
+            stdout=subprocess.PIPE, check=True, universal_newlines=True)
+        result = json.loads(output.stdout)
+        if base is None:
+            base = result['peak_rss']
+        print('{:<10}{:>12.3f}{:>16.1f}{:>16.1f}'.format(
+            mode, result['seconds'], result['peak_rss'] / 2 ** 20,
+            (result['peak_rss'] - base) / 2 ** 20))
+
+
+def save(args):
+    # Compare the wall time and the peak memory allocated while saving
+    # The memory is measured in a second run, as tracing slows down saving
+    data = editor.ReplayFile(args.filename).data
+    print('{:<10}{:>12}{:>16}'.format('Method', 'Time (s)', 'Peak (MB)'))
+    with tempfile.TemporaryDirectory() as directory:
+        targets = []
+        for method, function in SAVE_METHODS.items():
+            target = os.path.join(directory, '{}.replay'.format(method))
+            start = time.perf_counter()
+            function(target, data)
+            elapsed = time.perf_counter() - start
+            tracemalloc.start()
+            function(target, data)
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            targets.append(target)
+            print('{:<10}{:>12.3f}{:>16.1f}'.format(method, elapsed,
+                                                   peak / 2 ** 20))
+        identical = all(filecmp.cmp(targets[0], target, shallow=False)
+                        for target in targets[1:])
+        print('Output identical: {}'.format(identical))
+
+
+def codecs(args):
+    # Compare the JSON backends on loading and saving a replay
+    # Loading decodes the whole .replay and .header file, saving encodes and
+    # writes the whole .replay file. The decoded data and the saved files
+    # have to be the same for all backends
+    with open('{}.replay'.format(args.filename), 'rb') as file:
+        replay = file.read()
+    with open('{}.header'.format(args.filename), 'rb') as file:
+        header = file.read()
+    print('{:<10}{:>12}{:>12}{:>12}'.format(
+        'Backend', 'Load (s)', 'Header (ms)', 'Save (s)'))
+    expected = None
+    with tempfile.TemporaryDirectory() as directory:
+        targets = []
+        for backend in editor.JSONCodec.available():
+            codec = editor.JSONCodec(backend)
+            codec.loads(b'{}')  # Import the library before timing
+            start = time.perf_counter()
+            data = codec.loads(replay)
+            load = time.perf_counter() - start
+            start = time.perf_counter()
+            for _ in range(args.repeat):
+                codec.loads(header)
+            header_load = (time.perf_counter() - start) / args.repeat
+            target = os.path.join(directory, '{}.replay'.format(backend))
+            start = time.perf_counter()
+            codec.write(target, data)
+            save = time.perf_counter() - start
+            if expected is None:
+                expected = data
+            elif data != expected:
+                print('{}: decoded data differs'.format(backend))
+            del data
+            targets.append(target)
+            print('{:<10}{:>12.3f}{:>12.3f}{:>12.3f}'.format(
+                backend, load, header_load * 1000, save))
+        identical = all(filecmp.cmp(targets[0], target, shallow=False)
+                        for target in targets[1:])
+        print('Output identical: {}'.format(identical))
+
+
+# Modules whose import is compared: the core that the commands and their
+# worker processes import, and the GUI on top of it
+IMPORT_MODULES = ('CS_Replay_Editor', 'CS_Replay_Editor_GUI')
+
+
+def import_time(module, cwd):
+    # Import module in a fresh interpreter with -X importtime in cwd
+    # Returns the cumulative import time of each imported module in seconds
+    env = dict(os.environ, PYTHONPATH=os.path.dirname(os.path.abspath(
+        __file__)))
+    output = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', 'import {}'.format(module)],
+        stderr=subprocess.PIPE, check=True, universal_newlines=True, cwd=cwd,
+        env=env)
+    times = {}
+    for line in output.stderr.splitlines():
+        fields = line.split(':', 1)[-1].split('|')
+        if len(fields) == 3 and fields[1].strip().isdigit():
+            times[fields[2].strip()] = int(fields[1]) / 1e6
+    return times
+
+
+def spawn_worker(module):
+    # Start a worker process like the commands do on Windows and macOS,
+    # which imports module, and wait for its first result
+    # The worker also imports this script, and so the core, in any case
+    context = multiprocessing.get_context('spawn')
+    start = time.perf_counter()
+    with ProcessPoolExecutor(max_workers=1, mp_context=context,
+                             initializer=importlib.import_module,
+                             initargs=(module,)) as executor:
+        executor.submit(os.getpid).result()
+    return time.perf_counter() - start
+
+
+def imports(args):
+    # Compare the import time of the core and the GUI and the time to start
+    # a worker process importing them, the median of the runs counts
+    # Also checks that importing the core creates no files and imports
+    # neither tkinter nor a JSON library
+    print('{:<24}{:>14}{:>16}'.format('Module', 'Import (ms)',
+                                      'Worker (ms)'))
+    for module in IMPORT_MODULES:
+        times = []
+        workers = []
+        with tempfile.TemporaryDirectory() as directory:
+            for _ in range(args.repeat):
+                imported = import_time(module, directory)
+                times.append(imported[module])
+                workers.append(spawn_worker(module))
+            created = os.listdir(directory)
+        times.sort()
+        workers.sort()
+        print('{:<24}{:>14.1f}{:>16.1f}'.format(
+            module, times[len(times) // 2] * 1000,
+            workers[len(workers) // 2] * 1000))
+        if module == IMPORT_MODULES[0]:
+            loaded = [name for name in ('tkinter',) + editor.JSONCodec.backends
+                      if name in imported and name != 'json']
+            print('  Files created: {}, heavy modules imported: {}'.format(
+                ', '.join(created) or 'none', ', '.join(loaded) or 'none'))
+
+
+def change_all(replay):
+    # Change the driver and car info of every driver
+    for id, name, grid in replay.get_drivers():
+        driver_info = replay.get_driver_info(id)
+        driver_info['racerName'] = '{} (changed)'.format(name)
+        replay.change_driver_info(id, driver_info)
+        car_info = replay.get_car_info(id)
+        vehiclelivery = list(car_info['vehicleLivery'])
+        vehiclelivery[2] = (vehiclelivery[2] + 1) % 100
+        car_info['vehicleLivery'] = vehiclelivery
+        replay.change_car_info(id, car_info)
+
+
+def scan_directory(directory):
+    # Find the replays and read the info of each like GUI.load_replays,
+    # without the index, so every .header file is read
+    for name in editor.find_replays(directory):
+        editor.read_race_info(directory, name)
+
+
+def measure(function, repeat):
+    # Return the fastest wall time of repeat runs of function and the peak
+    # memory allocated in an additional run
+    # The memory is measured separately, as tracing slows down the function
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - start)
+    tracemalloc.start()
+    function()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return {'seconds': min(seconds), 'peak_bytes': peak}
+
+
+# Differences to the baseline below these are noise and never regressions
+MIN_SECONDS = 0.001
+MIN_BYTES = 64 * 1024
+
+
+def compare(results, baseline, max_slowdown, max_growth):
+    # Print the change of each result compared to the baseline results and
+    # return the names of the benchmarks that exceed the thresholds
+    print('{:<14}{:>12}{:>10}{:>14}{:>10}'.format(
+        'Benchmark', 'Time (s)', 'Change', 'Peak (MB)', 'Change'))
+    regressions = []
+    for name, result in results.items():
+        previous = baseline.get(name)
+        if previous is None:
+            print('{:<14}{:>12.4f}{:>10}{:>14.2f}{:>10}'.format(
+                name, result['seconds'], '-', result['peak_bytes'] / 2 ** 20,
+                '-'))
+            continue
+        time_ratio = result['seconds'] / max(previous['seconds'], 1e-9)
+        memory_ratio = result['peak_bytes'] / max(previous['peak_bytes'], 1)
+        print('{:<14}{:>12.4f}{:>9.0%}{:>14.2f}{:>9.0%}'.format(
+            name, result['seconds'], time_ratio - 1,
+            result['peak_bytes'] / 2 ** 20, memory_ratio - 1))
+        slower = (time_ratio > max_slowdown and
+                  result['seconds'] - previous['seconds'] > MIN_SECONDS)
+        larger = (memory_ratio > max_growth and
+                  result['peak_bytes'] - previous['peak_bytes'] > MIN_BYTES)
+        if slower or larger:
+            regressions.append(name)
+    return regressions
+
+
+def suite(args):
+    # Time the main operations on synthetic replays and write the results
+    # If a baseline is given, fail if the results are worse than allowed
+    parameters = {'files': args.files, 'drivers': args.drivers,
+                  'frames': args.frames, 'seed': args.seed}
+    with tempfile.TemporaryDirectory() as directory:
+        replays = os.path.join(directory, 'replays')
+        names = generate_replays(replays, args.files, args.drivers,
+                                 args.frames, args.seed)
+        filename = os.path.join(replays, names[0])
+        target = os.path.join(directory, 'saved')
+        replay = editor.Replay(filename)
+
+        def save():
+            # Save with one changed driver
+            id = replay.get_drivers()[0][0]
+            replay.change_driver_info(id, replay.get_driver_info(id))
+            replay.save(target)
+
+        benchmarks = {
+            'load': lambda: editor.Replay(filename),
+            'load_full': lambda: editor.Replay(filename, config_only=False),
+            'get_drivers': replay.get_drivers,
+            'change_info': lambda: change_all(replay),
+            'save': save,
+            'scan': lambda: scan_directory(replays),
+        }
+        results = {}
+        for name, function in benchmarks.items():
+            results[name] = measure(function, args.repeat)
+
+    with open(args.output, 'w') as file:
+        json.dump({'python': platform.python_version(),
+                   'platform': platform.platform(),
+                   'parameters': parameters, 'results': results},
+                  file, indent=4)
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline) as file:
+            previous = json.load(file)
+        if previous['parameters'] != parameters:
+            print('Baseline was measured with {}'.format(
+                previous['parameters']), file=sys.stderr)
+            return 2
+        baseline = previous['results']
+    regressions = compare(results, baseline, args.max_slowdown,
+                          args.max_growth)
+    print('Results written to {}'.format(args.output))
+    if regressions:
+        print('Regressions: {}'.format(', '.join(regressions)),
+              file=sys.stderr)
+        return 1
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Benchmarks for the CS Replay Editor')
+    commands = parser.add_subparsers(dest='command')
+    commands.required = True
+
+    command = commands.add_parser(
+        'rss', help='Compare the peak memory of the .replay load modes')
+    command.add_argument('filename',
+                         help='Replay to load, without file extension')
+    command.add_argument('--modes', nargs='+', choices=sorted(LOAD_MODES),
+                         default=['full', 'config', 'mapped'])
+    command.set_defaults(function=rss)
+
+    command = commands.add_parser(
+        'save', help='Compare saving a fully loaded .replay file at once '
+                     'and streamed')
+    command.add_argument('filename',
+                         help='Replay to load, without file extension')
+    command.set_defaults(function=save)
+
+    command = commands.add_parser(
+        'codecs', help='Compare the JSON backends that are installed')
+    command.add_argument('filename',
+                         help='Replay to load, without file extension')
+    command.add_argument('--repeat', type=int, default=100,
+                         help='Number of times the .header file is decoded')
+    command.set_defaults(function=codecs)
+
+    command = commands.add_parser(
+        'imports', help='Compare the import time of the core and the GUI '
+                        'and the start of worker processes')
+    command.add_argument('--repeat', type=int, default=5,
+                         help='Runs of each measurement, the median counts')
+    command.set_defaults(function=imports)
+
+    command = commands.add_parser(
+        'generate', help='Write synthetic replays into a directory')
+    command.add_argument('directory')
+    command.add_argument('--files', type=int, default=10)
+    command.add_argument('--drivers', type=int, default=8)
+    command.add_argument('--frames', type=int, default=2000,
+                         help='Recorded frames per driver')
+    command.add_argument('--seed', type=int, default=0)
+    command.set_defaults(function=generate)
+
+    command = commands.add_parser(
+        'suite', help='Time loading, editing, saving and scanning synthetic '
+                      'replays and compare the results to a baseline')
+    command.add_argument('--files', type=int, default=200,
+                         help='Replays in the scanned directory')
+    command.add_argument('--drivers', type=int, default=8)
+    command.add_argument('--frames', type=int, default=2000,
+                         help='Recorded frames per driver')
+    command.add_argument('--seed', type=int, default=0)
+    command.add_argument('--repeat', type=int, default=5,
+                         help='Runs of each benchmark, the fastest counts')
+    command.add_argument('-o', '--output', default='benchmark_results.json',
+                         help='JSON file to write the results to')
+    command.add_argument('--baseline',
+                         help='Results of an earlier run to compare to')
+    command.add_argument('--max-slowdown', type=float, default=1.25,
+                         help='Allowed ratio of time to the baseline')
+    command.add_argument('--max-growth', type=float, default=1.25,
+                         help='Allowed ratio of peak memory to the baseline')
+    command.set_defaults(function=suite)
+
+    # Used by rss to measure a single mode in a separate process
+    command = commands.add_parser('measure-load')
+    command.add_argument('mode', choices=['baseline'] + sorted(LOAD_MODES))
+    command.add_argument('filename')
+    command.set_defaults(function=measure_load)
+
+    args = parser.parse_args()
+    return args.function(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,65 @@
+import contextlib
+import importlib.util
+import io
+import json
+import os
+import tempfile
+import unittest
+
+import CS_Replay_Editor as editor
+from test_replay_files import make_replay
+
+
+@unittest.skipIf(importlib.util.find_spec('numpy') is None,
+                 'Recoloring needs numpy')
+class PresetsTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+
+    def path(self, *names):
+        return os.path.join(self.tempdir.name, *names)
+
+    def write(self, name, entries, header):
+        for extension, data in (('replay', entries), ('header', header)):
+            with open(self.path('in', '{}.{}'.format(name, extension)),
+                      'w') as file:
+                file.write(json.dumps(data, separators=(',', ':')))
+
+    def run_presets(self):
+        # Run the presets command and return its exit code and error output
+        with open(self.path('pass.json'), 'w') as file:
+            json.dump({'palettes': {'*': ['#ff0000', '#00ff00']}}, file)
+        errors = io.StringIO()
+        with contextlib.redirect_stdout(io.StringIO()), \
+                contextlib.redirect_stderr(errors):
+            code = editor.main(['presets', self.path('in'),
+                                self.path('pass.json'),
+                                '--output', self.path('out')])
+        return code, errors.getvalue()
+
+    def test_malformed_livery(self):
+        # A replay with a livery without colors is reported and skipped, the
+        # other replays are still saved
+        os.mkdir(self.path('in'))
+        for name in ('a', 'c'):
+            self.write(name, *make_replay())
+        entries, header = make_replay()
+        for config in ([entries[1]['racingTeamConfiguration'],
+                        header['configsById']['racingteam-0001']]):
+            config['driverSkinLivery'] = ['driverskinmaterial-6-m-1']
+        self.write('b', entries, header)
+        code, errors = self.run_presets()
+        self.assertEqual(code, 1)
+        self.assertIn('b: failed (Malformed driverSkinLivery', errors)
+        self.assertEqual(sorted(os.listdir(self.path('out'))),
+                         ['a.header', 'a.replay', 'c.header', 'c.replay'])
+        replay = editor.Replay(self.path('out', 'a'))
+        self.assertEqual(
+            replay.get_driver_info('racingteam-0000')['driverSkinLivery'][1],
+            ['ff0000', '00ff00', 'ff0000'])
+
+
+if __name__ == '__main__':
+    unittest.main()
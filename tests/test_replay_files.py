@@ -0,0 +1,230 @@
+import copy
+import json
+import os
+import tempfile
+import unittest
+
+import CS_Replay_Editor as editor
+
+
+def make_replay(drivers=3, frames=5):
+    # Return the data of a small .replay and .header file with the structure
+    # of the files of the game
+    entries = []
+    configs = {}
+    for i in range(drivers):
+        id = 'racingteam-{:04d}'.format(i)
+        config = {
+            'racerName': 'Driver {}'.format(i + 1),
+            'driverSkin': 'driverskin-classic-m',
+            'driverSkinLivery': ['driverskinmaterial-6-m-1',
+                                 ['ff0000', '00ff00', '0000ff']],
+            'helmet': 'helmet-0-contemporary-full-face',
+            'helmetLivery': ['helmetmaterial-contemporary-full-face-3',
+                             '111111', '222222', '333333', '444444',
+                             '555555'],
+            'idleAnimation': 'driveridleanimation-0',
+            'celebrationAnimation': 'drivercelebrationanimation-0',
+            'vehicle': 'vehicle-gt-panther',
+            'vehicleLivery': ['vehiclematerial-gt-panther-2',
+                              ['aaaaaa', 'bbbbbb', 'cccccc', 'dddddd'],
+                              i + 1],
+        }
+        configs[id] = config
+        entries.append({
+            'racingTeamID': id,
+            'racingTeamConfiguration': copy.deepcopy(config),
+            'startPositionIndex': i,
+            'frames': [{'time': frame / 60, 'x': frame * 1.5, 'gear': 1}
+                       for frame in range(frames)],
+        })
+    header = {
+        'timeStampUtc': '2022-03-01T12:00:00Z',
+        'track': 'Track 1',
+        'path': 'Forward',
+        'metadata': {'scenario_name': 'Grand Prix', 'index_in_scenario': 0},
+        'configsById': configs,
+    }
+    return entries, header
+
+
+def encode(data):
+    # Encode data into the compact JSON format of the game
+    return json.dumps(data, separators=(',', ':')).encode()
+
+
+class SaveTest(unittest.TestCase):
+    # Saving must give the same bytes as encoding the changed data again,
+    # however much of the file is copied instead of encoded
+
+    def setUp(self):
+        self.tempdir = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tempdir.cleanup)
+
+    def path(self, name):
+        return os.path.join(self.tempdir.name, name)
+
+    def write(self, name, entries, header, **kwargs):
+        # Write a replay, kwargs are passed to json.dumps
+        kwargs.setdefault('separators', (',', ':'))
+        for extension, data in (('replay', entries), ('header', header)):
+            with open('{}.{}'.format(self.path(name), extension), 'w') as file:
+                file.write(json.dumps(data, **kwargs))
+        return self.path(name)
+
+    def read(self, filename):
+        with open('{}.replay'.format(filename), 'rb') as file:
+            replay = file.read()
+        with open('{}.header'.format(filename), 'rb') as file:
+            header = file.read()
+        return replay, header
+
+    def edit(self, entries, header, edits):
+        # Apply edits to the data like Replay.apply_edits
+        for entry in entries:
+            entry['racingTeamConfiguration'].update(
+                edits.get(entry['racingTeamID'], {}))
+        for id, edit in edits.items():
+            header['configsById'][id].update(edit)
+
+    def check_save(self, source, entries, header, edits, pretty=False,
+                   **kwargs):
+        # Load source, apply edits, save it and compare it with the data
+        replay = editor.Replay(source, **kwargs)
+        self.addCleanup(replay.close)
+        replay.apply_edits(edits)
+        target = self.path('saved')
+        replay.save(target)
+        self.edit(entries, header, edits)
+        saved_replay, saved_header = self.read(target)
+        if pretty:
+            # Only the changed configurations are encoded, everything else
+            # keeps the formatting of the source
+            saved_replay = encode(json.loads(saved_replay))
+            saved_header = encode(json.loads(saved_header))
+        self.assertEqual(saved_replay, encode(entries))
+        self.assertEqual(saved_header, encode(header))
+        return replay
+
+    def test_compact(self):
+        entries, header = make_replay()
+        source = self.write('race', entries, header)
+        self.check_save(source, entries, header,
+                        {'racingteam-0001': {'racerName': 'Changed'}})
+
+    def test_unchanged_copy(self):
+        entries, header = make_replay()
+        source = self.write('race', entries, header, indent=4)
+        with open('{}.replay'.format(source), 'rb') as file:
+            original = file.read()
+        replay = editor.Replay(source)
+        replay.save(self.path('saved'))
+        self.assertEqual(self.read(self.path('saved'))[0], original)
+
+    def test_pretty_printed(self):
+        entries, header = make_replay()
+        source = self.write('race', entries, header, indent=4)
+        self.check_save(source, entries, header,
+                        {'racingteam-0002': {'helmet': 'helmet-1'}},
+                        pretty=True)
+
+    def test_keys_in_telemetry(self):
+        # Keys of the driver entries also appear in the recorded data, once
+        # only some of them and once all of them with the id of a driver
+        ghosts = ({'racingTeamID': 'racingteam-0001'},
+                  {'racingTeamID': 'racingteam-0000',
+                   'racingTeamConfiguration': {'racerName': 'Ghost'},
+                   'startPositionIndex': 7})
+        for ghost in ghosts:
+            for mapped in (False, True):
+                with self.subTest(ghost=ghost, mapped=mapped):
+                    entries, header = make_replay()
+                    for entry in entries:
+                        entry['frames'].append(copy.deepcopy(ghost))
+                    source = self.write('race', entries, header)
+                    self.check_save(
+                        source, entries, header,
+                        {'racingteam-0000': {'racerName': 'Changed'}},
+                        mapped=mapped)
+
+    def test_escaped_name(self):
+        entries, header = make_replay()
+        name = 'Dri"ver \\ "1" {racingTeamConfiguration}'
+        entries[0]['racingTeamConfiguration']['racerName'] = name
+        header['configsById']['racingteam-0000']['racerName'] = name
+        source = self.write('race', entries, header)
+        replay = self.check_save(
+            source, entries, header,
+            {'racingteam-0001': {'racerName': 'Changed "2"'}})
+        self.assertEqual(
+            replay.get_driver_info('racingteam-0000')['racerName'], name)
+
+    def test_save_twice(self):
+        entries, header = make_replay()
+        source = self.write('race', entries, header)
+        replay = editor.Replay(source)
+        edits = [{'racingteam-0000': {'racerName': 'A much longer name'}},
+                 {'racingteam-0002': {'vehicle': 'vehicle-1'},
+                  'racingteam-0000': {'racerName': 'B'}}]
+        for edit in edits:
+            replay.apply_edits(edit)
+            replay.save(source)
+            self.edit(entries, header, edit)
+            self.assertEqual(self.read(source),
+                             (encode(entries), encode(header)))
+
+    def test_close(self):
+        entries, header = make_replay()
+        source = self.write('race', entries, header)
+        with editor.Replay(source, mapped=True) as replay:
+            replay.apply_edits({'racingteam-0001': {'racerName': 'Changed'}})
+            replay.save(source)
+            mapped = replay.replay
+        self.assertIsNone(mapped.buf)
+        self.assertIsNone(mapped.file)
+
+    def test_mapped(self):
+        entries, header = make_replay()
+        source = self.write('race', entries, header)
+        replay = self.check_save(
+            source, entries, header,
+            {'racingteam-0001': {'racerName': 'Changed'}}, mapped=True)
+        # The views are moved to the saved file
+        replay.apply_edits({'racingteam-0002': {'racerName': 'Again'}})
+        replay.save(self.path('again'))
+        self.edit(entries, header,
+                  {'racingteam-0002': {'racerName': 'Again'}})
+        self.assertEqual(self.read(self.path('again')),
+                         (encode(entries), encode(header)))
+
+    def test_undo(self):
+        # Undoing all steps gives the original files, also if a step added
+        # a key the configuration didn't have
+        steps = [{'racingteam-0000': {'number': 7}},
+                 {'racingteam-0000': {'racerName': 'Changed'},
+                  'racingteam-0001': {'vehicle': 'vehicle-1'}}]
+        for mapped in (False, True):
+            with self.subTest(mapped=mapped):
+                entries, header = make_replay()
+                source = self.write('race', entries, header)
+                original = self.read(source)
+                replay = editor.Replay(source, mapped=mapped)
+                self.addCleanup(replay.close)
+                for step in steps:
+                    replay.apply_edits(step)
+                for step in steps:
+                    replay.undo()
+                self.assertNotIn('number',
+                                 replay.edits.get('racingteam-0000', {}))
+                replay.save(self.path('undone'))
+                self.assertEqual(self.read(self.path('undone')), original)
+                for step in steps:
+                    replay.redo()
+                    self.edit(entries, header, step)
+                replay.save(self.path('redone'))
+                self.assertEqual(self.read(self.path('redone')),
+                                 (encode(entries), encode(header)))
+
+
+if __name__ == '__main__':
+    unittest.main()